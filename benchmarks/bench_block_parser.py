@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+BlockParser 渲染性能基准 - 在合成的块树上测量渲染速度（块/秒）
+
+用法: python benchmarks/bench_block_parser.py [--pages 200] [--blocks 50] [--depth 3]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from concurrent.futures import Future
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.block_parser import BlockParser
+from src.notion_client import parse_rich_text_to_html
+
+WORDS = ["提示词", "上下文", "模型", "prompt", "token", "Claude", "代码", "示例", "<tag>", "&amp;"]
+ANNOTATIONS = ["bold", "italic", "code", "strikethrough", "underline"]
+
+
+class StubImageHandler:
+    """不下载图片，直接返回固定路径"""
+
+    def submit(self, url: str, page_id: str) -> Future:
+        future = Future()
+        future.set_result("images/0123456789abcdef.png")
+        return future
+
+    def get_image_info(self, relative_path: str):
+        return None
+
+
+def make_rich_text(rng: random.Random, words: int) -> list:
+    items = []
+    for _ in range(rng.randint(1, 4)):
+        text = " ".join(rng.choice(WORDS) for _ in range(max(1, words // 3)))
+        annotations = {name: rng.random() < 0.2 for name in ANNOTATIONS}
+        href = "https://example.com/?a=1&b=\"2\"" if rng.random() < 0.1 else None
+        items.append({"plain_text": text, "annotations": annotations, "href": href})
+    return items
+
+
+def make_block(rng: random.Random, depth: int, words: int) -> dict:
+    block_type = rng.choice([
+        "paragraph", "paragraph", "paragraph", "heading_2", "heading_3",
+        "bulleted_list_item", "numbered_list_item", "toggle", "code",
+        "quote", "callout", "to_do", "divider", "image", "bookmark",
+    ])
+    block = {"id": f"{rng.getrandbits(64):016x}", "type": block_type, "has_children": False}
+
+    if block_type == "code":
+        block[block_type] = {"rich_text": make_rich_text(rng, words * 2), "language": "python"}
+    elif block_type == "image":
+        block[block_type] = {"type": "external", "external": {"url": "https://example.com/a.png"},
+                             "caption": make_rich_text(rng, 3)}
+    elif block_type == "bookmark":
+        block[block_type] = {"url": "https://example.com/?q=1&r=2", "caption": []}
+    elif block_type == "callout":
+        block[block_type] = {"rich_text": make_rich_text(rng, words),
+                             "icon": {"type": "emoji", "emoji": "💡"}}
+    elif block_type == "to_do":
+        block[block_type] = {"rich_text": make_rich_text(rng, words), "checked": rng.random() < 0.5}
+    elif block_type != "divider":
+        block[block_type] = {"rich_text": make_rich_text(rng, words)}
+
+    if depth > 0 and block_type in BlockParser.CHILDREN_TYPES:
+        block["has_children"] = True
+        block["children"] = [make_block(rng, depth - 1, words) for _ in range(rng.randint(1, 3))]
+    return block
+
+
+def count_blocks(blocks: list) -> int:
+    return sum(1 + count_blocks(block.get("children", [])) for block in blocks)
+
+
+def make_pages(pages: int, blocks: int, depth: int, words: int, seed: int = 42) -> list:
+    """生成合成页面（每页为一个完整的块树）"""
+    rng = random.Random(seed)
+    return [[make_block(rng, depth, words) for _ in range(blocks)] for _ in range(pages)]
+
+
+def bench(name: str, func, units: int, repeat: int) -> float:
+    """执行 repeat 次，取最快的一次，返回 单位/秒"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    rate = units / best
+    print(f"{name:<24} {best * 1000:9.1f} ms  {rate:12,.0f} /s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BlockParser 渲染性能基准")
+    parser.add_argument("--pages", type=int, default=200, help="页面数")
+    parser.add_argument("--blocks", type=int, default=50, help="每页顶层块数")
+    parser.add_argument("--depth", type=int, default=3, help="最大嵌套深度")
+    parser.add_argument("--words", type=int, default=30, help="每段文字的词数")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数（取最快）")
+    args = parser.parse_args()
+
+    pages = make_pages(args.pages, args.blocks, args.depth, args.words)
+    total_blocks = sum(count_blocks(page) for page in pages)
+    rich_texts = [make_rich_text(random.Random(i), args.words) for i in range(10000)]
+    block_parser = BlockParser(StubImageHandler())
+
+    print(f"{args.pages} 个页面，共 {total_blocks} 个块\n")
+    bench("parse_rich_text_to_html", lambda: [parse_rich_text_to_html(rt) for rt in rich_texts],
+          len(rich_texts), args.repeat)
+    bench("parse_blocks (blocks)", lambda: [block_parser.parse_blocks(page, f"page{i}")
+                                            for i, page in enumerate(pages)],
+          total_blocks, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+端到端构建性能基准 - 使用本地模拟的 Notion API 运行 build.py
+
+依次执行：冷构建（清空缓存）-> 无修改的增量构建 -> 修改部分页面后的增量构建，
+报告各阶段耗时、请求次数和传输字节数。
+
+用法: python benchmarks/bench_build.py --pages 1000 --latency 0.05 --rate 10
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import argparse
+import contextlib
+import io
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_notion import Workspace, FakeNotionServer
+
+
+def prepare_workdir() -> str:
+    """创建临时工作目录，链接模板和源码，输出和缓存写在临时目录中"""
+    workdir = tempfile.mkdtemp(prefix="bench-build-")
+    for name in ("templates", "src", "config.py", "build.py"):
+        os.symlink(os.path.join(ROOT, name), os.path.join(workdir, name))
+    return workdir
+
+
+def run_build(label: str, server: FakeNotionServer, full: bool, verbose: bool) -> dict:
+    import build
+
+    server.reset_stats()
+    output = io.StringIO()
+    with contextlib.redirect_stdout(sys.stdout if verbose else output):
+        result = build.build(full=full)
+    result["label"] = label
+    result["server"] = dict(server.stats)
+    return result
+
+
+def report(results: list):
+    print(f"\n{'':<16}{'总耗时':>10}{'生成':>8}{'复用':>8}{'API 请求':>10}{'图片请求':>10}"
+          f"{'429':>6}{'重试':>6}{'传输 KB':>10}")
+    for r in results:
+        server = r["server"]
+        print(f"{r['label']:<16}{r['elapsed']:>9.2f}s{r['pages_built']:>8}{r['pages_reused']:>8}"
+              f"{server['api_requests']:>10}{server['image_requests']:>10}{server['throttled']:>6}"
+              f"{r['api']['retries']:>6}{server['bytes'] / 1024:>10.0f}")
+
+    for r in results:
+        print(f"\n[{r['label']}] 流水线 {r['pipeline_elapsed']:.2f}s，首页 {r['index_elapsed']:.2f}s")
+        for name, stats in r["stages"].items():
+            print(f"  {name:<14}{stats['items']:>6} 项  累计 {stats['busy']:.2f}s")
+        spans = sorted(r["trace"]["spans"].items(), key=lambda x: -x[1]["total"])
+        for name, span in spans:
+            if not name.startswith("stage."):
+                print(f"  {name:<18}{span['count']:>6} 次  累计 {span['total']:.2f}s  最长 {span['max']:.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端构建性能基准")
+    parser.add_argument("--pages", type=int, default=200, help="页面数")
+    parser.add_argument("--blocks", type=int, default=30, help="每页顶层块数")
+    parser.add_argument("--depth", type=int, default=2, help="最大嵌套深度")
+    parser.add_argument("--images", type=float, default=0.05, help="图片块占比")
+    parser.add_argument("--text", type=int, default=40, help="每段文字的词数")
+    parser.add_argument("--latency", type=float, default=0.02, help="模拟的请求延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回 429 的概率")
+    parser.add_argument("--server-rate", type=float, default=0.0, help="服务端限速（次/秒）")
+    parser.add_argument("--rate", type=float, default=3.0, help="客户端限速（次/秒）")
+    parser.add_argument("--edit", type=int, default=5, help="第三次构建前修改的页面数")
+    parser.add_argument("--json", help="将结果写入 JSON 文件")
+    parser.add_argument("--keep", action="store_true", help="保留临时工作目录")
+    parser.add_argument("-v", "--verbose", action="store_true", help="显示构建日志")
+    args = parser.parse_args()
+
+    workspace = Workspace(args.pages, args.blocks, args.depth, args.images, args.text)
+    server = FakeNotionServer(workspace, latency=args.latency, error_rate=args.error_rate,
+                              rate_limit=args.server_rate).start()
+
+    # 配置在导入时读取，需要在导入 build 之前设置
+    os.environ.update({
+        "NOTION_API_BASE": server.api_base,
+        "NOTION_TOKEN": "fake",
+        "NOTION_DATABASE_ID": "fake-database",
+        "NOTION_RATE_LIMIT": str(args.rate),
+        "NOTION_RATE_BURST": str(max(3.0, args.rate)),
+    })
+
+    workdir = prepare_workdir()
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    sys.path.insert(0, workdir)
+    print(f"模拟 {args.pages} 个页面，工作目录: {workdir}")
+
+    try:
+        results = [
+            run_build("冷构建", server, True, args.verbose),
+            run_build("无修改", server, False, args.verbose),
+        ]
+        if args.edit:
+            workspace.touch(args.edit)
+            results.append(run_build(f"修改 {args.edit} 页", server, False, args.verbose))
+    finally:
+        os.chdir(cwd)
+        server.stop()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+本地模拟 Notion API - 用于在没有 Notion 工作区和 NOTION_TOKEN 的情况下测试构建性能
+
+实现 NotionClient 使用的接口（均支持分页）：
+  GET  /v1/databases/{id}            数据库结构（属性名称和 id）
+  POST /v1/databases/{id}/query      支持 filter（标题是否为空、last_edited_time，可用 and/or 组合）、
+                                     按 last_edited_time / created_time 的 sorts 和 filter_properties
+  GET  /v1/blocks/{id}/children
+  GET  /files/{name}      模拟 Notion 上传的图片（每次返回的 URL 签名都不同）
+
+用法: python benchmarks/fake_notion.py --port 8765 --pages 100
+然后: NOTION_API_BASE=http://127.0.0.1:8765/v1 NOTION_DATABASE_ID=fake python build.py
+"""
+import re
+import json
+import time
+import zlib
+import random
+import struct
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+PAGE_SIZE = 100
+# 数据库属性：名称 -> (id, 类型)，"备注" 不被构建读取，用于体现 filter_properties 的效果
+PROPERTIES = {
+    "分享标题": ("title", "title"),
+    "分享时间": ("%3Ddt%3A", "date"),
+    "是否有图片": ("img%3F", "checkbox"),
+    "备注": ("note", "rich_text"),
+}
+WORDS = ["提示词", "上下文", "模型", "让", "AI", "帮我", "写", "代码", "总结", "文档",
+         "prompt", "Claude", "技巧", "示例", "输出", "格式", "检查", "重构"]
+
+
+def make_png(width: int, height: int, seed: int) -> bytes:
+    """生成纯色 PNG"""
+    rng = random.Random(seed)
+    pixel = bytes(rng.randrange(256) for _ in range(3))
+    raw = b"".join(b"\x00" + pixel * width for _ in range(height))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return (struct.pack(">I", len(data)) + tag + data
+                + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+def _rich_text(rng: random.Random, words: int) -> list:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    annotations = {"bold": rng.random() < 0.1, "italic": False, "strikethrough": False,
+                   "underline": False, "code": rng.random() < 0.05, "color": "default"}
+    return [{"type": "text", "plain_text": text, "annotations": annotations, "href": None}]
+
+
+class Workspace:
+    """合成的 Notion 工作区：一个数据库及其页面、块树和图片"""
+
+    def __init__(self, pages: int = 100, blocks: int = 30, depth: int = 2,
+                 image_density: float = 0.1, text_size: int = 40, image_size: int = 800,
+                 seed: int = 42):
+        self.rng = random.Random(seed)
+        self.pages = []
+        self.children = {}  # 块 id / 页面 id -> 子块列表
+        self.images = {}  # 文件名 -> (宽, 高, 种子)
+        self.blocks_per_page = blocks
+        self.depth = depth
+        self.image_density = image_density
+        self.text_size = text_size
+        self.image_size = image_size
+
+        for i in range(pages):
+            self._make_page(i)
+
+    def _id(self) -> str:
+        h = f"{self.rng.getrandbits(128):032x}"
+        return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+    def _make_page(self, i: int):
+        page_id = self._id()
+        day = 1 + i % 28
+        edited = f"2024-{1 + i % 12:02d}-{day:02d}T00:00:00.000Z"
+        self.pages.append({
+            "object": "page",
+            "id": page_id,
+            "created_time": edited,
+            "last_edited_time": edited,
+            "url": f"https://www.notion.so/{page_id.replace('-', '')}",
+            "properties": {
+                "分享标题": {"id": "title", "type": "title", "title": _rich_text(self.rng, 4)},
+                "分享时间": {"id": "%3Ddt%3A", "type": "date", "date": {"start": edited[:10]}},
+                "是否有图片": {"id": "img%3F", "type": "checkbox",
+                          "checkbox": self.image_density > 0},
+                "备注": {"id": "note", "type": "rich_text", "rich_text": _rich_text(self.rng, 20)},
+            }
+        })
+        self.children[page_id] = [self._make_block(self.depth, edited)
+                                  for _ in range(self.blocks_per_page)]
+
+    def _make_block(self, depth: int, edited: str) -> dict:
+        rng = self.rng
+        if rng.random() < self.image_density:
+            block_type = "image"
+        else:
+            block_type = rng.choice(["paragraph", "paragraph", "paragraph", "heading_2",
+                                     "bulleted_list_item", "numbered_list_item", "toggle",
+                                     "code", "quote", "callout"])
+        block = {"object": "block", "id": self._id(), "type": block_type,
+                 "has_children": False, "last_edited_time": edited}
+
+        if block_type == "image":
+            name = f"{block['id']}.png"
+            width = self.image_size + rng.randrange(100)
+            self.images[name] = (width, width * 2 // 3, rng.getrandbits(32))
+            block["image"] = {"type": "file", "caption": [],
+                              "file": {"url": f"{{base}}/files/{name}", "expiry_time": edited}}
+        elif block_type == "code":
+            block["code"] = {"rich_text": _rich_text(rng, self.text_size), "language": "python"}
+        elif block_type == "callout":
+            block["callout"] = {"rich_text": _rich_text(rng, self.text_size),
+                                "icon": {"type": "emoji", "emoji": "💡"}}
+        else:
+            block[block_type] = {"rich_text": _rich_text(rng, self.text_size)}
+
+        if depth > 0 and block_type in ("bulleted_list_item", "numbered_list_item", "toggle"):
+            block["has_children"] = True
+            self.children[block["id"]] = [self._make_block(depth - 1, edited)
+                                          for _ in range(rng.randint(1, 3))]
+        return block
+
+    def touch(self, count: int):
+        """修改前 count 个页面的 last_edited_time（模拟在 Notion 中编辑）"""
+        now = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())
+        for page in self.pages[:count]:
+            page["last_edited_time"] = now
+
+
+def _matches(page: dict, condition: dict) -> bool:
+    """判断页面是否满足数据库查询的过滤条件（只实现构建用到的条件）"""
+    if "and" in condition:
+        return all(_matches(page, c) for c in condition["and"])
+    if "or" in condition:
+        return any(_matches(page, c) for c in condition["or"])
+
+    if "timestamp" in condition:
+        value = page[condition["timestamp"]]
+        (op, target), = condition[condition["timestamp"]].items()
+        return {"after": value > target, "on_or_after": value >= target,
+                "before": value < target, "on_or_before": value <= target}[op]
+
+    prop = page["properties"][condition["property"]]
+    (op, _), = condition[prop["type"]].items()
+    text = "".join(item.get("plain_text", "") for item in prop[prop["type"]])
+    return {"is_empty": not text, "is_not_empty": bool(text)}[op]
+
+
+class FakeNotionServer:
+    """模拟 Notion API 的 HTTP 服务
+
+    latency: 每个请求的额外延迟（秒）
+    error_rate: 随机返回 429 的概率
+    rate_limit: 服务端限速（次/秒），超过时返回 429 和 Retry-After，0 表示不限
+    """
+
+    def __init__(self, workspace: Workspace, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, error_rate: float = 0.0, rate_limit: float = 0.0):
+        self.workspace = workspace
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.stats = {"requests": 0, "throttled": 0, "bytes": 0, "api_requests": 0,
+                      "image_requests": 0}
+        self._lock = threading.Lock()
+        self._window = []  # 最近一秒内的请求时间
+        self._rng = random.Random(0)
+
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.base = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread = None
+
+    @property
+    def api_base(self) -> str:
+        return f"{self.base}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_stats(self):
+        with self._lock:
+            for key in self.stats:
+                self.stats[key] = 0
+
+    def _throttled(self) -> bool:
+        """判断本次请求是否需要返回 429"""
+        with self._lock:
+            self.stats["requests"] += 1
+            if self.error_rate and self._rng.random() < self.error_rate:
+                self.stats["throttled"] += 1
+                return True
+            if self.rate_limit:
+                now = time.monotonic()
+                self._window = [t for t in self._window if now - t < 1.0]
+                if len(self._window) >= self.rate_limit:
+                    self.stats["throttled"] += 1
+                    return True
+                self._window.append(now)
+        return False
+
+    def _count(self, key: str, size: int):
+        with self._lock:
+            self.stats[key] += 1
+            self.stats["bytes"] += size
+
+    def _paginate(self, items: list, cursor) -> dict:
+        start = int(cursor or 0)
+        end = start + PAGE_SIZE
+        return {"object": "list", "results": items[start:end], "has_more": end < len(items),
+                "next_cursor": str(end) if end < len(items) else None}
+
+    def database(self, database_id: str) -> dict:
+        return {"object": "database", "id": database_id,
+                "properties": {name: {"id": prop_id, "name": name, "type": prop_type}
+                               for name, (prop_id, prop_type) in PROPERTIES.items()}}
+
+    def query(self, database_id: str, body: dict, query: dict) -> dict:
+        pages = self.workspace.pages
+        if body.get("filter"):
+            pages = [page for page in pages if _matches(page, body["filter"])]
+        # 多个排序条件时前面的优先，依次做稳定排序
+        for sort in reversed(body.get("sorts", [])):
+            pages = sorted(pages, key=lambda page: page[sort["timestamp"]],
+                           reverse=sort.get("direction") == "descending")
+        result = self._paginate(pages, body.get("start_cursor"))
+
+        ids = query.get("filter_properties")
+        if ids:
+            ids = set(ids)
+            result["results"] = [
+                dict(page, properties={name: value for name, value in page["properties"].items()
+                                       if value["id"] in ids})
+                for page in result["results"]]
+        return result
+
+    def block_children(self, block_id: str, query: dict) -> dict:
+        children = self.workspace.children.get(block_id)
+        if children is None:
+            return None
+        return self._paginate(children, query.get("start_cursor", [None])[0])
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = "application/json",
+                      headers: dict = None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_json(self, data):
+                # 图片 URL 每次都重新“签名”，与真实 Notion 一致
+                signature = f"{server._rng.getrandbits(64):016x}"
+                body = json.dumps(data, ensure_ascii=False)
+                body = body.replace("{base}/files/", f"{server.base}/files/")
+                body = re.sub(r'(/files/[^"?]+\.png)"', rf'\1?X-Amz-Signature={signature}"', body)
+                encoded = body.encode()
+                server._count("api_requests", len(encoded))
+                self._send(200, encoded)
+
+            def _handle(self, method: str):
+                if server.latency:
+                    time.sleep(server.latency)
+                if server._throttled():
+                    return self._send(429, b'{"object":"error","code":"rate_limited"}',
+                                      headers={"Retry-After": "1"})
+
+                url = urlparse(self.path)
+                match = re.fullmatch(r"/v1/databases/([^/]+)/query", url.path)
+                if method == "POST" and match:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                    return self._send_json(server.query(match.group(1), body, parse_qs(url.query)))
+
+                match = re.fullmatch(r"/v1/databases/([^/]+)", url.path)
+                if method == "GET" and match:
+                    return self._send_json(server.database(match.group(1)))
+
+                match = re.fullmatch(r"/v1/blocks/([^/]+)/children", url.path)
+                if method == "GET" and match:
+                    result = server.block_children(match.group(1), parse_qs(url.query))
+                    if result is not None:
+                        return self._send_json(result)
+
+                match = re.fullmatch(r"/files/([^/]+)", url.path)
+                if method == "GET" and match and match.group(1) in server.workspace.images:
+                    width, height, seed = server.workspace.images[match.group(1)]
+                    image = make_png(width, height, seed)
+                    server._count("image_requests", len(image))
+                    return self._send(200, image, "image/png")
+
+                self._send(404, b'{"object":"error","code":"object_not_found"}')
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 Notion API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pages", type=int, default=100, help="页面数")
+    parser.add_argument("--blocks", type=int, default=30, help="每页顶层块数")
+    parser.add_argument("--depth", type=int, default=2, help="列表/折叠块的最大嵌套深度")
+    parser.add_argument("--images", type=float, default=0.1, help="图片块占比")
+    parser.add_argument("--text", type=int, default=40, help="每段文字的词数")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的额外延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回 429 的概率")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="服务端限速（次/秒）")
+    args = parser.parse_args()
+
+    workspace = Workspace(args.pages, args.blocks, args.depth, args.images, args.text)
+    server = FakeNotionServer(workspace, port=args.port, latency=args.latency,
+                              error_rate=args.error_rate, rate_limit=args.rate_limit)
+    print(f"模拟 Notion API: {server.api_base}（{args.pages} 个页面）")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -4,127 +4,405 @@
 """
 import os
 import sys
+import time
+import threading
+from collections import Counter
+from concurrent.futures import wait
+from typing import Optional
 
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from config import OUTPUT_DIR, IMAGES_DIR
-from src.notion_client import NotionClient, extract_page_info, parse_rich_text
+from config import (OUTPUT_DIR, IMAGES_DIR, NOTION_CACHE_DIR, NOTION_CACHE_TTL,
+                    NOTION_CACHE_MAX_MB, NOTION_REPLAY, BUILD_FETCH_WORKERS,
+                    BUILD_IMAGE_WORKERS, BUILD_RENDER_WORKERS, BUILD_RENDER_PROCESSES,
+                    BUILD_QUEUE_SIZE, MINIFY_OUTPUT,
+                    BUILD_STREAMING, BUILD_TRACE, TRACE_DIR, SEARCH_INDEX, SEARCH_SHARDS,
+                    OUTPUT_CHANGES_PATH, PRECOMPRESS, NOTION_SNAPSHOT, SNAPSHOT_PATH,
+                    NOTION_DELTA_SCAN, NOTION_FULL_SCAN_HOURS, IMAGE_OPTIMIZE, IMAGE_WIDTHS,
+                    IMAGE_THUMBNAIL_WIDTH, IMAGE_AVIF, IMAGE_PLACEHOLDER, IMAGE_PLACEHOLDER_SIZE)
+from src.cache import DiskCache
+from src.snapshot import SnapshotStore
+from src.build_manifest import BuildManifest, compute_fingerprint, merge_recorded
+from src.fragment_cache import FragmentCache
+from src.notion_client import NotionClient, extract_page_info
 from src.image_handler import ImageHandler
+from src.image_optimizer import ImageOptimizer
 from src.block_parser import BlockParser
+from src.highlight import HIGHLIGHT_ENABLED
+from src.block_tree import BlockTreeFetcher
+from src.preview import PreviewCollector, extract_preview, resolve_preview
 from src.html_generator import HTMLGenerator
+from src.output_writer import OutputWriter
+from src.precompress import Precompressor
+from src.search_index import SearchIndex, count_terms
+from src.pipeline import Pipeline, Stage
+from src.render_pool import RenderPool
+from src.tracing import tracer
 
 
-def extract_preview(blocks: list, image_handler: ImageHandler, page_id: str) -> dict:
-    """从块中提取预览信息（摘要文本和封面图）"""
-    preview_text = ""
-    cover_image = None
-
-    for block in blocks:
-        block_type = block.get("type")
-
-        # 提取封面图（第一张图片）
-        if not cover_image and block_type == "image":
-            image_data = block.get("image", {})
-            image_type = image_data.get("type")
-            if image_type == "file":
-                url = image_data.get("file", {}).get("url")
-            elif image_type == "external":
-                url = image_data.get("external", {}).get("url")
-            else:
-                url = None
-            if url:
-                cover_image = image_handler.process_image(url, page_id, 0)
-
-        # 提取预览文本（从段落中获取）
-        if len(preview_text) < 100 and block_type == "paragraph":
-            rich_text = block.get("paragraph", {}).get("rich_text", [])
-            text = parse_rich_text(rich_text)
-            if text:
-                preview_text += text + " "
-
-        # 如果都获取到了，提前退出
-        if cover_image and len(preview_text) >= 100:
-            break
-
-    # 截断预览文本
-    if len(preview_text) > 120:
-        preview_text = preview_text[:120].strip() + "..."
+def build(full: bool = False, replay: bool = NOTION_REPLAY, from_snapshot: bool = False,
+          pages: Optional[list] = None, refresh=()):
+    """执行构建
 
-    return {
-        "preview_text": preview_text.strip(),
-        "cover_image": cover_image
-    }
-
-
-def clean_output():
-    """清理输出目录"""
-    import shutil
-    if os.path.exists(OUTPUT_DIR):
-        shutil.rmtree(OUTPUT_DIR)
-    os.makedirs(IMAGES_DIR, exist_ok=True)
-    print(f"清理输出目录: {OUTPUT_DIR}")
-
-
-def build():
-    """执行构建"""
+    full 为 True 时忽略构建清单，重新生成所有页面（内容不变的文件仍不重写）；
+    replay 为 True 时只使用缓存的 Notion 响应和已下载的图片，不访问网络；
+    from_snapshot 为 True 时从本地的工作区快照构建，同样不访问网络。
+    pages 为调用方已查询到的数据库页面（监视模式），指定时不再查询数据库；
+    refresh 中的页面即使 last_edited_time 未变化也重新生成。
+    返回构建统计（耗时、各阶段处理数量、API 请求次数等）
+    """
+    start = time.perf_counter()
+    tracer.reset()
     print("=" * 50)
     print("开始构建 AI 使用技巧网站")
     print("=" * 50)
 
-    # 1. 清理输出目录
-    clean_output()
+    # 1. 准备输出目录和构建清单（不清空输出目录，构建成功后再清理过期文件）
+    os.makedirs(IMAGES_DIR, exist_ok=True)
+    # 模板、HTML 生成器和资源处理单独计算指纹：只修改这些时用缓存的正文重新生成页面
+    generator_src = (os.path.join("src", "html_generator.py"), os.path.join("src", "assets.py"))
+    manifest = BuildManifest(
+        # 是否高亮取决于环境变量和 Pygments 是否安装；图片变体（srcset、缩略图）和占位图
+        # 取决于图片设置和 Pillow 是否安装，都会改变正文，也计入指纹
+        fingerprint=compute_fingerprint(
+            "src", "config.py", exclude=generator_src,
+            extra=f"highlight={HIGHLIGHT_ENABLED},pillow={ImageOptimizer.available()},"
+                  f"images={IMAGE_OPTIMIZE}:{IMAGE_WIDTHS}:{IMAGE_THUMBNAIL_WIDTH}:{IMAGE_AVIF},"
+                  f"placeholder={IMAGE_PLACEHOLDER}:{IMAGE_PLACEHOLDER_SIZE}"),
+        # 搜索框和压缩输出的开关同样改变页面（search.js 的分片数写在脚本中），计入模板指纹
+        template_fingerprint=compute_fingerprint(
+            "templates", *generator_src,
+            extra=f"search={SEARCH_INDEX}:{SEARCH_SHARDS},minify={MINIFY_OUTPUT}")
+    )
+    # 回放时用上次构建的记录补全缓存的查询结果（全量构建也使用清空前的记录）
+    recorded = manifest.pages
+    if full:
+        manifest.pages = {}
+    # 块级片段缓存以代码指纹为渲染器版本；全量构建时重新拉取所有子块
+    fragment_cache = FragmentCache(manifest.fingerprint, refresh_children=full)
 
     # 2. 初始化组件
-    notion = NotionClient()
-    image_handler = ImageHandler()
-    block_parser = BlockParser(notion, image_handler)
-    html_generator = HTMLGenerator()
-
-    # 3. 获取所有页面
-    print("\n获取 Notion 数据库中的页面...")
-    pages = notion.get_all_pages()
-    print(f"找到 {len(pages)} 个页面")
-
-    # 4. 处理每个页面
-    articles = []
-    for page in pages:
-        page_info = extract_page_info(page)
-
-        # 跳过无标题的页面
-        if page_info["title"] == "无标题" or not page_info["title"].strip():
-            print(f"跳过无标题页面: {page_info['id']}")
-            continue
+    cache = None
+    if NOTION_CACHE_DIR:
+        cache = DiskCache(NOTION_CACHE_DIR, ttl=NOTION_CACHE_TTL,
+                          max_bytes=NOTION_CACHE_MAX_MB * 1024 * 1024, name="notion")
+    snapshot = SnapshotStore(SNAPSHOT_PATH) if NOTION_SNAPSHOT or from_snapshot else None
+    notion = NotionClient(cache=cache, replay=replay, snapshot=snapshot, from_snapshot=from_snapshot)
+    image_handler = ImageHandler(offline=replay or from_snapshot)
+    if replay:
+        print("回放模式：使用缓存的 Notion 响应构建")
+    if from_snapshot:
+        print(f"从快照构建: {SNAPSHOT_PATH}")
+    block_parser = BlockParser(image_handler)
+    tree_fetcher = BlockTreeFetcher(notion, types=BlockParser.CHILDREN_TYPES)
+    writer = OutputWriter(OUTPUT_DIR)
+    html_generator = HTMLGenerator(writer=writer)
+    search_index = SearchIndex(writer) if SEARCH_INDEX else None
+    if search_index is not None and full:
+        search_index.reset()
 
-        print(f"\n处理页面: {page_info['title']}")
+    # 3. 逐页列出数据库中的页面，未修改的页面直接复用上次的构建结果。
+    #    增量查询时由服务端过滤出上次构建之后修改的页面，
+    #    其余页面使用清单中记录的信息；定期完整查询一次以发现已删除的页面
+    since = None
+    if (pages is None and NOTION_DELTA_SCAN and not replay and not from_snapshot
+            and time.time() - manifest.full_scan_time < NOTION_FULL_SCAN_HOURS * 3600):
+        since = manifest.watermark()
+    if since is not None:
+        print(f"\n增量查询 Notion 数据库（{since} 之后修改的页面）...")
+        delta = list(notion.iter_pages(since=since))
+        print(f"  - 修改过的页面 {len(delta)} 篇")
+        page_infos = [extract_page_info(page) for page in delta]
+        page_infos += manifest.unchanged_pages({page["id"] for page in delta})
+    else:
+        print("\n获取 Notion 数据库中的页面...")
+        if pages is None and not replay and not from_snapshot:
+            manifest.full_scan_time = time.time()
+        page_infos = (extract_page_info(page)
+                      for page in (notion.iter_pages() if pages is None else pages))
+        if replay and pages is None and not from_snapshot:
+            page_infos = merge_recorded(page_infos, recorded)
+    reused = []  # (序号, 页面信息)
 
-        # 获取页面内容
-        blocks = notion.get_page_blocks(page_info["id"])
-        print(f"  - 找到 {len(blocks)} 个内容块")
+    def list_pages():
+        listed = set()
+        for seq, page_info in enumerate(page_infos):
+            # 分页期间有页面被修改时，同一页面可能在查询结果中出现两次，只处理第一次
+            if page_info["id"] in listed:
+                continue
+            listed.add(page_info["id"])
 
+            # 跳过无标题的页面
+            if page_info["title"] == "无标题" or not page_info["title"].strip():
+                print(f"跳过无标题页面: {page_info['id']}")
+                continue
+
+            # 搜索索引中没有的页面需要重新拉取以便分词
+            indexed = search_index is None or page_info["id"] in search_index
+            if indexed and page_info["id"] not in refresh and manifest.is_fresh(page_info, OUTPUT_DIR):
+                page_info.update(manifest.get(page_info["id"])["preview"])
+                reused.append((seq, page_info))
+                continue
+
+            # 页面未修改但模板变化：跳过拉取和解析，用缓存的正文重新渲染
+            cached = (indexed and page_info["id"] not in refresh
+                      and manifest.has_content(page_info, OUTPUT_DIR))
+            yield {"seq": seq, "page_info": page_info, "cached": cached}
+
+    # 4. 流水线处理需要重新生成的页面：拉取块树 -> 下载图片 -> 解析渲染 -> 写入，
+    #    流式模式下每个页面在一个阶段内边拉取边写入
+    def fetch_blocks(job):
+        if job["cached"]:
+            return job
+        page_info = job["page_info"]
+        print(f"\n处理页面: {page_info['title']}")
+        # 需要重新检查的页面可能在 last_edited_time 不变的情况下再次修改，不使用缓存的片段
+        job["fragments"] = fragment_cache.load(page_info["id"], fresh=page_info["id"] in refresh)
+        job["blocks"] = tree_fetcher.fetch(page_info["id"], job["fragments"])
+        print(f"  - 找到 {len(job['blocks'])} 个内容块")
+        return job
+
+    def fetch_images(job):
+        if job["cached"]:
+            return job
+        page_id = job["page_info"]["id"]
         # 提取预览信息（封面图和摘要）
-        preview = extract_preview(blocks, image_handler, page_info["id"])
-        page_info["preview_text"] = preview["preview_text"]
-        page_info["cover_image"] = preview["cover_image"]
+        preview = extract_preview(job["blocks"], image_handler, page_id)
+        # 按渲染顺序提交正文图片，由下载线程池并发下载
+        futures = [image_handler.submit(url, page_id)
+                   for url in block_parser.iter_image_urls(job["blocks"])]
+        # 等待本页图片下载完成再交给渲染阶段，下载与其他页面的渲染重叠
+        job["preview"] = resolve_preview(preview, image_handler)
+        wait(futures)
+        return job
+
+    parsers = threading.local()
+
+    def get_parser() -> BlockParser:
+        # BlockParser 记录当前页面待替换的图片，每个线程使用独立的实例
+        if not hasattr(parsers, "block_parser"):
+            parsers.block_parser = BlockParser(image_handler)
+        return parsers.block_parser
+
+    def render(job):
+        page_info = job["page_info"]
+        blocks = None
+        fragments = job.pop("fragments", None)
+        if job["cached"]:
+            load_cached(page_info)
+        else:
+            page_info.update(job.pop("preview"))
+            blocks = job.pop("blocks")
+
+        terms = None
+        if render_pool is not None:
+            # 在渲染进程中解析和渲染，图片已在上一阶段下载完成
+            images = None
+            if blocks is not None:
+                images = image_handler.resolve(block_parser.iter_image_urls(blocks))
+            result = render_pool.render(page_info, blocks, images,
+                                        with_terms=search_index is not None, fragments=fragments)
+            page_info["content"] = result["content"]
+            terms = result["terms"]
+            fragments = result["fragments"]
+            job["html"] = result["html"]
+        else:
+            if blocks is not None:
+                if search_index is not None:
+                    terms = count_terms(block_parser.iter_text(blocks))
+                with tracer.span("parse", "render", page_id=page_info["id"]):
+                    page_info["content"] = get_parser().parse_blocks(blocks, page_info["id"],
+                                                                     fragments)
+            job["html"] = html_generator.render_article(page_info)
 
-        # 解析块为 HTML
-        content_html = block_parser.parse_blocks(blocks, page_info["id"])
-        page_info["content"] = content_html
+        if blocks is not None:
+            if terms is not None:
+                search_index.update_page(page_info["id"], page_info["title"], terms)
+            manifest.save_content(page_info["id"], page_info["content"])
+            fragment_cache.save(fragments)
+        # 正文已渲染进页面，汇总记录中不再保留
+        del page_info["content"]
+        return job
 
-        articles.append(page_info)
+    def load_cached(page_info: dict):
+        """读取上次构建缓存的正文和预览"""
+        entry = manifest.get(page_info["id"])
+        print(f"\n重新生成页面（使用缓存的正文）: {page_info['title']}")
+        page_info.update(entry["preview"])
+        page_info["images"] = entry["images"]
+        page_info["content"] = manifest.load_content(page_info["id"])
 
-        # 生成文章详情页
-        html_generator.generate_article(page_info)
+    def record(page_info: dict):
+        preview = {
+            "preview_text": page_info["preview_text"],
+            "cover_image": page_info["cover_image"],
+            "cover_thumbnail": page_info["cover_thumbnail"],
+            "cover_width": page_info["cover_width"],
+            "cover_height": page_info["cover_height"],
+            "cover_placeholder": page_info["cover_placeholder"]
+        }
+        # 使用缓存正文的页面没有经过图片下载，沿用上次记录的图片（缓存的正文中没有下载失败的图片）
+        images = page_info.pop("images", None)
+        incomplete = False
+        if images is None:
+            images = image_handler.get_page_images(page_info["id"])
+            incomplete = image_handler.has_failures(page_info["id"])
+        manifest.update(page_info, f"{page_info['id']}.html", images, preview, incomplete)
 
-    # 5. 生成首页
+    def write(job):
+        page_info = job["page_info"]
+        html_generator.write_article(page_info, job.pop("html"))
+        record(page_info)
+        return job
+
+    def stream(job):
+        """流式处理一个页面：边拉取块边渲染写入，内存占用与文章长度无关"""
+        page_info = job["page_info"]
+        page_id = page_info["id"]
+        if job["cached"]:
+            load_cached(page_info)
+            html_generator.write_article(page_info, html_generator.render_article(page_info))
+            del page_info["content"]
+            record(page_info)
+            return job
+
+        print(f"\n处理页面: {page_info['title']}")
+        collector = PreviewCollector(image_handler, page_id)
+        terms = Counter()
+        # 不使用片段缓存：片段缓存在内存中保存整页所有块的 HTML，内存占用会随文章长度增长
+
+        def blocks():
+            for block in notion.iter_page_blocks(page_id):
+                tree_fetcher.expand([block])
+                collector.feed(block)
+                if search_index is not None:
+                    terms.update(count_terms(block_parser.iter_text([block])))
+                yield block
+
+        def chunks(content_file):
+            # 正文片段同时写入正文缓存
+            for i, chunk in enumerate(get_parser().iter_html(blocks(), page_id)):
+                content_file.write(f"\n{chunk}" if i else chunk)
+                yield chunk
+
+        with manifest.open_content(page_id) as content_file:
+            html_generator.write_article_stream(page_info, chunks(content_file))
+        page_info.update(resolve_preview(collector.result(), image_handler))
+        if search_index is not None:
+            search_index.update_page(page_id, page_info["title"], terms)
+        record(page_info)
+        return job
+
+    render_pool = None
+    if BUILD_STREAMING:
+        stages = [Stage("stream", stream, BUILD_FETCH_WORKERS)]
+    else:
+        render_workers = BUILD_RENDER_WORKERS
+        if BUILD_RENDER_PROCESSES > 0:
+            # 每个渲染线程等待一个进程，线程数与进程数相同才能用满进程池
+            render_pool = RenderPool(BUILD_RENDER_PROCESSES)
+            render_workers = BUILD_RENDER_PROCESSES
+        stages = [
+            Stage("fetch_blocks", fetch_blocks, BUILD_FETCH_WORKERS),
+            Stage("fetch_images", fetch_images, BUILD_IMAGE_WORKERS),
+            Stage("render", render, render_workers),
+            Stage("write", write, 1),
+        ]
+    pipeline = Pipeline(stages, queue_size=BUILD_QUEUE_SIZE)
+    try:
+        built = [(job["seq"], job["page_info"]) for job in pipeline.run(list_pages())]
+    finally:
+        tree_fetcher.shutdown()
+        image_handler.shutdown()
+        if snapshot is not None:
+            snapshot.close()
+        if render_pool is not None:
+            render_pool.shutdown()
+
+    # 按修改时间从新到旧（相同时按 id）汇总，输出与处理顺序无关，增量查询和完整查询的结果一致
+    articles = sorted((page_info for _, page_info in reused + built), key=lambda x: x["id"])
+    articles.sort(key=lambda x: x.get("last_edited_time") or "", reverse=True)
+    print(f"\n复用未修改页面 {len(reused)} 篇，重新生成 {len(built)} 篇")
+    for name, stats in pipeline.stats.items():
+        print(f"  - {name}: {stats['items']} 项，耗时 {stats['busy']:.2f}s")
+
+    # 5. 移除已删除的页面，保留复用页面的文件和所有页面引用的图片
+    manifest.prune(article["id"] for article in articles)
+    for entry in manifest.pages.values():
+        writer.keep(entry["file"])
+        for image in entry.get("images", []):
+            writer.keep(image)
+
+    # 6. 更新搜索索引（只重写有变化的分片）
+    if search_index is not None:
+        with tracer.span("search_index", "render"):
+            search_index.prune(article["id"] for article in articles)
+            rewritten = search_index.save()
+        print(f"\n更新搜索索引: 重写 {rewritten} 个分片")
+
+    # 7. 生成首页和页面引用的样式、脚本
+    html_generator.generate_assets()
     print(f"\n生成首页，共 {len(articles)} 篇文章")
-    html_generator.generate_index(articles)
+    index_start = time.perf_counter()
+    with tracer.span("index", "render"):
+        html_generator.generate_index(articles)
+    index_elapsed = time.perf_counter() - index_start
+    manifest.save()
+
+    # 8. 预压缩内容有变化的文本文件
+    precompress = None
+    if PRECOMPRESS:
+        precompress = Precompressor(writer).run()
+        print(f"\n预压缩: 压缩 {precompress['compressed']} 个文件，"
+              f"沿用 {precompress['reused']} 个未变化文件的压缩结果")
+
+    # 9. 删除本次构建没有生成的文件（已删除的页面、不再引用的图片等），输出变更列表
+    changes = writer.collect_garbage()
+    print(f"\n输出变更: 新增 {len(changes['added'])} 个，修改 {len(changes['modified'])} 个，"
+          f"删除 {len(changes['deleted'])} 个文件（{OUTPUT_CHANGES_PATH}）")
+    # 图片库中同样只保留清单中的页面引用的图片和变体
+    live_images = {os.path.basename(image) for entry in manifest.pages.values()
+                   for image in entry.get("images", [])}
+    store_gc = image_handler.store.collect_garbage(live_images)
+    if store_gc["removed"]:
+        print(f"图片库: 删除 {store_gc['removed']} 个不再引用的文件，"
+              f"释放 {store_gc['bytes'] / 1024 / 1024:.1f} MB")
+
+    stats = notion.transport.stats
+    print(f"\nNotion API 请求 {stats['requests']} 次，重试 {stats['retries']} 次，"
+          f"限流 {stats['throttled']} 次")
+    if cache is not None:
+        print(f"Notion 响应缓存: 命中 {cache.hits} 次，未命中 {cache.misses} 次")
+
+    if BUILD_TRACE:
+        summary_path, trace_path = tracer.export(TRACE_DIR)
+        print(f"构建追踪: {summary_path}, {trace_path}")
 
     print("\n" + "=" * 50)
     print("构建完成！")
     print(f"输出目录: {OUTPUT_DIR}")
     print("=" * 50)
 
+    return {
+        "elapsed": time.perf_counter() - start,
+        "pages_built": len(built),
+        "pages_reused": len(reused),
+        "pipeline_elapsed": pipeline.elapsed,
+        "stages": pipeline.stats,
+        "index_elapsed": index_elapsed,
+        "changes": {key: len(paths) for key, paths in changes.items()},
+        "precompress": precompress,
+        "api": dict(notion.transport.stats),
+        "cache": {"hits": cache.hits, "misses": cache.misses} if cache is not None else None,
+        "trace": tracer.summary()
+    }
+
 
 if __name__ == "__main__":
-    build()
+    if "--watch" in sys.argv:
+        from src.watch import watch
+        watch(build)
+    else:
+        build(full="--full" in sys.argv, replay="--replay" in sys.argv or NOTION_REPLAY,
+              from_snapshot="--snapshot" in sys.argv)
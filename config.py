@@ -7,11 +7,126 @@ NOTION_DATABASE_ID = os.getenv("NOTION_DATABASE_ID", "")
 
 # API 版本
 NOTION_VERSION = "2022-06-28"
+# API 地址（测试时可指向本地模拟服务，见 benchmarks/fake_notion.py）
+NOTION_API_BASE = os.getenv("NOTION_API_BASE", "https://api.notion.com/v1")
+
+# API 请求限速与重试（Notion 平均限制约 3 次/秒）
+NOTION_RATE_LIMIT = float(os.getenv("NOTION_RATE_LIMIT", "3"))
+NOTION_RATE_BURST = float(os.getenv("NOTION_RATE_BURST", "3"))
+NOTION_MAX_RETRIES = int(os.getenv("NOTION_MAX_RETRIES", "5"))
+NOTION_TIMEOUT = float(os.getenv("NOTION_TIMEOUT", "30"))
+# 同时进行中的请求上限（实际并发由 AIMD 控制器在 1 到该值之间自动调整）
+NOTION_MAX_CONCURRENCY = int(os.getenv("NOTION_MAX_CONCURRENCY", "8"))
 
 # 输出目录
 OUTPUT_DIR = "output"
 IMAGES_DIR = f"{OUTPUT_DIR}/images"
 
+# 构建缓存目录（增量构建使用，CI 中需要与 output 一起缓存）
+CACHE_DIR = ".cache"
+BUILD_MANIFEST_PATH = f"{CACHE_DIR}/build_manifest.json"
+# 输出文件的内容 hash 记录（只重写有变化的文件），以及每次构建的变更列表
+OUTPUT_STATE_PATH = f"{CACHE_DIR}/output_state.json"
+OUTPUT_CHANGES_PATH = f"{CACHE_DIR}/output_changes.json"
+# 预压缩：为文本文件生成 .gz（安装了 brotli 时还有 .br），静态服务器可直接发送
+PRECOMPRESS = os.getenv("PRECOMPRESS", "1") == "1"
+PRECOMPRESS_PROCESSES = int(os.getenv("PRECOMPRESS_PROCESSES", str(os.cpu_count() or 2)))
+PRECOMPRESS_EXTENSIONS = (".html", ".json", ".svg", ".css", ".js")
+# 小于该大小的文件不压缩（字节）
+PRECOMPRESS_MIN_BYTES = int(os.getenv("PRECOMPRESS_MIN_BYTES", "256"))
+# 页面正文 HTML 缓存：只修改模板时不必重新拉取和解析页面
+CONTENT_CACHE_DIR = f"{CACHE_DIR}/content"
+# 块级片段缓存：按块 id、last_edited_time 和块内容复用渲染好的 HTML（页面修改后只重新渲染修改过的块）
+FRAGMENT_CACHE_DIR = f"{CACHE_DIR}/fragments"
+FRAGMENT_CACHE_MAX_MB = int(os.getenv("FRAGMENT_CACHE_MAX_MB", "200"))
+# 同时复用 last_edited_time 未变化的块的子块树，不再拉取（修改子块内容不会更新父块的时间，默认关闭）
+FRAGMENT_CACHE_CHILDREN = os.getenv("FRAGMENT_CACHE_CHILDREN", "0") == "1"
+# 代码块构建时语法高亮（需要 Pygments），高亮结果按代码内容和语言缓存
+HIGHLIGHT_CODE = os.getenv("HIGHLIGHT_CODE", "1") == "1"
+# Pygments 样式名称：浅色和深色模式（深色留空则两种模式使用同一样式）
+HIGHLIGHT_STYLE = os.getenv("HIGHLIGHT_STYLE", "default")
+HIGHLIGHT_DARK_STYLE = os.getenv("HIGHLIGHT_DARK_STYLE", "github-dark")
+HIGHLIGHT_CACHE_DIR = f"{CACHE_DIR}/highlight"
+HIGHLIGHT_CACHE_MAX_MB = int(os.getenv("HIGHLIGHT_CACHE_MAX_MB", "50"))
+# Jinja 模板编译缓存
+JINJA_CACHE_DIR = f"{CACHE_DIR}/jinja"
+
+# Notion API 响应缓存（留空则不缓存）
+NOTION_CACHE_DIR = os.getenv("NOTION_CACHE_DIR", f"{CACHE_DIR}/notion")
+# 缓存有效期（秒），0 表示只记录不命中，每次仍请求 API
+NOTION_CACHE_TTL = float(os.getenv("NOTION_CACHE_TTL", "0"))
+# 缓存总大小上限（MB）
+NOTION_CACHE_MAX_MB = int(os.getenv("NOTION_CACHE_MAX_MB", "500"))
+# 回放模式：只使用缓存的响应构建，不访问网络
+NOTION_REPLAY = os.getenv("NOTION_REPLAY", "") == "1"
+# 增量查询：由服务端过滤出上次构建之后修改的页面（按修改时间从新到旧），
+# 未修改的页面使用构建清单中的记录；每隔 NOTION_FULL_SCAN_HOURS 小时完整查询一次，
+# 发现已删除、归档（或标题被清空）的页面。增量查询看不到这些页面，
+# 它们在下次完整查询（默认最多 7 天后）之前仍会发布；需要立即下线时运行 python build.py --full（工作流中手动触发并勾选全量构建）
+NOTION_DELTA_SCAN = os.getenv("NOTION_DELTA_SCAN", "1") == "1"
+NOTION_FULL_SCAN_HOURS = float(os.getenv("NOTION_FULL_SCAN_HOURS", "168"))
+
+# Notion 工作区快照（SQLite），拉取到的页面和块都写入快照，可以离线从快照构建
+NOTION_SNAPSHOT = os.getenv("NOTION_SNAPSHOT", "1") == "1"
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", f"{CACHE_DIR}/snapshot.sqlite")
+
+# 并发构建：流水线各阶段的工作线程数，以及阶段之间的队列长度
+BUILD_FETCH_WORKERS = int(os.getenv("BUILD_FETCH_WORKERS", "3"))
+BUILD_IMAGE_WORKERS = int(os.getenv("BUILD_IMAGE_WORKERS", "4"))
+BUILD_RENDER_WORKERS = int(os.getenv("BUILD_RENDER_WORKERS", "2"))
+BUILD_QUEUE_SIZE = int(os.getenv("BUILD_QUEUE_SIZE", "16"))
+# 多进程渲染：解析和模板渲染分散到多个进程（建议设为 CPU 核心数），0 表示在渲染线程中执行
+BUILD_RENDER_PROCESSES = int(os.getenv("BUILD_RENDER_PROCESSES", "0"))
+# 流式渲染：边拉取块边写入页面，内存占用与文章长度无关（不再分阶段并发，也不使用块级片段缓存）
+BUILD_STREAMING = os.getenv("BUILD_STREAMING", "0") == "1"
+# 拉取块树时同一层子块的并发数
+BLOCK_TREE_WORKERS = int(os.getenv("BLOCK_TREE_WORKERS", "4"))
+
+# 跨构建的图片库（按内容 hash 去重）
+IMAGE_STORE_DIR = f"{CACHE_DIR}/images"
+
+# 图片并发下载线程数，以及同一主机同时下载的数量上限
+IMAGE_DOWNLOAD_WORKERS = int(os.getenv("IMAGE_DOWNLOAD_WORKERS", "8"))
+IMAGE_PER_HOST_LIMIT = int(os.getenv("IMAGE_PER_HOST_LIMIT", "4"))
+
+# 图片优化（需要 Pillow）：生成首页缩略图和正文 srcset 使用的多种宽度
+IMAGE_OPTIMIZE = os.getenv("IMAGE_OPTIMIZE", "1") == "1"
+IMAGE_WIDTHS = tuple(int(w) for w in os.getenv("IMAGE_WIDTHS", "480,960,1440").split(","))
+IMAGE_THUMBNAIL_WIDTH = int(os.getenv("IMAGE_THUMBNAIL_WIDTH", "320"))
+IMAGE_OPTIMIZE_PROCESSES = int(os.getenv("IMAGE_OPTIMIZE_PROCESSES", str(os.cpu_count() or 2)))
+# AVIF 在 srcset 中无法声明回退格式，默认只使用 WebP
+IMAGE_AVIF = os.getenv("IMAGE_AVIF", "0") == "1"
+IMAGE_VARIANT_CACHE_DIR = f"{CACHE_DIR}/image_variants"
+# 图片占位图（需要 Pillow）：缩小到指定像素以内内联到页面中，图片加载前作为背景显示
+IMAGE_PLACEHOLDER = os.getenv("IMAGE_PLACEHOLDER", "1") == "1"
+IMAGE_PLACEHOLDER_SIZE = int(os.getenv("IMAGE_PLACEHOLDER_SIZE", "16"))
+
+# 构建追踪：导出各阶段耗时的 JSON 摘要和 Chrome trace 文件
+BUILD_TRACE = os.getenv("BUILD_TRACE", "1") == "1"
+TRACE_DIR = f"{CACHE_DIR}/trace"
+
+# 首页每页显示的文章数，更多文章从 articles.json 按需加载
+INDEX_PAGE_SIZE = int(os.getenv("INDEX_PAGE_SIZE", "20"))
+
+# 共享的 CSS/JS 输出到 assets/ 下，文件名带内容 hash（内容变化时文件名随之变化，可长期缓存）
+ASSETS_DIR = "assets"
+# 压缩生成的 HTML 和 CSS/JS（合并空白、去掉缩进和注释）
+MINIFY_OUTPUT = os.getenv("MINIFY_OUTPUT", "1") == "1"
+
+# 全文搜索：构建时生成按词前缀分片的倒排索引（中文按二元组分词）
+SEARCH_INDEX = os.getenv("SEARCH_INDEX", "1") == "1"
+# 非 ASCII 开头的词按首字符编码分到的分片数
+SEARCH_SHARDS = int(os.getenv("SEARCH_SHARDS", "64"))
+SEARCH_CACHE_PATH = f"{CACHE_DIR}/search_index.json"
+
+# 监视模式（python build.py --watch）：轮询间隔（秒），以及完整查询数据库
+# （发现已删除的页面、修正顺序）的间隔（秒）
+WATCH_INTERVAL = float(os.getenv("WATCH_INTERVAL", "5"))
+WATCH_RESYNC_INTERVAL = float(os.getenv("WATCH_RESYNC_INTERVAL", "600"))
+# 本地预览服务器（监视模式下启动，页面有变化时自动刷新浏览器）
+DEV_SERVER_HOST = os.getenv("DEV_SERVER_HOST", "127.0.0.1")
+DEV_SERVER_PORT = int(os.getenv("DEV_SERVER_PORT", "8000"))
+
 # 网站配置
 SITE_TITLE = "AI 使用技巧"
 SITE_DESCRIPTION = "记录日常使用 AI 的小技巧和经验"
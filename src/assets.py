@@ -0,0 +1,99 @@
+"""静态资源 - 共享的 CSS/JS 输出为带内容 hash 的文件，以及 HTML/CSS/JS 压缩"""
+import os
+import re
+import hashlib
+from typing import Optional
+import sys
+sys.path.insert(0, '..')
+from config import ASSETS_DIR, MINIFY_OUTPUT
+
+# 内容需要原样保留的元素（空白有意义或不是 HTML）
+_PRESERVE_RE = re.compile(r"<(pre|textarea|script|style)\b.*?</\1\s*>", re.S | re.I)
+_WHITESPACE_RE = re.compile(r"\s+")
+# CSS 注释（去掉）和字符串（原样保留），一起匹配以免字符串中的 /* 被当作注释
+_CSS_COMMENT_OR_STRING_RE = re.compile(r"""/\*.*?\*/|"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'""", re.S)
+# 前后的空白可以去掉的 CSS 符号（冒号前的空白在选择器中有意义，只去掉冒号后的）
+_CSS_PUNCT_RE = re.compile(r"\s*([{};,>])\s*|:\s+")
+_JS_LINE_COMMENT_RE = re.compile(r"^\s*//.*$", re.M)
+
+
+def _collapse(match) -> str:
+    return "\n" if "\n" in match.group(0) else " "
+
+
+def minify_html(html: str) -> str:
+    """合并 HTML 中连续的空白（包含换行时保留一个换行），不改变页面的显示
+
+    <pre>、<textarea>、<script>、<style> 中的内容原样保留
+    """
+    parts = []
+    position = 0
+    for match in _PRESERVE_RE.finditer(html):
+        parts.append(_WHITESPACE_RE.sub(_collapse, html[position:match.start()]))
+        parts.append(match.group(0))
+        position = match.end()
+    parts.append(_WHITESPACE_RE.sub(_collapse, html[position:]))
+    return "".join(parts)
+
+
+def _minify_css_code(css: str) -> str:
+    css = _WHITESPACE_RE.sub(" ", css)
+    css = _CSS_PUNCT_RE.sub(lambda m: m.group(1) or ":", css)
+    return css.replace(";}", "}")
+
+
+def minify_css(css: str) -> str:
+    """去掉注释、缩进和符号两侧的空白
+
+    引号中的字符串（content、font-family 等）原样保留
+    """
+    parts = []
+    code = []  # 两个字符串之间去掉注释后的代码
+    position = 0
+    for match in _CSS_COMMENT_OR_STRING_RE.finditer(css):
+        code.append(css[position:match.start()])
+        if not match.group(0).startswith("/*"):
+            parts.append(_minify_css_code("".join(code)))
+            parts.append(match.group(0))
+            code = []
+        position = match.end()
+    code.append(css[position:])
+    parts.append(_minify_css_code("".join(code)))
+    return "".join(parts).strip()
+
+
+def minify_js(js: str) -> str:
+    """去掉整行注释、缩进和空行（不改写代码本身，避免破坏字符串和正则）"""
+    js = _JS_LINE_COMMENT_RE.sub("", js)
+    return "\n".join(line.strip() for line in js.splitlines() if line.strip()) + "\n"
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+
+class AssetBundle:
+    """共享的 CSS/JS 资源
+
+    templates/assets/ 下的资源按模板渲染、压缩后以 name.<内容 hash>.ext 命名，
+    页面通过 urls 引用。内容不变时文件名不变，浏览器和 CDN 可以长期缓存
+    （Cache-Control: immutable），修改后页面引用新的文件名，不会读到旧版本
+    """
+
+    def __init__(self, env, names: tuple, context: Optional[dict] = None,
+                 output_dir: str = ASSETS_DIR, minify: bool = MINIFY_OUTPUT):
+        self.files = {}  # 输出的相对路径 -> 内容
+        self.urls = {}  # 资源名 -> 输出的相对路径
+        for name in names:
+            content = env.get_template(f"assets/{name}").render(**(context or {}))
+            stem, ext = os.path.splitext(name)
+            if minify and ext in MINIFIERS:
+                content = MINIFIERS[ext](content)
+            digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:10]
+            path = f"{output_dir}/{stem}.{digest}{ext}"
+            self.files[path] = content
+            self.urls[name] = path
+
+    def write(self, writer):
+        """写入所有资源文件（内容不变时不重写），未引用的旧版本在构建结束时被清理"""
+        for path, content in self.files.items():
+            writer.write(path, content)
@@ -1,56 +1,94 @@
 """Notion Block 解析器 - 将 Notion 块转换为 HTML"""
+import re
+from html import escape
 from typing import Optional
-from .notion_client import parse_rich_text_to_html
+from .notion_client import parse_rich_text, parse_rich_text_to_html
 from .image_handler import ImageHandler
+from .highlight import CodeHighlighter, HIGHLIGHT_CLASS
+from .fragment_cache import PageFragments
 
 
 class BlockParser:
-    """Notion Block 解析器"""
+    """Notion Block 解析器
 
-    def __init__(self, notion_client, image_handler: ImageHandler):
-        self.notion_client = notion_client
+    只做块到 HTML 的转换，不访问 Notion API：
+    嵌套的子块需要预先拉取到块的 "children" 字段（见 BlockTreeFetcher）
+    """
+
+    # 会渲染子块的块类型
+    CHILDREN_TYPES = ("bulleted_list_item", "numbered_list_item", "toggle")
+
+    # 图片占位符，图片下载完成后替换为 <figure>（富文本已转义，正文中不会出现）
+    IMAGE_PLACEHOLDER = "<!--image:{}-->"
+    IMAGE_PLACEHOLDER_RE = re.compile(r"<!--image:(\d+)-->")
+
+    # 正文图片的显示宽度（页面最大宽度 800px，两侧留白 20px）
+    IMAGE_SIZES = "(max-width: 800px) calc(100vw - 40px), 760px"
+
+    def __init__(self, image_handler: ImageHandler, highlighter: Optional[CodeHighlighter] = None):
         self.image_handler = image_handler
-        self.image_index = 0
+        self.highlighter = highlighter or CodeHighlighter()
+        self.pending_images = []  # [(Future, caption rich_text)]
 
-    def parse_blocks(self, blocks: list, page_id: str) -> str:
+    def parse_blocks(self, blocks: list, page_id: str,
+                     fragments: Optional[PageFragments] = None) -> str:
         """解析块列表为 HTML"""
-        self.image_index = 0
-        html_parts = []
+        return "\n".join(self.iter_html(blocks, page_id, fragments))
+
+    def iter_html(self, blocks, page_id: str, fragments: Optional[PageFragments] = None):
+        """逐块解析为 HTML 片段（blocks 可以是生成器，用于流式渲染）
 
+        每个片段中的图片在返回前完成替换；指定 fragments 时，
+        块树未修改的顶层块直接使用上次渲染的片段
+        """
         for block in blocks:
-            html = self.parse_block(block, page_id)
+            html = fragments.get_html(block) if fragments is not None else None
+            if html is None:
+                self.pending_images = []
+                html = self.parse_block(block, page_id)
+                if html:
+                    html = self._resolve_images(html)
+                if fragments is not None:
+                    fragments.put_html(block, html or "")
             if html:
-                html_parts.append(html)
-
-        return "\n".join(html_parts)
+                yield html
+
+    def _resolve_images(self, html: str) -> str:
+        """等待图片下载完成，将占位符替换为图片 HTML"""
+        if not self.pending_images:
+            return html
+
+        def replace(match):
+            future, caption = self.pending_images[int(match.group(1))]
+            return self._render_image(future.result(), caption)
+
+        html = self.IMAGE_PLACEHOLDER_RE.sub(replace, html)
+        self.pending_images = []
+        return html
+
+    @classmethod
+    def register(cls, block_type: str):
+        """注册块类型的渲染函数（装饰器），可用于扩展新的块类型或替换已有的渲染
+
+        渲染函数的签名为 func(parser, block, page_id) -> Optional[str]，例如：
+
+            @BlockParser.register("equation")
+            def render_equation(parser, block, page_id):
+                return f'<div class="equation">{block["equation"]["expression"]}</div>'
+        """
+        def decorator(func):
+            # 子类注册时不影响父类
+            if "renderers" not in cls.__dict__:
+                cls.renderers = dict(cls.renderers)
+            cls.renderers[block_type] = func
+            return func
+        return decorator
 
     def parse_block(self, block: dict, page_id: str) -> Optional[str]:
         """解析单个块为 HTML"""
-        block_type = block.get("type")
-        block_id = block.get("id")
-
-        parser_map = {
-            "paragraph": self._parse_paragraph,
-            "heading_1": self._parse_heading_1,
-            "heading_2": self._parse_heading_2,
-            "heading_3": self._parse_heading_3,
-            "bulleted_list_item": self._parse_bulleted_list_item,
-            "numbered_list_item": self._parse_numbered_list_item,
-            "code": self._parse_code,
-            "image": self._parse_image,
-            "quote": self._parse_quote,
-            "callout": self._parse_callout,
-            "divider": self._parse_divider,
-            "toggle": self._parse_toggle,
-            "to_do": self._parse_todo,
-            "bookmark": self._parse_bookmark,
-            "embed": self._parse_embed,
-            "video": self._parse_video,
-        }
-
-        parser = parser_map.get(block_type)
-        if parser:
-            return parser(block, page_id)
+        renderer = self.renderers.get(block.get("type"))
+        if renderer:
+            return renderer(self, block, page_id)
 
         # 未知类型，返回空
         return None
@@ -99,43 +137,96 @@ class BlockParser:
         rich_text = code_data.get("rich_text", [])
         language = code_data.get("language", "")
 
-        # 获取代码内容
-        code_content = ""
-        for item in rich_text:
-            code_content += item.get("plain_text", "")
+        # 构建时高亮（输出已转义），不支持的语言输出转义后的原文
+        code = parse_rich_text(rich_text)
+        highlighted = self.highlighter.highlight(code, language)
+        if highlighted is not None:
+            return f'<pre class="{HIGHLIGHT_CLASS}"><code class="language-{escape(language)}">{highlighted}</code></pre>'
 
-        # 转义 HTML
-        code_content = code_content.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        code_content = escape(code, quote=False)
+        return f'<pre><code class="language-{escape(language)}">{code_content}</code></pre>'
 
-        return f'<pre><code class="language-{language}">{code_content}</code></pre>'
+    @staticmethod
+    def _get_image_url(image_data: dict) -> Optional[str]:
+        """获取图片 URL"""
+        image_type = image_data.get("type")
+        if image_type == "file":
+            return image_data.get("file", {}).get("url")
+        elif image_type == "external":
+            return image_data.get("external", {}).get("url")
+        return None
+
+    def iter_image_urls(self, blocks: list):
+        """按渲染顺序列出块树中会渲染的图片 URL"""
+        for block in blocks:
+            if block.get("type") == "image":
+                url = self._get_image_url(block.get("image", {}))
+                if url:
+                    yield url
+            elif block.get("type") in self.CHILDREN_TYPES:
+                yield from self.iter_image_urls(block.get("children", []))
+
+    def iter_text(self, blocks: list):
+        """按顺序列出块树中的纯文本（用于搜索索引）"""
+        for block in blocks:
+            block_data = block.get(block.get("type"))
+            if isinstance(block_data, dict):
+                for key in ("rich_text", "caption"):
+                    text = parse_rich_text(block_data.get(key, []))
+                    if text:
+                        yield text
+            if block.get("type") in self.CHILDREN_TYPES:
+                yield from self.iter_text(block.get("children", []))
 
     def _parse_image(self, block: dict, page_id: str) -> str:
         image_data = block.get("image", {})
-        image_type = image_data.get("type")
 
         # 获取图片 URL
-        if image_type == "file":
-            url = image_data.get("file", {}).get("url")
-        elif image_type == "external":
-            url = image_data.get("external", {}).get("url")
-        else:
-            return ""
-
+        url = self._get_image_url(image_data)
         if not url:
             return ""
 
-        # 下载图片并获取本地路径
-        self.image_index += 1
-        local_path = self.image_handler.process_image(url, page_id, self.image_index)
+        # 提交下载，先输出占位符，全部解析完成后再替换
+        future = self.image_handler.submit(url, page_id)
+        caption = image_data.get("caption", [])
+        self.pending_images.append((future, caption))
+        return self.IMAGE_PLACEHOLDER.format(len(self.pending_images) - 1)
 
+    def _render_image(self, local_path: Optional[str], caption: list) -> str:
+        """生成图片 HTML"""
         if local_path:
-            # 获取图片说明
-            caption = parse_rich_text_to_html(image_data.get("caption", []))
-            caption_html = f"<figcaption>{caption}</figcaption>" if caption else ""
-            return f'<figure><img src="{local_path}" alt="{caption or "图片"}" loading="lazy">{caption_html}</figure>'
+            caption_html = parse_rich_text_to_html(caption)
+            caption_html = f"<figcaption>{caption_html}</figcaption>" if caption_html else ""
+            alt = escape(parse_rich_text(caption) or "图片")
+            srcset_attr = self._srcset_attr(local_path)
+            size_attr = self._size_attr(local_path)
+            return f'<figure><img src="{escape(local_path)}"{srcset_attr}{size_attr} alt="{alt}" loading="lazy">{caption_html}</figure>'
         else:
             return f'<p>[图片加载失败]</p>'
 
+    def _srcset_attr(self, local_path: str) -> str:
+        """生成响应式图片的 srcset/sizes 属性（没有变体时为空）"""
+        info = self.image_handler.get_image_info(local_path)
+        if not info or not info["srcset"]:
+            return ""
+
+        candidates = list(info["srcset"])
+        if all(width != info["width"] for _, width in candidates):
+            candidates.append((local_path, info["width"]))
+        srcset = ", ".join(f"{path} {width}w" for path, width in candidates)
+        return f' srcset="{srcset}" sizes="{self.IMAGE_SIZES}"'
+
+    def _size_attr(self, local_path: str) -> str:
+        """生成图片的固有尺寸（浏览器据此预留位置）和加载前显示的占位背景（尺寸未知时为空）"""
+        info = self.image_handler.get_image_info(local_path)
+        if not info or not info["width"] or not info["height"]:
+            return ""
+
+        attr = f' width="{info["width"]}" height="{info["height"]}"'
+        if info["placeholder"]:
+            attr += f' style="background:url({info["placeholder"]}) center/cover no-repeat"'
+        return attr
+
     def _parse_quote(self, block: dict, page_id: str) -> str:
         content = self._get_rich_text_html(block, "quote")
         return f"<blockquote>{content}</blockquote>"
@@ -148,7 +239,7 @@ class BlockParser:
         icon_data = callout_data.get("icon", {})
         icon = ""
         if icon_data.get("type") == "emoji":
-            icon = icon_data.get("emoji", "")
+            icon = escape(icon_data.get("emoji", ""), quote=False)
 
         return f'<div class="callout"><span class="callout-icon">{icon}</span><div class="callout-content">{content}</div></div>'
 
@@ -172,13 +263,13 @@ class BlockParser:
         bookmark_data = block.get("bookmark", {})
         url = bookmark_data.get("url", "")
         caption = parse_rich_text_to_html(bookmark_data.get("caption", []))
-        display = caption if caption else url
-        return f'<div class="bookmark"><a href="{url}" target="_blank">{display}</a></div>'
+        display = caption if caption else escape(url, quote=False)
+        return f'<div class="bookmark"><a href="{escape(url)}" target="_blank">{display}</a></div>'
 
     def _parse_embed(self, block: dict, page_id: str) -> str:
         embed_data = block.get("embed", {})
         url = embed_data.get("url", "")
-        return f'<div class="embed"><a href="{url}" target="_blank">{url}</a></div>'
+        return f'<div class="embed"><a href="{escape(url)}" target="_blank">{escape(url, quote=False)}</a></div>'
 
     def _parse_video(self, block: dict, page_id: str) -> str:
         video_data = block.get("video", {})
@@ -187,10 +278,10 @@ class BlockParser:
         if video_type == "external":
             url = video_data.get("external", {}).get("url", "")
             # YouTube 等外部视频
-            return f'<div class="video"><a href="{url}" target="_blank">视频链接: {url}</a></div>'
+            return f'<div class="video"><a href="{escape(url)}" target="_blank">视频链接: {escape(url, quote=False)}</a></div>'
         elif video_type == "file":
             url = video_data.get("file", {}).get("url", "")
-            return f'<video controls><source src="{url}"></video>'
+            return f'<video controls><source src="{escape(url)}"></video>'
 
         return ""
 
@@ -199,9 +290,7 @@ class BlockParser:
         if not block.get("has_children"):
             return ""
 
-        block_id = block.get("id")
-        children = self.notion_client.get_block_children(block_id)
-
+        children = block.get("children")
         if not children:
             return ""
 
@@ -212,3 +301,23 @@ class BlockParser:
                 html_parts.append(html)
 
         return "\n".join(html_parts)
+
+    # 块类型 -> 渲染函数，通过 register() 扩展
+    renderers = {
+        "paragraph": _parse_paragraph,
+        "heading_1": _parse_heading_1,
+        "heading_2": _parse_heading_2,
+        "heading_3": _parse_heading_3,
+        "bulleted_list_item": _parse_bulleted_list_item,
+        "numbered_list_item": _parse_numbered_list_item,
+        "code": _parse_code,
+        "image": _parse_image,
+        "quote": _parse_quote,
+        "callout": _parse_callout,
+        "divider": _parse_divider,
+        "toggle": _parse_toggle,
+        "to_do": _parse_todo,
+        "bookmark": _parse_bookmark,
+        "embed": _parse_embed,
+        "video": _parse_video,
+    }
@@ -0,0 +1,213 @@
+"""构建清单 - 记录每个页面的构建结果，用于增量构建"""
+import os
+import json
+import hashlib
+from contextlib import contextmanager
+from typing import Optional
+import sys
+sys.path.insert(0, '..')
+from config import BUILD_MANIFEST_PATH, CONTENT_CACHE_DIR
+
+# 清单格式版本，结构变化时递增
+MANIFEST_VERSION = 3
+
+
+def compute_fingerprint(*paths: str, extra: str = "", exclude: tuple = ()) -> str:
+    """计算构建指纹（模板、源码等文件内容的 hash）
+
+    指纹变化说明渲染结果可能不同，此时需要重建；exclude 中的文件不参与计算
+    """
+    excluded = {os.path.normpath(path) for path in exclude}
+    digest = hashlib.sha256(extra.encode())
+    for path in paths:
+        if os.path.isfile(path):
+            files = [path]
+        else:
+            files = []
+            for root, dirs, names in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+                files.extend(os.path.join(root, name) for name in sorted(names)
+                             if not name.endswith(".pyc"))
+        files = [f for f in files if os.path.normpath(f) not in excluded]
+        for file_path in files:
+            digest.update(file_path.replace(os.sep, "/").encode())
+            with open(file_path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def merge_recorded(page_infos, recorded: dict) -> list:
+    """用构建清单中的记录补全缓存的数据库查询结果（回放模式）
+
+    回放时使用的是上次完整查询缓存的响应，之后增量构建修改或新增的页面只在增量查询的响应
+    和清单中：记录的 last_edited_time 更新的页面使用记录的页面信息，查询结果中没有的页面
+    从记录补上，按修改时间从新到旧返回
+    """
+    merged = []
+    for page_info in page_infos:
+        entry = recorded.get(page_info["id"])
+        if entry and (entry.get("last_edited_time") or "") > (page_info.get("last_edited_time") or ""):
+            page_info = dict(entry["page"])
+        merged.append(page_info)
+    seen = {page_info["id"] for page_info in merged}
+    merged += [dict(entry["page"]) for page_id, entry in recorded.items() if page_id not in seen]
+    merged.sort(key=lambda page_info: page_info.get("last_edited_time") or "", reverse=True)
+    return merged
+
+
+class BuildManifest:
+    """构建清单
+
+    记录 页面 id -> last_edited_time、页面信息、生成的文件、引用的图片和预览数据，
+    未修改的页面可以直接复用上次的构建结果；增量查询数据库时，
+    未修改的页面不在查询结果中，页面信息也从清单读取。
+
+    指纹分为两部分：fingerprint（解析和下载相关的代码）变化时丢弃全部记录；
+    template_fingerprint（模板和 HTML 生成器）变化时保留记录，
+    页面用缓存的正文 HTML 重新套用模板，不必重新拉取和解析
+    """
+
+    def __init__(self, path: str = BUILD_MANIFEST_PATH, fingerprint: str = "",
+                 template_fingerprint: str = "", content_dir: str = CONTENT_CACHE_DIR):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.template_fingerprint = template_fingerprint
+        self.content_dir = content_dir
+        self.templates_changed = False
+        self.pages = {}  # page_id -> entry
+        self.full_scan_time = 0.0  # 上次完整查询数据库的时间（Unix 时间戳）
+        self.load()
+
+    def load(self):
+        """读取清单，格式或代码指纹不一致时丢弃旧记录"""
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取构建清单失败，将全量构建: {e}")
+            return
+
+        if data.get("version") != MANIFEST_VERSION:
+            print("构建清单版本变化，将全量构建")
+            return
+        if data.get("fingerprint") != self.fingerprint:
+            print("代码已变化，将全量构建")
+            return
+        if data.get("template_fingerprint") != self.template_fingerprint:
+            print("模板已变化，使用缓存的正文重新生成页面")
+            self.templates_changed = True
+
+        self.pages = data.get("pages", {})
+        self.full_scan_time = data.get("full_scan_time", 0.0)
+
+    def save(self):
+        """保存清单（先写临时文件再替换，避免中途失败留下损坏的清单）"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "fingerprint": self.fingerprint,
+            "template_fingerprint": self.template_fingerprint,
+            "full_scan_time": self.full_scan_time,
+            "pages": self.pages
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def get(self, page_id: str) -> Optional[dict]:
+        """获取页面的构建记录"""
+        return self.pages.get(page_id)
+
+    def is_fresh(self, page_info: dict, output_dir: str) -> bool:
+        """判断页面是否未修改且上次的构建产物仍然存在（有图片下载失败的页面不算）"""
+        if self.templates_changed:
+            return False
+        entry = self.pages.get(page_info["id"])
+        if not entry or entry.get("incomplete"):
+            return False
+        if entry.get("last_edited_time") != page_info.get("last_edited_time"):
+            return False
+
+        files = [entry.get("file")] + entry.get("images", [])
+        return all(f and os.path.exists(os.path.join(output_dir, f)) for f in files)
+
+    def has_content(self, page_info: dict, output_dir: str) -> bool:
+        """判断页面未修改，且缓存的正文和引用的图片都还在（可以只重新套用模板）"""
+        entry = self.pages.get(page_info["id"])
+        if not entry or entry.get("incomplete"):
+            return False
+        if entry.get("last_edited_time") != page_info.get("last_edited_time"):
+            return False
+        if not os.path.exists(self._content_path(page_info["id"])):
+            return False
+        return all(os.path.exists(os.path.join(output_dir, f)) for f in entry.get("images", []))
+
+    def _content_path(self, page_id: str) -> str:
+        return os.path.join(self.content_dir, f"{page_id}.html")
+
+    def load_content(self, page_id: str) -> str:
+        """读取缓存的正文 HTML"""
+        with open(self._content_path(page_id), "r", encoding="utf-8") as f:
+            return f.read()
+
+    def save_content(self, page_id: str, html: str):
+        """缓存页面的正文 HTML"""
+        with self.open_content(page_id) as f:
+            f.write(html)
+
+    @contextmanager
+    def open_content(self, page_id: str):
+        """以写入方式打开正文缓存（流式渲染时逐段写入），完成后才替换旧文件"""
+        os.makedirs(self.content_dir, exist_ok=True)
+        path = self._content_path(page_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                yield f
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def watermark(self) -> Optional[str]:
+        """已记录的页面中最新的 last_edited_time，之后修改的页面需要重新查询"""
+        return max((entry["last_edited_time"] for entry in self.pages.values()
+                    if entry.get("last_edited_time")), default=None)
+
+    def unchanged_pages(self, seen: set) -> list:
+        """增量查询时没有返回的页面（水位线之前未修改），按修改时间从新到旧返回记录的页面信息"""
+        entries = sorted((entry for page_id, entry in self.pages.items() if page_id not in seen),
+                         key=lambda entry: entry.get("last_edited_time") or "", reverse=True)
+        return [dict(entry["page"]) for entry in entries]
+
+    def update(self, page_info: dict, file: str, images: list, preview: dict,
+               incomplete: bool = False):
+        """记录页面的构建结果
+
+        incomplete 为 True 表示页面中有图片下载失败，下次构建时重新生成（不复用结果和正文）
+        """
+        self.pages[page_info["id"]] = {
+            "last_edited_time": page_info.get("last_edited_time"),
+            "page": {key: value for key, value in page_info.items() if key not in preview},
+            "file": file,
+            "images": sorted(set(images)),
+            "preview": preview,
+            "incomplete": incomplete
+        }
+
+    def prune(self, page_ids) -> list:
+        """移除不在 page_ids 中的页面记录，返回被移除的记录"""
+        keep = set(page_ids)
+        removed = []
+        for page_id in list(self.pages):
+            if page_id not in keep:
+                removed.append(self.pages.pop(page_id))
+                content_path = self._content_path(page_id)
+                if os.path.exists(content_path):
+                    os.remove(content_path)
+        return removed
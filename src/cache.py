@@ -0,0 +1,134 @@
+"""磁盘缓存 - 以 JSON 文件保存键值，支持过期时间和按总大小淘汰"""
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Optional
+from .tracing import tracer
+
+
+class DiskCache:
+    """磁盘缓存
+
+    每个键保存为一个 JSON 文件，文件的修改时间记录最近一次访问，
+    总大小超过 max_bytes 时按最近最少使用的顺序淘汰。可以在多个线程中同时使用：
+    命中计数和总大小的更新、淘汰都在锁内进行
+    """
+
+    def __init__(self, cache_dir: str, ttl: float = 0, max_bytes: int = 0, name: str = "cache"):
+        self.cache_dir = cache_dir
+        self.name = name  # 追踪计数器中使用的名称
+        self.ttl = ttl  # 秒，超过则视为过期
+        self.max_bytes = max_bytes  # 0 表示不限制
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes = None  # 首次写入时统计
+        self._lock = threading.RLock()
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.json")
+
+    def get(self, key: str, max_age: Optional[float] = None):
+        """读取缓存，不存在或已过期返回 None
+
+        max_age 为 None 时使用默认的 ttl，传入 math.inf 表示忽略过期时间
+        """
+        if max_age is None:
+            max_age = self.ttl
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._miss()
+            return None
+
+        if entry.get("key") != key or time.time() - entry.get("stored_at", 0) > max_age:
+            self._miss()
+            return None
+
+        # 更新访问时间，用于 LRU 淘汰
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        tracer.count(f"cache.{self.name}.hits")
+        return entry.get("value")
+
+    def _miss(self):
+        with self._lock:
+            self.misses += 1
+        tracer.count(f"cache.{self.name}.misses")
+
+    def set(self, key: str, value):
+        """写入缓存"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        data = json.dumps({"key": key, "stored_at": time.time(), "value": value},
+                          ensure_ascii=False)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+
+        # 替换文件和更新总大小一起在锁内进行，同一个键的并发写入不会重复计算旧文件的大小
+        with self._lock:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            if self.max_bytes:
+                if self._total_bytes is None:
+                    self._total_bytes = self._scan_size()
+                else:
+                    self._total_bytes += os.path.getsize(path) - old_size
+                if self._total_bytes > self.max_bytes:
+                    self.evict()
+
+    def _entries(self) -> list:
+        """列出所有缓存文件 (访问时间, 大小, 路径)"""
+        entries = []
+        if not os.path.exists(self.cache_dir):
+            return entries
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """按最近最少使用淘汰，直到总大小降到上限的 90%"""
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        self._total_bytes = total
+        if removed:
+            print(f"缓存淘汰 {removed} 个条目: {self.cache_dir}")
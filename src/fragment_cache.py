@@ -0,0 +1,118 @@
+"""块级片段缓存 - 按块 id、last_edited_time 和块内容复用渲染好的 HTML 和已拉取的子块"""
+import json
+import math
+import hashlib
+from typing import Optional
+import sys
+sys.path.insert(0, '..')
+from config import FRAGMENT_CACHE_DIR, FRAGMENT_CACHE_MAX_MB, FRAGMENT_CACHE_CHILDREN
+from .cache import DiskCache
+from .tracing import tracer
+
+# 渲染结果依赖下载结果或带有过期签名 URL 的块类型，不缓存
+UNCACHEABLE_TYPES = ("image", "video")
+
+
+def block_signature(block: dict) -> str:
+    """块及其已拉取子块的 id、last_edited_time 和内容 hash，任何一个块修改后签名都会变化
+
+    Notion 的 last_edited_time 精确到分钟，同一分钟内的再次修改只能从块的内容中发现
+    """
+    data = json.dumps({k: v for k, v in block.items() if k != "children"},
+                      sort_keys=True, ensure_ascii=False)
+    digest = hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+    signature = f"{block.get('id')}@{block.get('last_edited_time')}#{digest}"
+    children = block.get("children")
+    if children:
+        signature += "(" + ",".join(block_signature(child) for child in children) + ")"
+    return signature
+
+
+def cacheable(block: dict) -> bool:
+    if block.get("type") in UNCACHEABLE_TYPES:
+        return False
+    return all(cacheable(child) for child in block.get("children") or ())
+
+
+class PageFragments:
+    """一个页面的片段缓存
+
+    读取上次构建保存的片段，记录本次用到和新渲染的片段，保存时只保留这些，
+    已删除或已修改的块的旧片段随之丢弃
+    """
+
+    def __init__(self, page_id: str, html: Optional[dict] = None, children: Optional[dict] = None,
+                 reuse_children: bool = False):
+        self.page_id = page_id
+        self.reuse_children = reuse_children
+        self._previous_html = html or {}
+        self._previous_children = children or {}
+        self.html = {}  # 块签名 -> HTML
+        self.children = {}  # 块 id -> {"last_edited_time", "children"}
+
+    def get_html(self, block: dict) -> Optional[str]:
+        """已渲染的块 HTML，块树有变化或没有缓存时返回 None"""
+        key = block_signature(block)
+        html = self._previous_html.get(key)
+        if html is None:
+            tracer.count("fragments.html_misses")
+            return None
+        tracer.count("fragments.html_hits")
+        self.html[key] = html
+        return html
+
+    def put_html(self, block: dict, html: str):
+        if cacheable(block):
+            self.html[block_signature(block)] = html
+
+    def get_children(self, block: dict) -> Optional[list]:
+        """上次拉取的子块树，块的 last_edited_time 变化或没有缓存时返回 None"""
+        entry = self._previous_children.get(block["id"])
+        if entry is None or entry["last_edited_time"] != block.get("last_edited_time"):
+            tracer.count("fragments.children_misses")
+            return None
+        tracer.count("fragments.children_hits")
+        self.children[block["id"]] = entry
+        return entry["children"]
+
+    def put_children(self, block: dict, children: list):
+        # 保存的是块树中的同一个列表，更深的子块拉取后也会一起保存
+        self.children[block["id"]] = {"last_edited_time": block.get("last_edited_time"),
+                                      "children": children}
+
+
+class FragmentCache:
+    """块级片段缓存
+
+    每个页面的片段保存在一个缓存条目中（每页只读写一次文件），总大小超过上限时按 LRU 淘汰。
+    整页的片段都在内存中，因此流式渲染不使用片段缓存。
+    条目的键包含渲染器版本（源码指纹），代码变化后旧条目不再命中。
+
+    reuse_children 为 True 时，last_edited_time 未变化的块直接使用上次拉取的子块树，
+    不再请求 API。Notion 中修改子块的内容不会更新父块的 last_edited_time
+    （只有增删、移动子块时才会），因此默认关闭，开启后嵌套块的修改可能要等到 --full 构建才生效；
+    refresh_children 为 True 时（全量构建）重新拉取并保存所有子块树
+    """
+
+    def __init__(self, version: str, cache_dir: str = FRAGMENT_CACHE_DIR,
+                 max_bytes: int = FRAGMENT_CACHE_MAX_MB * 1024 * 1024,
+                 reuse_children: bool = FRAGMENT_CACHE_CHILDREN, refresh_children: bool = False):
+        self.version = version
+        self.reuse_children = reuse_children
+        self.refresh_children = refresh_children
+        self.cache = DiskCache(cache_dir, max_bytes=max_bytes, name="fragments")
+
+    def _key(self, page_id: str) -> str:
+        return f"{self.version}:{page_id}"
+
+    def load(self, page_id: str, fresh: bool = False) -> PageFragments:
+        """读取页面的片段缓存，fresh 为 True 时不使用上次的片段（所有块重新拉取和渲染，结果仍会保存）"""
+        entry = {} if fresh else self.cache.get(self._key(page_id), math.inf) or {}
+        children = None if self.refresh_children else entry.get("children")
+        return PageFragments(page_id, entry.get("html"), children, self.reuse_children)
+
+    def save(self, fragments: PageFragments):
+        self.cache.set(self._key(fragments.page_id), {
+            "html": fragments.html,
+            "children": fragments.children if self.reuse_children else {}
+        })
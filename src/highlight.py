@@ -0,0 +1,114 @@
+"""代码高亮 - 构建时用 Pygments 为代码块生成带样式类名的 HTML，结果按代码内容缓存"""
+import math
+import hashlib
+from functools import lru_cache
+from typing import Optional
+import sys
+sys.path.insert(0, '..')
+from config import (HIGHLIGHT_CODE, HIGHLIGHT_STYLE, HIGHLIGHT_DARK_STYLE, HIGHLIGHT_CACHE_DIR,
+                    HIGHLIGHT_CACHE_MAX_MB)
+from .cache import DiskCache
+
+try:
+    import pygments
+    from pygments import highlight as _pygments_highlight
+    from pygments.formatters import HtmlFormatter
+    from pygments.lexers import get_lexer_by_name
+    from pygments.util import ClassNotFound
+except ImportError:  # Pygments 为可选依赖，未安装时代码块不高亮
+    pygments = None
+
+# 高亮输出的格式变化时递增，使缓存失效
+HIGHLIGHT_VERSION = 2
+# 是否实际进行高亮（开启且安装了 Pygments），影响正文的渲染结果
+HIGHLIGHT_ENABLED = HIGHLIGHT_CODE and pygments is not None
+
+# 代码块的 class，样式表中的规则都以它为前缀
+HIGHLIGHT_CLASS = "highlight"
+
+# Notion 的语言名称 -> Pygments 词法分析器名称（名称相同的不必列出，None 表示不高亮）
+NOTION_LANGUAGES = {
+    "plain text": None,
+    "mermaid": None,
+    "ascii art": None,
+    "notion formula": None,
+    "dhall": None,  # Pygments 没有对应的词法分析器
+    "assembly": "nasm",
+    "llvm ir": "llvm",
+    "purescript": "haskell",  # Pygments 没有 PureScript，语法与 Haskell 接近
+    "c++": "cpp",
+    "c#": "csharp",
+    "f#": "fsharp",
+    "java/c/c++/c#": "java",
+    "flow": "javascript",
+    "markup": "html",
+    "shell": "bash",
+    "docker": "docker",
+    "objective-c": "objective-c",
+    "reason": "reasonml",
+    "vb.net": "vbnet",
+    "visual basic": "vbnet",
+    "webassembly": "wast",
+    "basic": "qbasic",
+}
+
+
+@lru_cache(maxsize=None)
+def _lexer(language: str):
+    """语言对应的词法分析器，没有对应的时返回 None（词法分析器是无状态的，可以跨线程复用）"""
+    name = NOTION_LANGUAGES.get(language, language)
+    if not name:
+        return None
+    try:
+        # 保留代码首尾的空行，与不高亮时的输出一致
+        return get_lexer_by_name(name, stripnl=False, ensurenl=False)
+    except ClassNotFound:
+        return None
+
+
+def highlight_stylesheet(style: str = HIGHLIGHT_STYLE, dark_style: str = HIGHLIGHT_DARK_STYLE) -> str:
+    """代码高亮的样式表（深色模式使用 dark_style），未开启高亮时为空
+
+    只包含各类词法单元的颜色，代码块的背景沿用站点的 --code-bg
+    """
+    if not HIGHLIGHT_ENABLED:
+        return ""
+    selector = f".{HIGHLIGHT_CLASS}"
+    rules = HtmlFormatter(style=style).get_token_style_defs(selector)
+    if dark_style:
+        dark_rules = HtmlFormatter(style=dark_style).get_token_style_defs(selector)
+        rules.append("@media (prefers-color-scheme: dark) {")
+        rules.extend(dark_rules)
+        rules.append("}")
+    return "\n".join(rules) + "\n"
+
+
+class CodeHighlighter:
+    """代码高亮器
+
+    高亮结果以 词法分析器 + 代码内容 hash 为键保存在磁盘缓存中，
+    与页面和渲染器代码无关：代码或模板变化后重新渲染页面时，未修改的代码块不必重新高亮
+    """
+
+    def __init__(self, cache_dir: str = HIGHLIGHT_CACHE_DIR,
+                 max_bytes: int = HIGHLIGHT_CACHE_MAX_MB * 1024 * 1024,
+                 enabled: bool = HIGHLIGHT_ENABLED):
+        self.enabled = enabled and pygments is not None
+        self.cache = DiskCache(cache_dir, max_bytes=max_bytes, name="highlight")
+        self._formatter = HtmlFormatter(nowrap=True) if self.enabled else None
+
+    def highlight(self, code: str, language: str) -> Optional[str]:
+        """返回高亮后的代码 HTML（不含 <pre>/<code>，已转义），不支持的语言或未开启时返回 None"""
+        if not self.enabled or not code:
+            return None
+        lexer = _lexer((language or "").lower())
+        if lexer is None:
+            return None
+
+        digest = hashlib.sha256(code.encode("utf-8")).hexdigest()
+        key = f"{HIGHLIGHT_VERSION}:{pygments.__version__}:{lexer.name}:{digest}"
+        html = self.cache.get(key, math.inf)
+        if html is None:
+            html = _pygments_highlight(code, lexer, self._formatter)
+            self.cache.set(key, html)
+        return html
@@ -1,19 +1,78 @@
 """HTML 生成器"""
 import os
-from datetime import datetime
-from jinja2 import Environment, FileSystemLoader
+import json
+from datetime import datetime, timezone
+from typing import Optional
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from markupsafe import Markup
 import sys
 sys.path.insert(0, '..')
-from config import OUTPUT_DIR, SITE_TITLE, SITE_DESCRIPTION
+from config import (OUTPUT_DIR, SITE_TITLE, SITE_DESCRIPTION, JINJA_CACHE_DIR, INDEX_PAGE_SIZE,
+                    SEARCH_INDEX, SEARCH_SHARDS, MINIFY_OUTPUT)
+from .assets import AssetBundle, minify_html
+from .highlight import highlight_stylesheet
+from .output_writer import OutputWriter
+from .tracing import tracer
 
 
 class HTMLGenerator:
-    """HTML 生成器"""
-
-    def __init__(self, templates_dir: str = "templates", output_dir: str = OUTPUT_DIR):
+    """HTML 生成器
+
+    页面由 templates/ 下的模板渲染（开启自动转义），模板在创建时加载一次，
+    编译结果缓存在磁盘上，之后的构建不必重新解析模板。
+    样式和脚本不内联在页面中，而是引用 templates/assets/ 生成的共享资源文件（见 AssetBundle）
+    """
+
+    # 流式生成时正文在页面中的位置标记
+    CONTENT_MARKER = "<!--article-content-->"
+
+    # 文章摘要清单，首页按需加载更多文章和切换排序时使用
+    ARTICLES_MANIFEST = "articles.json"
+    # 清单中每篇文章的字段（按顺序存为数组，减小体积）
+    # 封面占位图（data URI）只出现在首页 HTML 中，不放进清单
+    MANIFEST_FIELDS = ("id", "title", "ts", "date", "cover", "preview", "width", "height")
+
+    # templates/assets/ 下的共享资源
+    ASSETS = ("site.css", "article.css", "index.css", "index.js")
+    SEARCH_ASSETS = ("search.js",)
+    HIGHLIGHT_ASSETS = ("highlight.css",)
+
+    def __init__(self, templates_dir: str = "templates", output_dir: str = OUTPUT_DIR,
+                 bytecode_cache_dir: str = JINJA_CACHE_DIR, page_size: int = INDEX_PAGE_SIZE,
+                 writer: Optional[OutputWriter] = None, minify: bool = MINIFY_OUTPUT,
+                 search_shards: int = SEARCH_SHARDS):
         self.output_dir = output_dir
-        self.env = Environment(loader=FileSystemLoader(templates_dir))
+        self.minify = minify
+        self.writer = writer or OutputWriter(output_dir)
+        self.page_size = max(1, page_size)
+        bytecode_cache = None
+        if bytecode_cache_dir:
+            os.makedirs(bytecode_cache_dir, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+        self.env = Environment(
+            loader=FileSystemLoader(templates_dir),
+            autoescape=True,
+            trim_blocks=True,
+            lstrip_blocks=True,
+            bytecode_cache=bytecode_cache,
+            auto_reload=False  # 单次构建中模板不会变化，不必每次检查文件
+        )
         self.year = datetime.now().year
+        self.env.globals.update(
+            site_title=SITE_TITLE,
+            site_description=SITE_DESCRIPTION,
+            search_enabled=SEARCH_INDEX,
+            year=self.year
+        )
+        # 资源的文件名由内容决定，渲染页面之前先生成（只计算，generate_assets() 时写入）
+        highlight_css = highlight_stylesheet()
+        self.assets = AssetBundle(
+            self.env, self.ASSETS + (self.SEARCH_ASSETS if SEARCH_INDEX else ())
+            + (self.HIGHLIGHT_ASSETS if highlight_css else ()),
+            context={"shards": search_shards, "highlight_css": highlight_css}, minify=minify)
+        self.env.globals["assets"] = self.assets.urls
+        self.index_template = self.env.get_template("index.html")
+        self.article_template = self.env.get_template("article.html")
 
     def format_date(self, date_str: str) -> str:
         """格式化日期显示"""
@@ -30,277 +89,138 @@ class HTMLGenerator:
         except:
             return date_str
 
+    @staticmethod
+    def timestamp(date_str: str) -> int:
+        """日期转换为 Unix 时间戳（秒），无法解析时为 0"""
+        if not date_str:
+            return 0
+        try:
+            if "T" in date_str:
+                dt = datetime.fromisoformat(date_str.replace("Z", "+00:00"))
+            else:
+                dt = datetime.strptime(date_str, "%Y-%m-%d")
+        except ValueError:
+            return 0
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return int(dt.timestamp())
+
+    @staticmethod
+    def index_page_name(page: int) -> str:
+        """首页分页的文件名：第 1 页为 index.html，之后为 index-2.html ..."""
+        return "index.html" if page == 1 else f"index-{page}.html"
+
     def generate_index(self, articles: list):
-        """生成首页"""
+        """生成分页的首页和文章摘要清单"""
         # 准备文章数据
         for article in articles:
             date = article.get("date") or article.get("created_time")
             article["date_display"] = self.format_date(date)
+            article["timestamp"] = self.timestamp(date)
 
         # 按日期倒序排序
-        articles.sort(
-            key=lambda x: x.get("date") or x.get("created_time") or "",
-            reverse=True
-        )
-
-        # 读取基础模板
-        base_template = self.env.get_template("base.html")
-
-        # 生成文章列表 HTML
-        list_html = self._generate_list_html(articles)
-
-        # 渲染页面
-        html = base_template.render(
-            title="首页",
-            site_title=SITE_TITLE,
-            site_description=SITE_DESCRIPTION,
-            description=SITE_DESCRIPTION,
-            content=list_html,
-            year=self.year
-        )
-
-        # 写入文件
-        os.makedirs(self.output_dir, exist_ok=True)
-        output_path = os.path.join(self.output_dir, "index.html")
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(html)
-
-        print(f"生成首页: {output_path}")
-
-    def _generate_list_html(self, articles: list) -> str:
-        """生成文章列表 HTML"""
-        html = '''
-<div class="sort-controls">
-    <span>排序：</span>
-    <button class="sort-btn active" data-sort="desc">最新优先</button>
-    <button class="sort-btn" data-sort="asc">最早优先</button>
-</div>
-
-<div class="article-list" id="article-list">
-'''
-        for article in articles:
-            date = article.get("date") or article.get("created_time") or ""
-            cover_image = article.get("cover_image", "")
-            preview_text = article.get("preview_text", "")
-
-            # 封面图 HTML
-            if cover_image:
-                cover_html = f'<div class="article-cover"><img src="{cover_image}" alt="{article["title"]}" loading="lazy"></div>'
-            else:
-                cover_html = ''
-
-            # 预览文本 HTML
-            preview_html = f'<p class="article-preview">{preview_text}</p>' if preview_text else ''
-
-            html += f'''
-    <article class="article-item" data-date="{date}">
-        {cover_html}
-        <div class="article-content-wrap">
-            <a href="{article['id']}.html">
-                <h2 class="article-title">{article['title']}</h2>
-            </a>
-            {preview_html}
-            <div class="article-meta">
-                <time>{article['date_display']}</time>
-            </div>
-        </div>
-    </article>
-'''
-        html += '''
-</div>
-
-<style>
-    .sort-controls {
-        margin-bottom: 24px;
-        display: flex;
-        align-items: center;
-        gap: 8px;
-    }
-
-    .sort-btn {
-        padding: 6px 12px;
-        border: 1px solid var(--border-color);
-        background: var(--bg-color);
-        color: var(--text-color);
-        border-radius: 4px;
-        cursor: pointer;
-        font-size: 0.9em;
-    }
-
-    .sort-btn.active {
-        background: var(--text-color);
-        color: var(--bg-color);
-    }
-
-    .article-list {
-        display: flex;
-        flex-direction: column;
-        gap: 24px;
-    }
-
-    .article-item {
-        display: flex;
-        gap: 16px;
-        padding-bottom: 24px;
-        border-bottom: 1px solid var(--border-color);
-    }
-
-    .article-item:last-child {
-        border-bottom: none;
-    }
-
-    .article-cover {
-        flex-shrink: 0;
-        width: 160px;
-        height: 100px;
-        overflow: hidden;
-        border-radius: 6px;
-    }
-
-    .article-cover img {
-        width: 100%;
-        height: 100%;
-        object-fit: cover;
-    }
-
-    .article-content-wrap {
-        flex: 1;
-        min-width: 0;
-    }
-
-    .article-title {
-        font-size: 1.2em;
-        margin: 0 0 8px 0;
-        line-height: 1.4;
-    }
-
-    .article-preview {
-        color: var(--text-secondary);
-        font-size: 0.9em;
-        margin: 0 0 8px 0;
-        line-height: 1.5;
-        display: -webkit-box;
-        -webkit-line-clamp: 2;
-        -webkit-box-orient: vertical;
-        overflow: hidden;
-    }
-
-    .article-meta {
-        color: var(--text-secondary);
-        font-size: 0.85em;
-        display: flex;
-        gap: 12px;
-    }
-
-    @media (max-width: 600px) {
-        .article-item {
-            flex-direction: column;
-        }
-
-        .article-cover {
-            width: 100%;
-            height: 180px;
+        articles.sort(key=lambda x: x["timestamp"], reverse=True)
+
+        self._write_articles_manifest(articles)
+
+        total_pages = max(1, -(-len(articles) // self.page_size))
+        for page in range(1, total_pages + 1):
+            offset = (page - 1) * self.page_size
+            with tracer.span("template_render", "render", page=f"index-{page}"):
+                html = self._minify(self.index_template.render(
+                    title="首页" if page == 1 else f"首页 - 第 {page} 页",
+                    description=SITE_DESCRIPTION,
+                    articles=articles[offset:offset + self.page_size],
+                    page=page,
+                    total_pages=total_pages,
+                    prev_url=self.index_page_name(page - 1) if page > 1 else None,
+                    next_url=self.index_page_name(page + 1) if page < total_pages else None,
+                    offset=offset,
+                    page_size=self.page_size,
+                    total=len(articles),
+                    manifest_url=self.ARTICLES_MANIFEST
+                ))
+            self._write(self.index_page_name(page), html)
+
+        print(f"生成首页: {os.path.join(self.output_dir, 'index.html')}，共 {total_pages} 页")
+
+    def _write_articles_manifest(self, articles: list):
+        """写入文章摘要清单
+
+        文章按日期倒序排列，时间戳预先算好；order 中是两种排序下的文章下标，
+        浏览器切换排序时不必解析日期和重新比较
+        """
+        rows = [
+            [
+                article["id"],
+                article["title"],
+                article["timestamp"],
+                article["date_display"],
+                article.get("cover_thumbnail") or article.get("cover_image") or "",
+                article.get("preview_text", ""),
+                article.get("cover_width") or 0,
+                article.get("cover_height") or 0
+            ]
+            for article in articles
+        ]
+        # 稳定排序：日期相同的文章在两种排序下保持相同的相对顺序
+        ascending = sorted(range(len(articles)), key=lambda i: articles[i]["timestamp"])
+        data = {
+            "page_size": self.page_size,
+            "fields": list(self.MANIFEST_FIELDS),
+            "articles": rows,
+            "order": {"desc": list(range(len(articles))), "asc": ascending}
         }
-    }
-</style>
-
-<script>
-    document.addEventListener('DOMContentLoaded', function() {
-        const list = document.getElementById('article-list');
-        const buttons = document.querySelectorAll('.sort-btn');
-
-        buttons.forEach(btn => {
-            btn.addEventListener('click', function() {
-                buttons.forEach(b => b.classList.remove('active'));
-                this.classList.add('active');
-
-                const sort = this.dataset.sort;
-                const items = Array.from(list.querySelectorAll('.article-item'));
+        html = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        self._write(self.ARTICLES_MANIFEST, html)
 
-                items.sort((a, b) => {
-                    const dateA = new Date(a.dataset.date);
-                    const dateB = new Date(b.dataset.date);
-                    return sort === 'desc' ? dateB - dateA : dateA - dateB;
-                });
+    def generate_assets(self):
+        """写入页面引用的 CSS/JS 资源文件"""
+        self.assets.write(self.writer)
 
-                items.forEach(item => list.appendChild(item));
-            });
-        });
-    });
-</script>
-'''
-        return html
-
-    def generate_article(self, article: dict):
-        """生成文章详情页"""
+    def render_article(self, article: dict) -> str:
+        """渲染文章详情页 HTML"""
         date = article.get("date") or article.get("created_time")
         article["date_display"] = self.format_date(date)
 
-        # 读取基础模板
-        base_template = self.env.get_template("base.html")
+        # 渲染页面（正文是解析器生成的 HTML，不转义）
+        with tracer.span("template_render", "render", page=article["id"]):
+            return self._minify(self.article_template.render(
+                title=article["title"],
+                description=f'{article["title"]} - {SITE_DESCRIPTION}',
+                article=article,
+                content=Markup(article.get("content", ""))
+            ))
 
-        # 生成文章内容 HTML
-        article_html = self._generate_article_html(article)
+    def _minify(self, html: str) -> str:
+        return minify_html(html) if self.minify else html
 
-        # 渲染页面
-        html = base_template.render(
-            title=article["title"],
-            site_title=SITE_TITLE,
-            site_description=SITE_DESCRIPTION,
-            description=f'{article["title"]} - {SITE_DESCRIPTION}',
-            content=article_html,
-            year=self.year
-        )
-
-        # 写入文件
-        os.makedirs(self.output_dir, exist_ok=True)
+    def write_article(self, article: dict, html: str):
+        """写入文章详情页"""
         output_path = os.path.join(self.output_dir, f"{article['id']}.html")
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(html)
+        self._write(f"{article['id']}.html", html)
 
         print(f"生成文章: {output_path}")
 
-    def _generate_article_html(self, article: dict) -> str:
-        """生成文章内容 HTML"""
-        return f'''
-<article class="article">
-    <header class="article-header">
-        <h1>{article['title']}</h1>
-        <div class="article-meta">
-            <time>{article['date_display']}</time>
-        </div>
-    </header>
-
-    <div class="article-content">
-        {article.get('content', '')}
-    </div>
-
-    <nav class="article-nav">
-        <a href="index.html">&larr; 返回列表</a>
-    </nav>
-</article>
+    def _write(self, relative_path: str, content: str):
+        """写入输出目录中的文件（内容不变时不重写）"""
+        self.writer.write(relative_path, content)
 
-<style>
-    .article-header {{
-        margin-bottom: 32px;
-    }}
+    def write_article_stream(self, article: dict, chunks):
+        """流式生成文章详情页：正文片段逐个写入文件，不在内存中拼接整页
 
-    .article-header h1 {{
-        margin-top: 0;
-        font-size: 1.8em;
-    }}
+        写入临时文件，完成后再替换，中途失败不会留下不完整的页面
+        """
+        html = self.render_article(dict(article, content=self.CONTENT_MARKER))
+        prefix, suffix = html.split(self.CONTENT_MARKER, 1)
 
-    .article-meta {{
-        color: var(--text-secondary);
-    }}
-
-    .article-content {{
-        margin-bottom: 40px;
-    }}
+        output_path = os.path.join(self.output_dir, f"{article['id']}.html")
+        with self.writer.open(f"{article['id']}.html") as f:
+            f.write(prefix)
+            for i, chunk in enumerate(chunks):
+                if i:
+                    f.write("\n")
+                f.write(self._minify(chunk))
+            f.write(suffix)
 
-    .article-nav {{
-        padding-top: 20px;
-        border-top: 1px solid var(--border-color);
-    }}
-</style>
-'''
+        print(f"生成文章: {output_path}")
@@ -1,12 +1,22 @@
 """图片下载处理模块"""
 import os
 import hashlib
+import tempfile
+import threading
 import requests
+from concurrent.futures import Future, ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlparse
 from typing import Optional
 import sys
 sys.path.insert(0, '..')
-from config import IMAGES_DIR
+from config import IMAGES_DIR, IMAGE_DOWNLOAD_WORKERS, IMAGE_PER_HOST_LIMIT, IMAGE_OPTIMIZE
+from .image_store import ImageStore, stable_image_key
+from .image_optimizer import ImageOptimizer
+from .tracing import tracer
+
+# 流式下载时每次写入的块大小
+CHUNK_SIZE = 64 * 1024
 
 
 def get_image_extension(url: str, content_type: Optional[str] = None) -> str:
@@ -34,80 +44,222 @@ def get_image_extension(url: str, content_type: Optional[str] = None) -> str:
     return ".png"  # 默认
 
 
-def generate_image_filename(url: str, page_id: str, index: int) -> str:
-    """生成图片文件名"""
-    # 使用 URL 的 hash 确保唯一性
-    url_hash = hashlib.md5(url.encode()).hexdigest()[:8]
-    return f"{page_id[:8]}_{index}_{url_hash}"
-
+def download_image(session: requests.Session, url: str, tmp_dir: str) -> tuple:
+    """流式下载图片到临时文件，返回 (临时文件路径, 内容 sha256, 扩展名)
 
-def download_image(url: str, save_path: str) -> bool:
-    """下载图片到本地"""
-    try:
-        response = requests.get(url, timeout=30)
+    边下载边写入并计算 hash，内存占用与图片大小无关
+    """
+    with session.get(url, timeout=30, stream=True) as response:
         response.raise_for_status()
 
         # 获取扩展名
         content_type = response.headers.get("Content-Type", "")
         ext = get_image_extension(url, content_type)
 
-        # 确保路径包含扩展名
-        if not save_path.endswith(ext):
-            save_path = save_path + ext
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix=".part")
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    digest.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    return tmp_path, digest.hexdigest(), ext
+
+
+class ResolvedImages:
+    """已下载完成的图片（可序列化）
 
-        # 确保目录存在
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    提供与 ImageHandler 相同的 submit() / get_image_info() 接口，
+    供其他进程中的 BlockParser 使用，不会再下载图片
+    """
 
-        with open(save_path, "wb") as f:
-            f.write(response.content)
+    def __init__(self, paths: dict, info: dict):
+        self.paths = paths  # URL 稳定标识 -> 本地相对路径（失败为 None）
+        self.info = info  # 本地相对路径 -> 尺寸和变体信息
 
-        return True
-    except Exception as e:
-        print(f"下载图片失败: {url}, 错误: {e}")
-        return False
+    def submit(self, url: str, page_id: str) -> Future:
+        future = Future()
+        future.set_result(self.paths.get(stable_image_key(url)))
+        return future
+
+    def get_image_info(self, relative_path: str) -> Optional[dict]:
+        return self.info.get(relative_path)
 
 
 class ImageHandler:
-    """图片处理器"""
+    """图片处理器
+
+    图片在线程池中并发下载（同一主机同时下载的数量有限制），
+    submit() 立即返回 Future，解析和渲染不必等待下载。
+    下载的图片保存在跨构建的图片库中，以内容 hash 命名，
+    Notion 重新签名 URL 后也不会重复下载；安装了 Pillow 时同时生成缩略图和响应式变体
+    """
 
-    def __init__(self, images_dir: str = IMAGES_DIR):
+    def __init__(self, images_dir: str = IMAGES_DIR, offline: bool = False,
+                 workers: int = IMAGE_DOWNLOAD_WORKERS, per_host: int = IMAGE_PER_HOST_LIMIT,
+                 store: Optional[ImageStore] = None, optimize: bool = IMAGE_OPTIMIZE):
         self.images_dir = images_dir
-        self.downloaded_images = {}  # url -> local_path
+        self.offline = offline  # 离线模式：只使用图片库中已有的图片
+        self.store = store or ImageStore()
+        self.optimizer = None
+        if optimize:
+            if ImageOptimizer.available():
+                self.optimizer = ImageOptimizer(self.store)
+            else:
+                print("未安装 Pillow，跳过图片优化")
+        self.downloaded_images = {}  # 稳定标识 -> Future[local_path]
+        self.image_info = {}  # local_path -> 尺寸和变体信息
+        self.page_images = {}  # page_id -> [local_path]
+        self.page_keys = {}  # page_id -> 页面提交的图片的稳定标识
+        self.failed_keys = set()  # 下载失败（或离线时不存在）的图片的稳定标识
+        self.per_host = per_host
+        self._host_limits = {}  # 主机名 -> Semaphore
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image")
 
-    def process_image(self, url: str, page_id: str, index: int) -> Optional[str]:
-        """处理图片：下载并返回本地路径"""
-        if not url:
-            return None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
-        # 检查是否已下载
-        if url in self.downloaded_images:
-            return self.downloaded_images[url]
+    def submit(self, url: str, page_id: str) -> Future:
+        """提交图片下载，返回结果为本地相对路径（失败为 None）的 Future"""
+        key = stable_image_key(url)
+        with self._lock:
+            self.page_keys.setdefault(page_id, set()).add(key)
+            future = self.downloaded_images.get(key)
+            if future is None:
+                name = self.store.lookup(key)
+                if name:
+                    future = self._executor.submit(self._prepare, name)
+                elif self.offline:
+                    print(f"离线模式下图片不存在: {url}")
+                    self.failed_keys.add(key)
+                    future = Future()
+                    future.set_result(None)
+                else:
+                    future = self._executor.submit(self._download, url, key)
+                self.downloaded_images[key] = future
 
-        # 生成文件名
-        filename = generate_image_filename(url, page_id, index)
+        # 记录页面引用的图片
+        future.add_done_callback(lambda f: self._record(page_id, f.result()))
+        return future
 
-        # 先下载获取真实扩展名
+    def _host_limit(self, url: str) -> threading.Semaphore:
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_limits[host]
+
+    def _download(self, url: str, key: str) -> Optional[str]:
+        """在下载线程中执行"""
         try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            content_type = response.headers.get("Content-Type", "")
-            ext = get_image_extension(url, content_type)
+            with self._host_limit(url), tracer.span("image_download", "image", url=url):
+                tmp_path, content_hash, ext = download_image(self.session, url, self.store.tmp_dir)
+            tracer.count("image.downloads")
+            tracer.count("image.bytes_downloaded", os.path.getsize(tmp_path))
+            name = self.store.add(key, tmp_path, content_hash, ext)
+        except Exception as e:
+            print(f"处理图片失败: {url}, 错误: {e}")
+            # 在 Future 完成之前记录，等待结果的调用方随后即可查询
+            with self._lock:
+                self.failed_keys.add(key)
+            return None
+        return self._prepare(name)
 
-            save_path = os.path.join(self.images_dir, filename + ext)
-            os.makedirs(self.images_dir, exist_ok=True)
+    def _prepare(self, name: str) -> str:
+        """优化图片并放到输出目录，返回相对路径（用于 HTML）"""
+        relative_path = f"images/{name}"
+        self.store.export(name, self.images_dir)
+        meta = self.store.describe(name)
 
-            with open(save_path, "wb") as f:
-                f.write(response.content)
+        info = None
+        if self.optimizer is not None:
+            try:
+                info = self.optimizer.optimize(name)
+            except Exception as e:
+                print(f"优化图片失败: {name}, 错误: {e}")
+            if info is not None:
+                for variant_name, _ in info["srcset"]:
+                    self.store.export(variant_name, self.images_dir)
 
-            # 返回相对路径（用于 HTML）
-            relative_path = f"images/{filename}{ext}"
-            self.downloaded_images[url] = relative_path
-            return relative_path
+        with self._lock:
+            self.image_info[relative_path] = {
+                "width": meta["width"] or (info["width"] if info else None),
+                "height": meta["height"] or (info["height"] if info else None),
+                "placeholder": meta["placeholder"],
+                "srcset": info["srcset"] if info else [],
+                "thumbnail": info["thumbnail"] if info else None
+            }
+        return relative_path
 
-        except Exception as e:
-            print(f"处理图片失败: {url}, 错误: {e}")
+    def get_image_info(self, relative_path: str) -> Optional[dict]:
+        """获取图片的尺寸、占位图和变体信息
+
+        返回 {"width", "height", "placeholder": data URI 或 None,
+              "srcset": [(相对路径, 宽度)], "thumbnail": 相对路径或 None}，尺寸未知时为 None
+        """
+        with self._lock:
+            info = self.image_info.get(relative_path)
+        if info is None:
             return None
+        thumbnail = info.get("thumbnail")
+        return {
+            "width": info["width"],
+            "height": info["height"],
+            "placeholder": info["placeholder"],
+            "srcset": [(f"images/{name}", width) for name, width in info["srcset"]],
+            "thumbnail": f"images/{thumbnail}" if thumbnail else None
+        }
+
+    def _record(self, page_id: str, relative_path: Optional[str]):
+        """记录页面引用的图片（包括优化生成的变体）"""
+        if not relative_path:
+            return
+        info = self.get_image_info(relative_path)
+        files = [relative_path] + ([path for path, _ in info["srcset"]] if info else [])
+        with self._lock:
+            self.page_images.setdefault(page_id, []).extend(files)
+
+    def get_page_images(self, page_id: str) -> list:
+        """获取页面引用的所有图片（相对路径）"""
+        with self._lock:
+            return list(self.page_images.get(page_id, []))
+
+    def has_failures(self, page_id: str) -> bool:
+        """页面提交的图片中是否有下载失败的（页面中显示为加载失败，下次构建需要重试）"""
+        with self._lock:
+            return not self.page_keys.get(page_id, set()).isdisjoint(self.failed_keys)
 
     def get_local_path(self, url: str) -> Optional[str]:
         """获取已下载图片的本地路径"""
-        return self.downloaded_images.get(url)
+        future = self.downloaded_images.get(stable_image_key(url))
+        return future.result() if future is not None else None
+
+    def resolve(self, urls) -> ResolvedImages:
+        """等待已提交的图片下载完成，返回可以传给其他进程的图片信息"""
+        paths = {}
+        info = {}
+        for url in urls:
+            key = stable_image_key(url)
+            if key in paths:
+                continue
+            path = self.get_local_path(url)
+            paths[key] = path
+            if path:
+                info[path] = self.get_image_info(path)
+        return ResolvedImages(paths, info)
+
+    def shutdown(self):
+        """等待所有下载完成，保存图片库索引并释放线程池"""
+        self._executor.shutdown(wait=True)
+        if self.optimizer is not None:
+            self.optimizer.shutdown()
+        self.store.save()
+        self.session.close()
@@ -0,0 +1,199 @@
+"""图片元数据 - 从文件头读取图片尺寸（不解码图片），并生成内联的低质量占位图"""
+import io
+import os
+import json
+import base64
+import struct
+import threading
+from typing import Optional
+import sys
+sys.path.insert(0, '..')
+from config import IMAGE_PLACEHOLDER, IMAGE_PLACEHOLDER_SIZE
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow 为可选依赖，未安装时只读取尺寸
+    Image = None
+
+# 读取或占位图逻辑变化时递增，使保存的元数据失效
+META_VERSION = 1
+
+# 带有尺寸信息的 JPEG 帧头（SOF）标记
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# 没有长度字段的 JPEG 标记
+JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8, 0xD9}
+
+
+def _exif_orientation(data: bytes) -> int:
+    """从 APP1 段的 EXIF 数据中读取方向（1 为正常）"""
+    if not data.startswith(b"Exif\0\0") or len(data) < 14:
+        return 1
+    tiff = data[6:]
+    order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if order is None:
+        return 1
+    try:
+        (offset,) = struct.unpack(order + "I", tiff[4:8])
+        (count,) = struct.unpack(order + "H", tiff[offset:offset + 2])
+        for i in range(count):
+            entry = tiff[offset + 2 + i * 12:offset + 14 + i * 12]
+            tag, _, _, value = struct.unpack(order + "HHI2s", entry[:10])
+            if tag == 0x0112:
+                return struct.unpack(order + "H", value)[0]
+    except struct.error:
+        pass
+    return 1
+
+
+def _jpeg_size(f) -> Optional[tuple]:
+    """逐段跳过 JPEG 的标记段，直到读到帧头"""
+    f.seek(2)
+    orientation = 1
+    while True:
+        byte = f.read(1)
+        while byte and byte != b"\xff":
+            byte = f.read(1)
+        while byte == b"\xff":  # 标记前可以有填充字节
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        header = f.read(2)
+        if len(header) < 2:
+            return None
+        length = struct.unpack(">H", header)[0] - 2
+        if marker in JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack(">HH", data[1:5])
+            # EXIF 方向为 5-8 时图片显示时旋转 90 度
+            return (height, width) if orientation >= 5 else (width, height)
+        if marker == 0xE1:
+            orientation = max(orientation, _exif_orientation(f.read(length)))
+        else:
+            f.seek(length, os.SEEK_CUR)
+
+
+def _webp_size(head: bytes) -> Optional[tuple]:
+    chunk = head[12:16]
+    if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and head[20] == 0x2F:
+        bits = int.from_bytes(head[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        return int.from_bytes(head[24:27], "little") + 1, int.from_bytes(head[27:30], "little") + 1
+    return None
+
+
+def probe_size(path: str) -> Optional[tuple]:
+    """只读取文件头获取图片的显示尺寸 (宽, 高)，支持 PNG、JPEG、GIF、WebP，其他格式返回 None"""
+    with open(path, "rb") as f:
+        head = f.read(32)
+        if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+            return struct.unpack(">II", head[16:24])
+        if head[:6] in (b"GIF87a", b"GIF89a"):
+            return struct.unpack("<HH", head[6:10])
+        if head[:4] == b"RIFF" and head[8:12] == b"WEBP" and len(head) >= 30:
+            return _webp_size(head)
+        if head[:2] == b"\xff\xd8":
+            return _jpeg_size(f)
+    return None
+
+
+def make_placeholder(path: str, size: int = IMAGE_PLACEHOLDER_SIZE) -> Optional[str]:
+    """生成缩小到 size 像素以内的占位图（data URI），需要 Pillow；带透明通道的图片不生成
+
+    占位图作为 <img> 的背景，加载完成后被图片覆盖，透明区域会露出占位图
+    """
+    if Image is None:
+        return None
+    try:
+        with Image.open(path) as image:
+            # JPEG 按比例缩小解码，不必解码完整图片
+            image.draft("RGB", (size * 8, size * 8))
+            if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+                return None
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            image.thumbnail((size, size))
+            buffer = io.BytesIO()
+            if features.check("webp"):
+                image.save(buffer, "WEBP", quality=40)
+                mime = "image/webp"
+            else:
+                image.save(buffer, "PNG", optimize=True)
+                mime = "image/png"
+    except Exception:
+        return None
+    return f"data:{mime};base64,{base64.b64encode(buffer.getvalue()).decode('ascii')}"
+
+
+class ImageMetaIndex:
+    """图片元数据索引
+
+    文件名（内容 hash）-> {"width", "height", "placeholder"}，保存在图片库目录中，
+    每张图片只读取一次文件头、生成一次占位图，之后的构建只查表
+    """
+
+    def __init__(self, path: str, placeholder: bool = IMAGE_PLACEHOLDER,
+                 placeholder_size: int = IMAGE_PLACEHOLDER_SIZE):
+        self.path = path
+        self.placeholder = placeholder
+        self.placeholder_size = placeholder_size
+        self.options = [META_VERSION, placeholder, placeholder_size]
+        self.images = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("options") == self.options:
+                    self.images = data.get("images", {})
+            except (OSError, ValueError) as e:
+                print(f"读取图片元数据失败: {e}")
+
+    def get(self, name: str, source_path: str) -> dict:
+        """获取图片的元数据，没有记录时读取文件（无法识别的格式各项为 None）"""
+        with self._lock:
+            meta = self.images.get(name)
+        if meta is not None:
+            return meta
+
+        size = probe_size(source_path)
+        meta = {
+            "width": size[0] if size else None,
+            "height": size[1] if size else None,
+            "placeholder": make_placeholder(source_path, self.placeholder_size)
+            if self.placeholder and size else None
+        }
+        with self._lock:
+            self.images[name] = meta
+            self._dirty = True
+        return meta
+
+    def prune(self, names):
+        """移除不在 names 中的图片的元数据"""
+        keep = set(names)
+        with self._lock:
+            for name in list(self.images):
+                if name not in keep:
+                    del self.images[name]
+                    self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps({"options": self.options, "images": self.images},
+                              ensure_ascii=False, sort_keys=True)
+            self._dirty = False
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
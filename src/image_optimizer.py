@@ -0,0 +1,161 @@
+"""图片优化 - 生成缩略图和响应式尺寸的图片变体"""
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import sys
+sys.path.insert(0, '..')
+from config import (IMAGE_WIDTHS, IMAGE_THUMBNAIL_WIDTH, IMAGE_OPTIMIZE_PROCESSES,
+                    IMAGE_AVIF, IMAGE_VARIANT_CACHE_DIR)
+from .cache import DiskCache
+from .process_pool import spawn_pool
+from .tracing import tracer
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow 为可选依赖
+    Image = None
+
+# 优化逻辑变化时递增，使缓存的结果失效
+OPTIMIZER_VERSION = 1
+
+# 各格式的编码参数（不传入 exif/icc 等元数据，保存时即被去除）
+ENCODE_OPTIONS = {
+    "JPEG": {"quality": 82, "optimize": True, "progressive": True},
+    "PNG": {"optimize": True},
+    "WEBP": {"quality": 80, "method": 6},
+    "AVIF": {"quality": 60},
+}
+EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "AVIF": ".avif"}
+
+
+def _encode_smallest(image, formats: list, tmp_dir: str) -> tuple:
+    """用多种格式编码，保留体积最小的一个，返回 (临时文件路径, 扩展名, 大小)"""
+    best = None
+    for fmt in formats:
+        converted = image
+        if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+            if "A" in image.getbands():
+                continue  # JPEG 不支持透明通道
+            converted = image.convert("RGB")
+        fd, path = tempfile.mkstemp(dir=tmp_dir, suffix=EXTENSIONS[fmt])
+        with os.fdopen(fd, "wb") as f:
+            converted.save(f, fmt, **ENCODE_OPTIONS[fmt])
+        size = os.path.getsize(path)
+        if best is None or size < best[2]:
+            if best:
+                os.remove(best[0])
+            best = (path, EXTENSIONS[fmt], size)
+        else:
+            os.remove(path)
+    return best
+
+
+def optimize_image(source_path: str, stem: str, widths: list, thumbnail_width: int,
+                   avif: bool, tmp_dir: str) -> Optional[dict]:
+    """生成图片变体（在子进程中执行）
+
+    返回 {"width", "height", "variants": [(文件名, 临时文件路径, 宽度)], "thumbnail": 文件名}，
+    无法处理的图片（SVG、动图等）返回只含尺寸或 None
+    """
+    try:
+        source = Image.open(source_path)
+    except Exception:
+        return None
+
+    with source:
+        width, height = source.size
+        if getattr(source, "is_animated", False) or source.format not in ("JPEG", "PNG", "WEBP"):
+            return {"width": width, "height": height, "variants": [], "thumbnail": None}
+
+        image = ImageOps.exif_transpose(source)
+        width, height = image.size
+        formats = [source.format, "WEBP"] if source.format != "WEBP" else ["WEBP"]
+        if avif and features.check("avif"):
+            formats.append("AVIF")
+
+        source_size = os.path.getsize(source_path)
+        variants = []
+        thumbnail = None
+        for target in sorted(set(widths) | {thumbnail_width, width}):
+            if target > width:
+                continue  # 不放大
+            resized = image if target == width else image.resize(
+                (target, max(1, round(height * target / width))), Image.LANCZOS)
+            path, ext, size = _encode_smallest(resized, formats, tmp_dir)
+            if target == width and size >= source_size * 0.9:
+                # 原尺寸重新编码收益不大，直接使用原图
+                os.remove(path)
+                continue
+            name = f"{stem}_{target}{ext}"
+            variants.append((name, path, target))
+            if target == thumbnail_width:
+                thumbnail = name
+
+    return {"width": width, "height": height, "variants": variants, "thumbnail": thumbnail}
+
+
+class ImageOptimizer:
+    """图片优化器
+
+    在进程池中生成缩略图（首页封面用）和多种宽度的变体（正文 srcset 用），
+    在体积更小时重新编码为 WebP（可选 AVIF），并去除元数据。
+    结果按原图内容 hash 缓存，同一张图片只处理一次
+    """
+
+    def __init__(self, store, processes: int = IMAGE_OPTIMIZE_PROCESSES,
+                 widths: tuple = IMAGE_WIDTHS, thumbnail_width: int = IMAGE_THUMBNAIL_WIDTH,
+                 avif: bool = IMAGE_AVIF, cache_dir: str = IMAGE_VARIANT_CACHE_DIR):
+        self.store = store
+        self.widths = sorted(widths)
+        self.thumbnail_width = thumbnail_width
+        self.avif = avif
+        self.cache = DiskCache(cache_dir, ttl=float("inf"), name="image_variants")
+        self.processes = processes
+        self._executor = None  # 首次需要处理图片时才启动进程池
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def available() -> bool:
+        """是否安装了 Pillow"""
+        return Image is not None
+
+    def optimize(self, name: str) -> Optional[dict]:
+        """处理图片库中的图片，返回 {"width", "height", "srcset": [(文件名, 宽度)], "thumbnail"}"""
+        key = f"{OPTIMIZER_VERSION}:{name}:{self.widths}:{self.thumbnail_width}:{self.avif}"
+        info = self.cache.get(key)
+        files = [n for n, _ in info["srcset"]] if info else []
+        if info is not None and all(os.path.exists(self.store.object_path(n)) for n in files):
+            return info
+
+        stem = os.path.splitext(name)[0]
+        with tracer.span("image_optimize", "image", name=name):
+            result = self._pool().submit(
+                optimize_image, self.store.object_path(name), stem, self.widths,
+                self.thumbnail_width, self.avif, self.store.tmp_dir).result()
+        if result is None:
+            return None
+
+        srcset = []
+        for variant_name, tmp_path, width in result["variants"]:
+            self.store.put(variant_name, tmp_path)
+            srcset.append((variant_name, width))
+        info = {
+            "width": result["width"],
+            "height": result["height"],
+            "srcset": srcset,
+            "thumbnail": result["thumbnail"]
+        }
+        self.cache.set(key, info)
+        return info
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = spawn_pool(self.processes)
+            return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
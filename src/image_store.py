@@ -0,0 +1,148 @@
+"""图片库 - 跨构建持久保存已下载的图片，按内容 hash 去重"""
+import os
+import json
+import shutil
+import threading
+from typing import Optional
+from urllib.parse import urlparse, parse_qs
+import sys
+sys.path.insert(0, '..')
+from config import IMAGE_STORE_DIR
+from .image_meta import ImageMetaIndex
+
+# 签名 URL 的查询参数，每次请求 API 都会变化，不参与图片标识
+SIGNED_QUERY_KEYS = ("X-Amz-Signature", "X-Amz-Credential", "Signature", "Expires")
+
+
+def stable_image_key(url: str) -> str:
+    """图片的稳定标识
+
+    Notion 上传的图片是带签名的 S3 URL，每次调用 API 签名都不同，
+    去掉查询参数后的对象路径才是稳定的；外部图片使用完整 URL
+    """
+    parsed = urlparse(url)
+    query = parse_qs(parsed.query)
+    if any(key in query for key in SIGNED_QUERY_KEYS):
+        return f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
+    return url
+
+
+class ImageStore:
+    """内容寻址的图片库
+
+    index.json 记录 稳定标识 -> 图片文件名（内容 hash + 扩展名），
+    图片文件保存在 objects/ 下，内容相同的图片只保存一份；
+    meta.json 记录每张图片的尺寸和占位图
+    """
+
+    def __init__(self, store_dir: str = IMAGE_STORE_DIR):
+        self.store_dir = store_dir
+        self.objects_dir = os.path.join(store_dir, "objects")
+        self.tmp_dir = os.path.join(store_dir, "tmp")
+        self.index_path = os.path.join(store_dir, "index.json")
+        self.index = {}  # 稳定标识 -> 文件名
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.meta = ImageMetaIndex(os.path.join(store_dir, "meta.json"))
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    self.index = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"读取图片库索引失败: {e}")
+
+    def object_path(self, name: str) -> str:
+        return os.path.join(self.objects_dir, name[:2], name)
+
+    def lookup(self, key: str) -> Optional[str]:
+        """按稳定标识查找已保存的图片，返回文件名"""
+        with self._lock:
+            name = self.index.get(key)
+        if name and os.path.exists(self.object_path(name)):
+            return name
+        return None
+
+    def add(self, key: str, tmp_path: str, content_hash: str, ext: str) -> str:
+        """保存下载完成的临时文件，返回文件名"""
+        name = f"{content_hash[:16]}{ext}"
+        self.put(name, tmp_path)
+
+        with self._lock:
+            self.index[key] = name
+            self._dirty = True
+        return name
+
+    def put(self, name: str, tmp_path: str):
+        """将临时文件以指定文件名保存到图片库（已存在则丢弃临时文件）"""
+        path = self.object_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+
+    def describe(self, name: str) -> dict:
+        """图片的尺寸和占位图 {"width", "height", "placeholder"}"""
+        return self.meta.get(name, self.object_path(name))
+
+    def export(self, name: str, target_dir: str) -> str:
+        """将图片放到输出目录（优先硬链接），返回目标路径"""
+        target = os.path.join(target_dir, name)
+        if not os.path.exists(target):
+            os.makedirs(target_dir, exist_ok=True)
+            tmp_target = f"{target}.{threading.get_ident()}.tmp"
+            try:
+                os.link(self.object_path(name), tmp_target)
+            except OSError:
+                shutil.copyfile(self.object_path(name), tmp_target)
+            os.replace(tmp_target, target)
+        return target
+
+    def collect_garbage(self, live_names) -> dict:
+        """删除不在 live_names 中的图片（原图和优化生成的变体）及其索引和元数据
+
+        live_names 是构建清单中所有页面引用的文件名，在构建结束、所有下载和优化完成后调用；
+        同时清理中断的构建留下的临时文件。返回 {"removed": 文件数, "bytes": 释放的字节数}
+        """
+        live = set(live_names)
+        removed = 0
+        freed = 0
+        for directory, is_garbage in ((self.objects_dir, lambda name: name not in live),
+                                      (self.tmp_dir, lambda name: True)):
+            for root, _, names in os.walk(directory):
+                for name in names:
+                    if not is_garbage(name):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        size = os.path.getsize(path)
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    removed += 1
+                    freed += size
+
+        with self._lock:
+            for key, name in list(self.index.items()):
+                if name not in live:
+                    del self.index[key]
+                    self._dirty = True
+        self.meta.prune(live)
+        self.save()
+        return {"removed": removed, "bytes": freed}
+
+    def save(self):
+        """保存索引和图片元数据"""
+        self.meta.save()
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self.index, ensure_ascii=False, indent=1, sort_keys=True)
+            self._dirty = False
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.index_path)
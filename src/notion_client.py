@@ -1,73 +1,190 @@
 """Notion API 客户端"""
-import requests
+import json
+import math
+from html import escape
 from typing import Optional
 import sys
 sys.path.insert(0, '..')
-from config import NOTION_TOKEN, NOTION_DATABASE_ID, NOTION_VERSION
+from config import NOTION_TOKEN, NOTION_DATABASE_ID, NOTION_VERSION, NOTION_API_BASE
+from .cache import DiskCache
+from .notion_transport import NotionTransport
+from .snapshot import SnapshotStore
+from .tracing import tracer
+
+
+# extract_page_info 读取的数据库属性
+TITLE_PROPERTY = "分享标题"
+DATE_PROPERTY = "分享时间"
+HAS_IMAGE_PROPERTY = "是否有图片"
+PAGE_PROPERTIES = (TITLE_PROPERTY, DATE_PROPERTY, HAS_IMAGE_PROPERTY)
 
 
 class NotionClient:
     """Notion API 客户端"""
 
-    BASE_URL = "https://api.notion.com/v1"
+    BASE_URL = NOTION_API_BASE
 
-    def __init__(self, token: str = NOTION_TOKEN):
+    def __init__(self, token: str = NOTION_TOKEN, cache: Optional[DiskCache] = None,
+                 replay: bool = False, transport: Optional[NotionTransport] = None,
+                 snapshot: Optional[SnapshotStore] = None, from_snapshot: bool = False):
         self.token = token
         self.headers = {
             "Authorization": f"Bearer {token}",
             "Notion-Version": NOTION_VERSION,
             "Content-Type": "application/json"
         }
+        self.cache = cache
+        self.replay = replay  # 回放模式：只读缓存，不访问网络
+        self.transport = transport or NotionTransport(self.headers)
+
+        if replay and cache is None:
+            raise ValueError("回放模式需要启用响应缓存")
+        # 拉取到的页面和块写入快照；from_snapshot 时只从快照读取，不访问网络。
+        # 回放的响应可能早于快照中的数据，回放模式下不写入快照
+        self.snapshot = snapshot
+        self.record_snapshot = snapshot is not None and not replay
+        self.from_snapshot = from_snapshot
+        if from_snapshot and snapshot is None:
+            raise ValueError("从快照构建需要指定快照")
+        self._property_ids = {}  # 数据库 id -> 查询时返回的属性 id
+
+    def _request(self, method: str, endpoint: str, params: Optional[dict] = None,
+                 payload: Optional[dict] = None) -> dict:
+        """发送 API 请求，优先使用缓存的响应"""
+        cache_key = json.dumps({
+            "method": method,
+            "endpoint": endpoint,
+            "params": params or {},
+            "payload": payload or {}
+        }, sort_keys=True)
+
+        if self.cache is not None:
+            cached = self.cache.get(cache_key, math.inf if self.replay else None)
+            if cached is not None:
+                return cached
+
+        if self.replay:
+            raise RuntimeError(f"回放模式下缓存未命中: {method} {endpoint} {params or payload or ''}")
+
+        url = f"{self.BASE_URL}{endpoint}"
+        if method == "POST":
+            result = self.transport.request(method, url, params=params, json=payload)
+        else:
+            result = self.transport.request(method, url, params=params)
+
+        if self.cache is not None:
+            self.cache.set(cache_key, result)
+        return result
+
+    def get_database(self, database_id: str = NOTION_DATABASE_ID) -> dict:
+        """获取数据库的结构（属性名称、id 和类型）"""
+        return self._request("GET", f"/databases/{database_id}")
+
+    def property_ids(self, database_id: str = NOTION_DATABASE_ID) -> Optional[list]:
+        """extract_page_info 读取的属性的 id（查询时只返回这些属性），数据库中缺少某个属性时返回 None"""
+        if database_id not in self._property_ids:
+            properties = self.get_database(database_id).get("properties", {})
+            ids = [properties[name]["id"] for name in PAGE_PROPERTIES if name in properties]
+            if len(ids) != len(PAGE_PROPERTIES):
+                print(f"数据库中缺少属性，将返回页面的所有属性: {PAGE_PROPERTIES}")
+                ids = None
+            self._property_ids[database_id] = ids
+        return self._property_ids[database_id]
 
     def query_database(self, database_id: str = NOTION_DATABASE_ID,
-                       start_cursor: Optional[str] = None) -> dict:
-        """查询数据库，获取所有页面"""
-        url = f"{self.BASE_URL}/databases/{database_id}/query"
+                       start_cursor: Optional[str] = None, filter: Optional[dict] = None,
+                       sorts: Optional[list] = None, properties: Optional[list] = None) -> dict:
+        """查询数据库，获取所有页面（可指定过滤条件、排序和返回的属性 id）"""
         payload = {}
         if start_cursor:
             payload["start_cursor"] = start_cursor
+        if filter:
+            payload["filter"] = filter
+        if sorts:
+            payload["sorts"] = sorts
+        params = {"filter_properties": properties} if properties else None
 
-        response = requests.post(url, headers=self.headers, json=payload)
-        response.raise_for_status()
-        return response.json()
+        with tracer.span("database_query", "notion", cursor=start_cursor):
+            return self._request("POST", f"/databases/{database_id}/query", params=params,
+                                 payload=payload)
 
-    def get_all_pages(self, database_id: str = NOTION_DATABASE_ID) -> list:
-        """获取数据库中的所有页面（处理分页）"""
-        all_pages = []
+    def iter_pages(self, database_id: str = NOTION_DATABASE_ID, since: Optional[str] = None):
+        """逐页查询数据库，按修改时间从新到旧依次返回页面（不必等待全部分页完成）
+
+        服务端过滤掉标题为空的页面，并且只返回 extract_page_info 读取的属性。
+        指定 since 时由服务端过滤，只返回 last_edited_time 不早于 since 的页面
+        （Notion 的 last_edited_time 精确到分钟，同一分钟内的页面由调用方比较时间去重）；
+        过滤条件是请求的一部分，增量查询的响应与完整查询分开缓存
+        """
+        if self.from_snapshot:
+            yield from self.snapshot.get_pages()
+            return
+
+        page_filter = {"property": TITLE_PROPERTY, "title": {"is_not_empty": True}}
+        if since is not None:
+            page_filter = {"and": [page_filter, {"timestamp": "last_edited_time",
+                                                 "last_edited_time": {"on_or_after": since}}]}
+        sorts = [{"timestamp": "last_edited_time", "direction": "descending"}]
+        properties = self.property_ids(database_id)
         start_cursor = None
+        page_ids = []
 
         while True:
-            result = self.query_database(database_id, start_cursor)
-            all_pages.extend(result.get("results", []))
+            result = self.query_database(database_id, start_cursor, filter=page_filter,
+                                         sorts=sorts, properties=properties)
+            for page in result.get("results", []):
+                if self.record_snapshot:
+                    # 增量查询只更新修改过的页面，原有页面保持位置
+                    self.snapshot.put_page(page, None if since is not None else len(page_ids))
+                page_ids.append(page["id"])
+                yield page
 
             if not result.get("has_more"):
                 break
             start_cursor = result.get("next_cursor")
 
-        return all_pages
+        # 完整查询后删除快照中已不在数据库里的页面
+        if self.record_snapshot and since is None:
+            self.snapshot.retain_pages(page_ids)
+
+    def get_all_pages(self, database_id: str = NOTION_DATABASE_ID) -> list:
+        """获取数据库中的所有页面（处理分页）"""
+        return list(self.iter_pages(database_id))
+
+    def iter_page_blocks(self, page_id: str):
+        """逐页获取页面的块，依次返回（不保留已返回的分页）"""
+        if self.from_snapshot:
+            blocks = self.snapshot.get_children(page_id)
+            if blocks is None:
+                raise RuntimeError(f"快照中没有完整的子块: {page_id}")
+            yield from blocks
+            return
 
-    def get_page_blocks(self, page_id: str) -> list:
-        """获取页面的所有块内容"""
-        all_blocks = []
         start_cursor = None
+        position = 0
 
         while True:
-            url = f"{self.BASE_URL}/blocks/{page_id}/children"
             params = {}
             if start_cursor:
                 params["start_cursor"] = start_cursor
 
-            response = requests.get(url, headers=self.headers, params=params)
-            response.raise_for_status()
-            result = response.json()
-
-            all_blocks.extend(result.get("results", []))
+            result = self._request("GET", f"/blocks/{page_id}/children", params=params)
+            blocks = result.get("results", [])
+            if self.record_snapshot:
+                self.snapshot.put_children(page_id, blocks, position)
+                position += len(blocks)
+            yield from blocks
 
             if not result.get("has_more"):
                 break
             start_cursor = result.get("next_cursor")
 
-        return all_blocks
+        if self.record_snapshot:
+            self.snapshot.mark_fetched(page_id)
+
+    def get_page_blocks(self, page_id: str) -> list:
+        """获取页面的所有块内容"""
+        return list(self.iter_page_blocks(page_id))
 
     def get_block_children(self, block_id: str) -> list:
         """获取块的子块（用于嵌套内容如 toggle、callout 等）"""
@@ -76,39 +193,67 @@ class NotionClient:
 
 def parse_rich_text(rich_text_list: list) -> str:
     """解析 Notion rich_text 为纯文本"""
-    text = ""
-    for item in rich_text_list:
-        text += item.get("plain_text", "")
-    return text
+    return "".join(item.get("plain_text", "") for item in rich_text_list)
+
+
+# 富文本格式 -> 标签，按从内到外的嵌套顺序，第 i 个格式对应掩码的第 i 位
+ANNOTATION_TAGS = (
+    ("code", "code"),
+    ("bold", "strong"),
+    ("italic", "em"),
+    ("strikethrough", "del"),
+    ("underline", "u"),
+)
+
+
+def _build_annotation_wrappers() -> list:
+    """预先生成所有格式组合（按掩码索引）对应的 (开始标签, 结束标签)"""
+    wrappers = []
+    for mask in range(1 << len(ANNOTATION_TAGS)):
+        tags = [tag for i, (_, tag) in enumerate(ANNOTATION_TAGS) if mask & (1 << i)]
+        opening = "".join(f"<{tag}>" for tag in reversed(tags))
+        closing = "".join(f"</{tag}>" for tag in tags)
+        wrappers.append((opening, closing))
+    return wrappers
+
+
+ANNOTATION_WRAPPERS = _build_annotation_wrappers()
 
 
 def parse_rich_text_to_html(rich_text_list: list) -> str:
     """解析 Notion rich_text 为 HTML（保留格式）"""
-    html = ""
+    parts = []
     for item in rich_text_list:
         content = item.get("plain_text", "")
-        annotations = item.get("annotations", {})
-        href = item.get("href")
 
-        # 转义 HTML 特殊字符
-        content = content.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        # 转义 HTML 特殊字符（大部分文本不含特殊字符，先检查再转义）
+        if "&" in content or "<" in content or ">" in content:
+            content = escape(content, quote=False)
 
         # 应用格式
-        if annotations.get("code"):
-            content = f"<code>{content}</code>"
-        if annotations.get("bold"):
-            content = f"<strong>{content}</strong>"
-        if annotations.get("italic"):
-            content = f"<em>{content}</em>"
-        if annotations.get("strikethrough"):
-            content = f"<del>{content}</del>"
-        if annotations.get("underline"):
-            content = f"<u>{content}</u>"
+        annotations = item.get("annotations")
+        if annotations:
+            mask = 0
+            if annotations.get("code"):
+                mask = 1
+            if annotations.get("bold"):
+                mask |= 2
+            if annotations.get("italic"):
+                mask |= 4
+            if annotations.get("strikethrough"):
+                mask |= 8
+            if annotations.get("underline"):
+                mask |= 16
+            if mask:
+                opening, closing = ANNOTATION_WRAPPERS[mask]
+                content = f"{opening}{content}{closing}"
+
+        href = item.get("href")
         if href:
-            content = f'<a href="{href}" target="_blank">{content}</a>'
+            content = f'<a href="{escape(href)}" target="_blank">{content}</a>'
 
-        html += content
-    return html
+        parts.append(content)
+    return "".join(parts)
 
 
 def extract_page_info(page: dict) -> dict:
@@ -116,17 +261,17 @@ def extract_page_info(page: dict) -> dict:
     properties = page.get("properties", {})
 
     # 获取标题
-    title_prop = properties.get("分享标题", {})
+    title_prop = properties.get(TITLE_PROPERTY, {})
     title_list = title_prop.get("title", [])
     title = parse_rich_text(title_list) if title_list else "无标题"
 
     # 获取日期
-    date_prop = properties.get("分享时间", {})
+    date_prop = properties.get(DATE_PROPERTY, {})
     date_obj = date_prop.get("date")
     date = date_obj.get("start") if date_obj else None
 
     # 获取是否有图片
-    has_image = properties.get("是否有图片", {}).get("checkbox", False)
+    has_image = properties.get(HAS_IMAGE_PROPERTY, {}).get("checkbox", False)
 
     return {
         "id": page.get("id"),
@@ -0,0 +1,190 @@
+"""Notion API 传输层 - 连接复用、限速、重试和自适应并发"""
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+from .tracing import tracer
+import sys
+sys.path.insert(0, '..')
+from config import (NOTION_RATE_LIMIT, NOTION_RATE_BURST, NOTION_MAX_RETRIES,
+                    NOTION_TIMEOUT, NOTION_MAX_CONCURRENCY)
+
+
+class TokenBucket:
+    """令牌桶限速器：平均 rate 次/秒，允许 capacity 次突发"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取出一个令牌，令牌不足时等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """暂停发放令牌（收到 429 时所有请求一起等待）"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+class AIMDController:
+    """AIMD 并发控制器
+
+    请求成功且延迟正常时并发上限缓慢增加（每个窗口 +1），
+    收到 429 或延迟明显变高时成倍降低
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, initial: Optional[float] = None,
+                 latency_factor: float = 2.0):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(initial or min(2, max_limit))
+        self.latency_factor = latency_factor
+        self.base_latency = None  # 观察到的最低延迟
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self, latency: float):
+        with self._cond:
+            if self.base_latency is None or latency < self.base_latency:
+                self.base_latency = latency
+            if latency > self.base_latency * self.latency_factor and latency > 0.5:
+                self.limit = max(self.min_limit, self.limit * 0.9)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def on_throttle(self):
+        with self._cond:
+            self.limit = max(self.min_limit, self.limit / 2)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头（秒数或 HTTP 日期）"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class NotionTransport:
+    """Notion API 传输层
+
+    所有请求共用一个带连接池的 requests.Session（keep-alive），
+    通过令牌桶限速，429 时遵守 Retry-After，5xx 和网络错误按带抖动的指数退避重试
+    """
+
+    BACKOFF_BASE = 0.5  # 秒
+    BACKOFF_MAX = 30.0
+
+    def __init__(self, headers: dict, rate: float = NOTION_RATE_LIMIT,
+                 burst: float = NOTION_RATE_BURST, max_retries: int = NOTION_MAX_RETRIES,
+                 timeout: float = NOTION_TIMEOUT, max_concurrency: int = NOTION_MAX_CONCURRENCY):
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.bucket = TokenBucket(rate, burst)
+        self.controller = AIMDController(max_concurrency)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "bytes": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key: str, value: int = 1):
+        with self._lock:
+            self.stats[key] += value
+        tracer.count(f"http.{key}", value)
+
+    def _backoff(self, attempt: int) -> float:
+        """带完全抖动的指数退避时间"""
+        return random.uniform(0, min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2 ** attempt))
+
+    def request(self, method: str, url: str, **kwargs) -> dict:
+        """发送请求并返回 JSON，可重试的错误自动重试"""
+        with tracer.span("http_request", "http", method=method, url=url):
+            return self._request(method, url, **kwargs)
+
+    def _request(self, method: str, url: str, **kwargs) -> dict:
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count("retries")
+
+            self.bucket.acquire()
+            self.controller.acquire()
+            start = time.monotonic()
+            try:
+                self._count("requests")
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                print(f"请求失败，准备重试: {url}, 错误: {e}")
+                time.sleep(self._backoff(attempt))
+                continue
+            finally:
+                self.controller.release()
+            latency = time.monotonic() - start
+            self._count("bytes", len(response.content))
+
+            if response.status_code == 429:
+                self._count("throttled")
+                self.controller.on_throttle()
+                if attempt == self.max_retries:
+                    response.raise_for_status()
+                wait = parse_retry_after(response.headers.get("Retry-After"))
+                wait = wait if wait is not None else self._backoff(attempt)
+                print(f"触发 Notion 限流，等待 {wait:.1f}s 后重试")
+                self.bucket.pause(wait)
+                continue
+
+            if response.status_code >= 500 and attempt < self.max_retries:
+                print(f"Notion 服务端错误 {response.status_code}，准备重试: {url}")
+                time.sleep(self._backoff(attempt))
+                continue
+
+            response.raise_for_status()
+            self.controller.on_success(latency)
+            return response.json()
+
+        raise RuntimeError(f"请求重试次数耗尽: {method} {url}")
@@ -0,0 +1,199 @@
+"""输出写入器 - 只写入内容有变化的文件，并清理本次构建没有生成的文件"""
+import os
+import json
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Union
+import sys
+sys.path.insert(0, '..')
+from config import OUTPUT_DIR, OUTPUT_STATE_PATH, OUTPUT_CHANGES_PATH
+from .tracing import tracer
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _HashingFile:
+    """写入文本时同时计算内容 hash"""
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.sha256()
+
+    def write(self, text: str):
+        self.digest.update(text.encode("utf-8"))
+        self.f.write(text)
+
+
+class OutputWriter:
+    """输出写入器
+
+    记录每个输出文件的内容 hash（保存在构建缓存中），内容不变的文件不重写，
+    mtime 和 ETag 保持不变；有变化的文件先写临时文件再原子替换，
+    构建中途失败时旧文件仍然完整。构建成功后 collect_garbage() 删除本次没有生成的文件，
+    并输出变更列表（新增、修改、删除的文件）供部署使用
+    """
+
+    def __init__(self, output_dir: str = OUTPUT_DIR, state_path: str = OUTPUT_STATE_PATH,
+                 changes_path: str = OUTPUT_CHANGES_PATH):
+        self.output_dir = output_dir
+        self.state_path = state_path
+        self.changes_path = changes_path
+        self.hashes = {}  # 相对路径 -> 上次写入的内容 hash
+        self.produced = {}  # 本次构建生成或保留的文件：相对路径 -> hash
+        self.changes = {"added": [], "modified": [], "deleted": []}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self.hashes = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取输出记录失败，将与现有文件逐个比较: {e}")
+
+    def _path(self, relative_path: str) -> str:
+        return os.path.join(self.output_dir, relative_path)
+
+    def _previous_hash(self, relative_path: str):
+        """上次写入的 hash；没有记录时计算现有文件的 hash，文件不存在时为 None"""
+        path = self._path(relative_path)
+        if not os.path.exists(path):
+            return None
+        previous = self.hashes.get(relative_path)
+        return previous if previous is not None else _hash_file(path)
+
+    def _record(self, relative_path: str, content_hash: str, previous):
+        with self._lock:
+            self.produced[relative_path] = content_hash
+            if previous is None:
+                self.changes["added"].append(relative_path)
+            elif previous != content_hash:
+                self.changes["modified"].append(relative_path)
+
+    def write(self, relative_path: str, content: Union[str, bytes]) -> bool:
+        """写入文件，内容与上次相同时跳过，返回是否实际写入"""
+        data = content.encode("utf-8") if isinstance(content, str) else content
+        content_hash = hashlib.sha256(data).hexdigest()
+        previous = self._previous_hash(relative_path)
+        self._record(relative_path, content_hash, previous)
+        if previous == content_hash:
+            tracer.count("output.files_unchanged")
+            return False
+
+        path = self._path(relative_path)
+        with tracer.span("file_write", "io", path=path):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        tracer.count("output.files_written")
+        tracer.count("output.bytes_written", len(data))
+        return True
+
+    @contextmanager
+    def open(self, relative_path: str):
+        """以文本方式流式写入文件：边写边计算 hash，内容不变时丢弃临时文件"""
+        path = self._path(relative_path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                hashing_file = _HashingFile(f)
+                yield hashing_file
+            content_hash = hashing_file.digest.hexdigest()
+            previous = self._previous_hash(relative_path)
+            self._record(relative_path, content_hash, previous)
+            if previous == content_hash:
+                os.remove(tmp_path)
+                tracer.count("output.files_unchanged")
+            else:
+                tracer.count("output.files_written")
+                tracer.count("output.bytes_written", os.path.getsize(tmp_path))
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def keep(self, relative_path: str):
+        """保留本次没有重写、但仍然需要的文件（复用的页面、图片等）"""
+        path = self._path(relative_path)
+        if not os.path.exists(path):
+            return
+        with self._lock:
+            if relative_path in self.produced:
+                return
+            previous = self.hashes.get(relative_path)
+        if previous is None:
+            # 新出现的文件（例如从图片库导出的图片）
+            self._record(relative_path, _hash_file(path), None)
+        else:
+            with self._lock:
+                self.produced[relative_path] = previous
+
+    def adopt(self, relative_path: str):
+        """登记由其他进程直接写入输出目录的文件（例如预压缩生成的 .gz）"""
+        content_hash = _hash_file(self._path(relative_path))
+        with self._lock:
+            previous = self.hashes.get(relative_path)
+        self._record(relative_path, content_hash, previous)
+
+    def recorded(self, relative_path: str) -> bool:
+        """文件是否在上次构建中生成且仍然存在"""
+        with self._lock:
+            known = relative_path in self.hashes
+        return known and os.path.exists(self._path(relative_path))
+
+    def unchanged(self, relative_path: str) -> bool:
+        """本次构建生成的文件内容与上次相同"""
+        with self._lock:
+            current = self.produced.get(relative_path)
+            return current is not None and current == self.hashes.get(relative_path)
+
+    def produced_files(self) -> list:
+        """本次构建生成或保留的文件（相对路径）"""
+        with self._lock:
+            return sorted(self.produced)
+
+    def collect_garbage(self) -> dict:
+        """删除输出目录中本次构建没有生成或保留的文件，保存记录和变更列表"""
+        for root, dirs, names in os.walk(self.output_dir, topdown=False):
+            for name in names:
+                path = os.path.join(root, name)
+                relative_path = os.path.relpath(path, self.output_dir).replace(os.sep, "/")
+                if relative_path not in self.produced:
+                    os.remove(path)
+                    self.changes["deleted"].append(relative_path)
+                    print(f"删除过期文件: {relative_path}")
+            if root != self.output_dir and not os.listdir(root):
+                os.rmdir(root)
+
+        self.hashes = dict(self.produced)
+        for key in self.changes:
+            self.changes[key].sort()
+        self._save_json(self.state_path, self.hashes)
+        self._save_json(self.changes_path, self.changes)
+        return self.changes
+
+    @staticmethod
+    def _save_json(path: str, data):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, path)
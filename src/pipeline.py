@@ -0,0 +1,143 @@
+"""构建流水线 - 各阶段在独立线程中并发执行，阶段之间通过有界队列连接"""
+import time
+import queue
+import threading
+from typing import Callable, Iterable
+from .tracing import tracer
+
+# 阶段结束标记
+_DONE = object()
+
+
+class Stage:
+    """流水线阶段
+
+    func 接收上一阶段的输出，返回交给下一阶段的结果，返回 None 表示丢弃
+    """
+
+    def __init__(self, name: str, func: Callable, workers: int = 1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+
+
+class Pipeline:
+    """多阶段并发流水线
+
+    网络密集的阶段（拉取块、下载图片）可以和 CPU 密集的阶段（解析、渲染）重叠执行；
+    队列有界，上游不会无限制地领先下游占用内存
+    """
+
+    def __init__(self, stages: list, queue_size: int = 16):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.stats = {}  # 阶段名 -> {"items": 处理数量, "busy": 累计耗时（秒）}
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._error = None
+        self._lock = threading.Lock()
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        """放入队列，流水线中止时放弃"""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        """从队列取出，流水线中止时返回结束标记"""
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fail(self, error: BaseException):
+        with self._lock:
+            if self._error is None:
+                self._error = error
+        self._stop.set()
+
+    def _feed(self, items: Iterable, out_q: queue.Queue, workers: int):
+        try:
+            for item in items:
+                if not self._put(out_q, item):
+                    return
+        except BaseException as e:
+            self._fail(e)
+            return
+        for _ in range(workers):
+            self._put(out_q, _DONE)
+
+    def _work(self, stage: Stage, in_q: queue.Queue, out_q: queue.Queue,
+              next_workers: int, remaining: list):
+        stats = self.stats[stage.name]
+        while True:
+            item = self._get(in_q)
+            if item is _DONE:
+                break
+
+            start = time.perf_counter()
+            try:
+                with tracer.span(f"stage.{stage.name}", "pipeline"):
+                    result = stage.func(item)
+            except BaseException as e:
+                self._fail(e)
+                return
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                stats["items"] += 1
+                stats["busy"] += elapsed
+
+            if result is not None and not self._put(out_q, result):
+                return
+
+        # 本阶段最后一个结束的线程通知下游结束
+        with self._lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            for _ in range(next_workers):
+                self._put(out_q, _DONE)
+
+    def run(self, items: Iterable) -> list:
+        """执行流水线，返回最后一个阶段的全部输出（按完成顺序）"""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        queues.append(queue.Queue())  # 结果队列不限长度，由当前线程消费
+        threads = [threading.Thread(target=self._feed,
+                                    args=(items, queues[0], self.stages[0].workers),
+                                    daemon=True)]
+
+        for i, stage in enumerate(self.stages):
+            self.stats[stage.name] = {"items": 0, "busy": 0.0}
+            next_workers = self.stages[i + 1].workers if i + 1 < len(self.stages) else 1
+            remaining = [stage.workers]
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._work,
+                    args=(stage, queues[i], queues[i + 1], next_workers, remaining),
+                    daemon=True))
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        results = []
+        while True:
+            item = self._get(queues[-1])
+            if item is _DONE:
+                break
+            results.append(item)
+
+        for thread in threads:
+            thread.join()
+        self.elapsed = time.perf_counter() - start
+
+        if self._error is not None:
+            raise self._error
+        return results
@@ -0,0 +1,95 @@
+"""输出文件预压缩 - 生成 .gz / .br 文件，静态服务器可以直接发送压缩后的内容"""
+import os
+import gzip
+import sys
+sys.path.insert(0, '..')
+from config import PRECOMPRESS_PROCESSES, PRECOMPRESS_EXTENSIONS, PRECOMPRESS_MIN_BYTES
+from .output_writer import OutputWriter
+from .process_pool import spawn_pool
+from .tracing import tracer
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只生成 .gz
+    brotli = None
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def compress_file(path: str, use_brotli: bool) -> list:
+    """生成压缩文件（在子进程中执行），返回生成的文件的后缀
+
+    压缩后没有变小的格式不生成
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    encoded = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+    if use_brotli:
+        encoded.append((".br", brotli.compress(data, quality=11)))
+
+    written = []
+    for suffix, compressed in encoded:
+        if len(compressed) < len(data):
+            _write_atomic(path + suffix, compressed)
+            written.append(suffix)
+    return written
+
+
+class Precompressor:
+    """预压缩输出目录中的文本文件（HTML、JSON、SVG、CSS、JS）
+
+    内容与上次构建相同且压缩文件仍在的文件直接保留，其余在进程池中并发压缩；
+    生成的压缩文件登记到输出写入器，源文件删除时一起被清理
+    """
+
+    def __init__(self, writer: OutputWriter, processes: int = PRECOMPRESS_PROCESSES,
+                 extensions: tuple = PRECOMPRESS_EXTENSIONS, min_bytes: int = PRECOMPRESS_MIN_BYTES):
+        self.writer = writer
+        self.processes = processes
+        self.extensions = tuple(extensions)
+        self.min_bytes = min_bytes
+        self.suffixes = (".gz", ".br") if brotli is not None else (".gz",)
+
+    def run(self) -> dict:
+        """压缩本次构建生成的文件，返回 {"compressed": 重新压缩的文件数, "reused": 沿用的文件数}"""
+        pending = []
+        reused = 0
+        for relative_path in self.writer.produced_files():
+            if not relative_path.endswith(self.extensions):
+                continue
+            path = os.path.join(self.writer.output_dir, relative_path)
+            if os.path.getsize(path) < self.min_bytes:
+                continue
+
+            sidecars = [relative_path + suffix for suffix in self.suffixes]
+            if self.writer.unchanged(relative_path) and self._kept(sidecars):
+                reused += 1
+                continue
+            pending.append(relative_path)
+
+        if pending:
+            with tracer.span("precompress", "io", files=len(pending)):
+                with spawn_pool(self.processes) as pool:
+                    paths = [os.path.join(self.writer.output_dir, p) for p in pending]
+                    results = pool.map(compress_file, paths, [brotli is not None] * len(paths),
+                                       chunksize=max(1, len(paths) // (self.processes * 4)))
+                    for relative_path, suffixes in zip(pending, results):
+                        for suffix in suffixes:
+                            self.writer.adopt(relative_path + suffix)
+            tracer.count("output.files_precompressed", len(pending))
+
+        return {"compressed": len(pending), "reused": reused}
+
+    def _kept(self, sidecars: list) -> bool:
+        """上次生成的压缩文件都还在时保留它们"""
+        if not all(self.writer.recorded(sidecar) for sidecar in sidecars):
+            return False
+        for sidecar in sidecars:
+            self.writer.keep(sidecar)
+        return True
@@ -0,0 +1,83 @@
+"""文章预览 - 从块中提取首页显示的摘要文本和封面图"""
+from .notion_client import parse_rich_text
+from .image_handler import ImageHandler
+
+
+class PreviewCollector:
+    """逐块收集预览信息（摘要文本和封面图），可在流式渲染时边读边收集"""
+
+    def __init__(self, image_handler: ImageHandler, page_id: str):
+        self.image_handler = image_handler
+        self.page_id = page_id
+        self.preview_text = ""
+        self.cover_image = None
+
+    @property
+    def done(self) -> bool:
+        """是否都已获取到"""
+        return bool(self.cover_image) and len(self.preview_text) >= 100
+
+    def feed(self, block: dict):
+        if self.done:
+            return
+        block_type = block.get("type")
+
+        # 提取封面图（第一张图片）
+        if not self.cover_image and block_type == "image":
+            image_data = block.get("image", {})
+            image_type = image_data.get("type")
+            if image_type == "file":
+                url = image_data.get("file", {}).get("url")
+            elif image_type == "external":
+                url = image_data.get("external", {}).get("url")
+            else:
+                url = None
+            if url:
+                self.cover_image = self.image_handler.submit(url, self.page_id)
+
+        # 提取预览文本（从段落中获取）
+        if len(self.preview_text) < 100 and block_type == "paragraph":
+            rich_text = block.get("paragraph", {}).get("rich_text", [])
+            text = parse_rich_text(rich_text)
+            if text:
+                self.preview_text += text + " "
+
+    def result(self) -> dict:
+        preview_text = self.preview_text
+        # 截断预览文本
+        if len(preview_text) > 120:
+            preview_text = preview_text[:120].strip() + "..."
+
+        return {
+            "preview_text": preview_text.strip(),
+            "cover_image": self.cover_image
+        }
+
+
+def extract_preview(blocks, image_handler: ImageHandler, page_id: str) -> dict:
+    """从块中提取预览信息（摘要文本和封面图）
+
+    封面图只提交下载，返回的 cover_image 为 Future（没有图片时为 None）
+    """
+    collector = PreviewCollector(image_handler, page_id)
+    for block in blocks:
+        collector.feed(block)
+        # 如果都获取到了，提前退出
+        if collector.done:
+            break
+    return collector.result()
+
+
+def resolve_preview(preview: dict, image_handler: ImageHandler) -> dict:
+    """等待封面图下载完成，首页封面优先使用缩略图，记录封面的尺寸（缩略图比例相同）和占位图"""
+    cover = preview["cover_image"]
+    cover_image = cover.result() if cover else None
+    cover_info = image_handler.get_image_info(cover_image) if cover_image else None
+    return {
+        "preview_text": preview["preview_text"],
+        "cover_image": cover_image,
+        "cover_thumbnail": cover_info["thumbnail"] if cover_info else None,
+        "cover_width": cover_info["width"] if cover_info else None,
+        "cover_height": cover_info["height"] if cover_info else None,
+        "cover_placeholder": cover_info["placeholder"] if cover_info else None
+    }
@@ -0,0 +1,13 @@
+"""进程池 - 渲染、预压缩和图片优化共用的进程池创建方式"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def spawn_pool(processes: int) -> ProcessPoolExecutor:
+    """创建以 spawn 方式启动子进程的进程池
+
+    构建过程是多线程的（流水线、下载线程池等），fork 会把其他线程持有的锁原样复制到子进程中，
+    子进程可能因此永久阻塞；spawn 启动全新的解释器，不继承任何锁
+    """
+    return ProcessPoolExecutor(max_workers=processes,
+                               mp_context=multiprocessing.get_context("spawn"))
@@ -0,0 +1,63 @@
+"""多进程渲染 - 在进程池中解析块树并渲染文章页"""
+from typing import Optional
+import sys
+sys.path.insert(0, '..')
+from config import BUILD_RENDER_PROCESSES
+from .block_parser import BlockParser
+from .fragment_cache import PageFragments
+from .html_generator import HTMLGenerator
+from .image_handler import ResolvedImages
+from .process_pool import spawn_pool
+from .search_index import count_terms
+from .tracing import tracer
+
+# 渲染进程中复用的模板环境（每个进程加载一次模板）
+_generator = None
+
+
+def render_page(page_info: dict, blocks: Optional[list], images: Optional[ResolvedImages],
+                with_terms: bool, fragments: Optional[PageFragments] = None) -> dict:
+    """在渲染进程中执行：解析块树（blocks 为 None 时使用 page_info 中已有的正文）并套用模板
+
+    返回 {"html": 页面 HTML, "content": 正文 HTML, "terms": 正文词频或 None,
+          "fragments": 更新后的片段缓存}
+    """
+    global _generator
+    if _generator is None:
+        _generator = HTMLGenerator()
+
+    terms = None
+    if blocks is not None:
+        parser = BlockParser(images)
+        if with_terms:
+            terms = count_terms(parser.iter_text(blocks))
+        page_info["content"] = parser.parse_blocks(blocks, page_info["id"], fragments)
+    return {
+        "html": _generator.render_article(page_info),
+        "content": page_info["content"],
+        "terms": terms,
+        "fragments": fragments
+    }
+
+
+class RenderPool:
+    """渲染进程池
+
+    BlockParser 不持有 NotionClient，块树和已下载图片的信息都可以序列化，
+    因此页面的解析和模板渲染可以分散到多个进程，全量重新渲染时用满所有核心
+    """
+
+    def __init__(self, processes: int = BUILD_RENDER_PROCESSES):
+        self.processes = processes
+        self._executor = spawn_pool(processes)
+
+    def render(self, page_info: dict, blocks: Optional[list] = None,
+               images: Optional[ResolvedImages] = None, with_terms: bool = False,
+               fragments: Optional[PageFragments] = None) -> dict:
+        """渲染一个页面（阻塞直到完成），参数见 render_page"""
+        with tracer.span("render_process", "render", page_id=page_info["id"]):
+            return self._executor.submit(render_page, page_info, blocks, images, with_terms,
+                                         fragments).result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,242 @@
+"""全文搜索索引 - 构建时生成按词前缀分片的倒排索引，浏览器按需加载"""
+import os
+import re
+import json
+import threading
+from collections import Counter
+from typing import Iterable
+import sys
+sys.path.insert(0, '..')
+from config import SEARCH_CACHE_PATH, SEARCH_SHARDS
+from .output_writer import OutputWriter
+
+# 索引格式版本，分词或结构变化时递增
+SEARCH_INDEX_VERSION = 2
+
+# 标题中的词权重更高
+TITLE_WEIGHT = 5
+
+# 中日韩文字（汉字、假名、谚文）按单字和二元组切分，其余按连续的字母数字切分
+_CJK = "぀-ヿ㐀-䶿一-鿿가-힯豈-﫿"
+TOKEN_RE = re.compile(f"[{_CJK}]+|[^\\W_{_CJK}]+")
+CJK_RE = re.compile(f"[{_CJK}]")
+
+
+def tokenize(text: str) -> list:
+    """分词（用于建立索引）：英文等按单词（小写），中文同时按单字和相邻两字的二元组
+
+    搜索时（search.js）多字查询只用二元组匹配，单字查询用单字匹配
+    """
+    tokens = []
+    for run in TOKEN_RE.findall(text.lower()):
+        if CJK_RE.match(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def count_terms(texts: Iterable[str]) -> Counter:
+    """统计文本片段中的词频"""
+    terms = Counter()
+    for text in texts:
+        terms.update(tokenize(text))
+    return terms
+
+
+def shard_key(term: str, shards: int = SEARCH_SHARDS) -> str:
+    """词所在的分片：ASCII 字母数字开头的词按首字符分片，其余按首字符编码取模
+
+    浏览器端的 search.js 使用相同的分词和分片规则
+    """
+    c = term[0]
+    if c.isascii() and c.isalnum():
+        return c
+    return f"u{ord(c) % shards:02x}"
+
+
+class SearchIndex:
+    """全文搜索索引
+
+    每个页面的词频保存在构建缓存中，只有重新生成的页面需要重新分词；
+    保存时只重写词有变化的分片。新页面的文档编号在保存时按页面 id 顺序分配，
+    与并发渲染时页面完成的先后无关，并发构建与顺序构建的索引文件相同。输出到 output/search/：
+    docs.json（文档编号 -> [页面 id, 标题]）和 <分片>.json（词 -> [[文档编号, 权重], ...]）
+    """
+
+    def __init__(self, writer: OutputWriter, cache_path: str = SEARCH_CACHE_PATH,
+                 shards: int = SEARCH_SHARDS):
+        self.writer = writer
+        self.search_dir = os.path.join(writer.output_dir, "search")
+        self.cache_path = cache_path
+        self.shards = shards
+        self.next_doc = 0
+        self.docs = {}  # page_id -> {"n": 文档编号, "title": 标题, "terms": {词: 权重}}
+        self.shard_names = set()  # 已写出的（非空）分片
+        self.dirty = set()  # 需要重写的分片
+        self.changed = set()  # 需要从分片中去掉旧记录的文档编号
+        self.updated = set()  # 本次重新分词的页面
+        self.numbers = {}  # 重建索引时沿用的文档编号：page_id -> 编号
+        self._lock = threading.Lock()
+        # 没有可用的缓存时，输出目录中已有的分片与文档编号对不上，保存时全部重写
+        self.stale = not self.load()
+
+    def load(self) -> bool:
+        """读取缓存的词频，格式变化时丢弃"""
+        if not os.path.exists(self.cache_path):
+            return False
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取搜索索引缓存失败，将重建: {e}")
+            return False
+        if data.get("version") != SEARCH_INDEX_VERSION or data.get("shards") != self.shards:
+            return False
+        self.next_doc = data.get("next_doc", 0)
+        self.shard_names = set(data.get("shard_names", []))
+        self.docs = data.get("docs", {})
+        return True
+
+    def reset(self):
+        """清空索引（全量构建时使用）"""
+        with self._lock:
+            # 保留页面的文档编号，重建后内容不变的分片文件也不变
+            self.numbers = {page_id: doc["n"] for page_id, doc in self.docs.items()
+                            if doc["n"] is not None}
+            self.docs = {}
+            self.shard_names = set()
+            self.dirty = set()
+            self.changed = set()
+            self.updated = set()
+            self.stale = True
+
+    def __contains__(self, page_id: str) -> bool:
+        with self._lock:
+            return page_id in self.docs
+
+    def update_page(self, page_id: str, title: str, terms: Counter):
+        """更新页面的索引，terms 为正文的词频（见 count_terms）"""
+        terms = Counter(terms)
+        for term in tokenize(title):
+            terms[term] += TITLE_WEIGHT
+
+        with self._lock:
+            old = self.docs.get(page_id)
+            if old is not None:
+                self._mark_dirty(old["terms"])
+                n = old["n"]
+                self.changed.add(n)
+            else:
+                # 新页面保存时再分配编号（见 _assign_numbers）
+                n = self.numbers.get(page_id)
+            self.docs[page_id] = {"n": n, "title": title, "terms": dict(terms)}
+            self.updated.add(page_id)
+            self._mark_dirty(terms)
+
+    def prune(self, page_ids):
+        """移除不在 page_ids 中的页面"""
+        keep = set(page_ids)
+        with self._lock:
+            for page_id in list(self.docs):
+                if page_id not in keep:
+                    doc = self.docs.pop(page_id)
+                    self._mark_dirty(doc["terms"])
+                    self.changed.add(doc["n"])
+
+    def _assign_numbers(self):
+        """为新页面按页面 id 顺序分配文档编号"""
+        with self._lock:
+            for page_id in sorted(p for p, doc in self.docs.items() if doc["n"] is None):
+                self.docs[page_id]["n"] = self.next_doc
+                self.next_doc += 1
+
+    def _mark_dirty(self, terms):
+        self.dirty.update(shard_key(term, self.shards) for term in terms)
+
+    def save(self) -> int:
+        """写出有变化的分片、文档列表，并保存词频缓存，返回重写的分片数
+
+        有变化的分片在原文件上修改：去掉变化页面的旧记录，加入新记录；
+        分片文件缺失时（例如输出目录被清空）才遍历全部页面重建
+        """
+        self._assign_numbers()
+        existing = set()
+        if os.path.isdir(self.search_dir) and not self.stale:
+            existing = set(name[:-5] for name in os.listdir(self.search_dir)
+                           if name.endswith(".json") and name != "docs.json")
+        self.stale = False
+        missing = self.shard_names - existing
+        shards = self.dirty | missing
+
+        # 本次更新的页面的新记录，按分片分组
+        added = {}
+        for page_id in self.updated:
+            doc = self.docs.get(page_id)
+            if doc is None:
+                continue
+            for term, weight in doc["terms"].items():
+                added.setdefault(shard_key(term, self.shards), {}).setdefault(term, []).append(
+                    [doc["n"], weight])
+
+        # 缺失的分片从全部页面重建，新出现的分片只有本次更新的页面的记录
+        rebuilt = {key: {} for key in missing}
+        if rebuilt:
+            for doc in self.docs.values():
+                for term, weight in doc["terms"].items():
+                    shard = rebuilt.get(shard_key(term, self.shards))
+                    if shard is not None:
+                        shard.setdefault(term, []).append([doc["n"], weight])
+
+        for key in shards:
+            path = os.path.join(self.search_dir, f"{key}.json")
+            if key in rebuilt:
+                terms = rebuilt[key]
+            elif key not in existing:
+                terms = added.get(key, {})
+            else:
+                with open(path, "r", encoding="utf-8") as f:
+                    terms = json.load(f)
+                for term in list(terms):
+                    postings = [p for p in terms[term] if p[0] not in self.changed]
+                    if postings:
+                        terms[term] = postings
+                    else:
+                        del terms[term]
+                for term, postings in added.get(key, {}).items():
+                    terms.setdefault(term, []).extend(postings)
+            for postings in terms.values():
+                postings.sort()
+
+            # 变空的分片不再写出，由输出写入器清理
+            if terms:
+                self.writer.write(f"search/{key}.json", self._dumps(terms))
+                self.shard_names.add(key)
+            else:
+                self.shard_names.discard(key)
+
+        for key in self.shard_names - shards:
+            self.writer.keep(f"search/{key}.json")
+        docs = {doc["n"]: [page_id, doc["title"]] for page_id, doc in self.docs.items()}
+        self.writer.write("search/docs.json", self._dumps({"shards": self.shards, "docs": docs}))
+
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self._dumps({
+                "version": SEARCH_INDEX_VERSION,
+                "shards": self.shards,
+                "next_doc": self.next_doc,
+                "shard_names": sorted(self.shard_names),
+                "docs": self.docs
+            }))
+        os.replace(tmp_path, self.cache_path)
+        self.dirty = set()
+        self.changed = set()
+        self.updated = set()
+        return len(shards)
+
+    @staticmethod
+    def _dumps(data) -> str:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
@@ -0,0 +1,265 @@
+"""Notion 工作区快照 - 将拉取到的页面和块保存在本地 SQLite 数据库中
+
+构建时 NotionClient 把拉取结果写入快照，之后可以不访问网络直接从快照构建、
+查询某个块的原始数据，或者导出为单个文件在其他机器上构建。
+
+用法:
+    python -m src.snapshot stats
+    python -m src.snapshot export snapshot.sqlite
+    python -m src.snapshot import snapshot.sqlite
+    python -m src.snapshot show <页面或块 id>
+"""
+import os
+import json
+import sqlite3
+import argparse
+import threading
+from typing import Optional
+import sys
+sys.path.insert(0, '..')
+from config import SNAPSHOT_PATH
+
+# 表结构版本，变化时旧快照不能直接使用
+SNAPSHOT_VERSION = 2
+# 可以原地升级的旧版本：版本 2 只增加了 last_edited_time 索引，打开时由 SCHEMA 补建
+UPGRADABLE_VERSIONS = ("1",)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS pages (
+    id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    last_edited_time TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_seq ON pages (seq);
+CREATE INDEX IF NOT EXISTS pages_last_edited ON pages (last_edited_time);
+CREATE TABLE IF NOT EXISTS blocks (
+    id TEXT PRIMARY KEY,
+    parent_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    type TEXT,
+    has_children INTEGER NOT NULL,
+    last_edited_time TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blocks_parent ON blocks (parent_id, position);
+CREATE INDEX IF NOT EXISTS blocks_last_edited ON blocks (last_edited_time);
+-- 子块已完整拉取的父节点（页面或块），没有记录的父节点在快照中不完整
+CREATE TABLE IF NOT EXISTS fetched (
+    parent_id TEXT PRIMARY KEY
+);
+"""
+
+
+class SnapshotStore:
+    """Notion 工作区快照（SQLite）
+
+    pages 按数据库查询的顺序保存页面对象；blocks 保存块对象及其父节点和位置，
+    页面和块都以 last_edited_time 建立索引，块还以父节点 id 建立索引。
+    父节点重新拉取后已删除的子块连同其整个子树一起删除
+    """
+
+    def __init__(self, path: str = SNAPSHOT_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # 构建时多个线程同时写入，共用一个连接并加锁
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._replaced = {}  # 正在重新保存子块的父节点 -> 原有子块的 id
+        self._init_schema()
+
+    def _init_schema(self):
+        with self._lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row is None:
+                self.conn.execute("INSERT INTO meta VALUES ('version', ?)", (str(SNAPSHOT_VERSION),))
+            elif row[0] in UPGRADABLE_VERSIONS:
+                self.conn.execute("UPDATE meta SET value = ? WHERE key = 'version'",
+                                  (str(SNAPSHOT_VERSION),))
+            elif row[0] != str(SNAPSHOT_VERSION):
+                raise ValueError(f"快照版本不兼容: {row[0]}（需要 {SNAPSHOT_VERSION}）: {self.path}")
+
+    # ---- 写入 ----
+
+    def put_page(self, page: dict, seq: Optional[int] = None):
+        """保存数据库查询返回的页面对象，seq 为在查询结果中的位置
+
+        seq 为 None 时（增量查询的结果）沿用页面原来的位置，新页面排在最后
+        """
+        with self._lock, self.conn:
+            if seq is None:
+                row = self.conn.execute(
+                    "SELECT seq FROM pages WHERE id = ? "
+                    "UNION ALL SELECT COALESCE(MAX(seq) + 1, 0) FROM pages", (page["id"],)).fetchone()
+                seq = row[0]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (id, seq, last_edited_time, data) VALUES (?, ?, ?, ?)",
+                (page["id"], seq, page.get("last_edited_time"), json.dumps(page, ensure_ascii=False)))
+
+    def retain_pages(self, page_ids):
+        """删除不在 page_ids 中的页面（数据库中已删除的页面）"""
+        keep = set(page_ids)
+        with self._lock, self.conn:
+            existing = [row[0] for row in self.conn.execute("SELECT id FROM pages")]
+            removed = [page_id for page_id in existing if page_id not in keep]
+            self.conn.executemany("DELETE FROM pages WHERE id = ?", [(page_id,) for page_id in removed])
+            self._delete_subtrees(removed)
+
+    def put_children(self, parent_id: str, blocks: list, start: int = 0):
+        """保存父节点的一批子块，start 为这批块的起始位置（为 0 时先清除旧的子块）"""
+        rows = [
+            (block["id"], parent_id, start + i, block.get("type"), int(bool(block.get("has_children"))),
+             block.get("last_edited_time"),
+             json.dumps({k: v for k, v in block.items() if k != "children"}, ensure_ascii=False))
+            for i, block in enumerate(blocks)
+        ]
+        with self._lock, self.conn:
+            if start == 0:
+                self._replaced[parent_id] = [row[0] for row in self.conn.execute(
+                    "SELECT id FROM blocks WHERE parent_id = ?", (parent_id,))]
+                self.conn.execute("DELETE FROM blocks WHERE parent_id = ?", (parent_id,))
+                self.conn.execute("DELETE FROM fetched WHERE parent_id = ?", (parent_id,))
+            self.conn.executemany("INSERT OR REPLACE INTO blocks VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def mark_fetched(self, parent_id: str):
+        """标记父节点的子块已全部保存，并删除已不在其中的子块的子树"""
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO fetched VALUES (?)", (parent_id,))
+            # 移动到其他父节点下的块仍然存在，保留其子树
+            removed = [block_id for block_id in self._replaced.pop(parent_id, ())
+                       if not self.conn.execute("SELECT 1 FROM blocks WHERE id = ?",
+                                                (block_id,)).fetchone()]
+            self._delete_subtrees(removed)
+
+    def _delete_subtrees(self, parent_ids: list):
+        """逐层删除父节点（已删除的页面或块）下的所有块（调用方持有锁并在事务中）"""
+        level = list(parent_ids)
+        while level:
+            children = []
+            for parent_id in level:
+                children.extend(row[0] for row in self.conn.execute(
+                    "SELECT id FROM blocks WHERE parent_id = ?", (parent_id,)))
+            self.conn.executemany("DELETE FROM blocks WHERE parent_id = ?", [(p,) for p in level])
+            self.conn.executemany("DELETE FROM fetched WHERE parent_id = ?", [(p,) for p in level])
+            level = children
+
+    # ---- 查询 ----
+
+    def get_pages(self) -> list:
+        """按数据库查询的顺序返回所有页面对象"""
+        with self._lock:
+            rows = self.conn.execute("SELECT data FROM pages ORDER BY seq").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get_page(self, page_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self.conn.execute("SELECT data FROM pages WHERE id = ?", (page_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_block(self, block_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self.conn.execute("SELECT data FROM blocks WHERE id = ?", (block_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_children(self, parent_id: str) -> Optional[list]:
+        """按顺序返回父节点的子块，快照中没有完整的子块时返回 None"""
+        with self._lock:
+            if not self.conn.execute("SELECT 1 FROM fetched WHERE parent_id = ?",
+                                     (parent_id,)).fetchone():
+                return None
+            rows = self.conn.execute(
+                "SELECT data FROM blocks WHERE parent_id = ? ORDER BY position", (parent_id,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get_tree(self, parent_id: str) -> Optional[list]:
+        """返回父节点的完整块树，有子块的块的子块放在 "children" 字段中"""
+        blocks = self.get_children(parent_id)
+        if blocks is None:
+            return None
+        for block in blocks:
+            if block.get("has_children"):
+                children = self.get_tree(block["id"])
+                if children is not None:
+                    block["children"] = children
+        return blocks
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pages": self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0],
+                "blocks": self.conn.execute("SELECT COUNT(*) FROM blocks").fetchone()[0],
+                "fetched": self.conn.execute("SELECT COUNT(*) FROM fetched").fetchone()[0],
+            }
+
+    # ---- 导入导出 ----
+
+    def export(self, target_path: str):
+        """导出为单个 SQLite 文件"""
+        if os.path.exists(target_path):
+            os.remove(target_path)
+        target = sqlite3.connect(target_path)
+        try:
+            with self._lock:
+                self.conn.backup(target)
+            target.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            target.close()
+
+    def import_(self, source_path: str):
+        """用导出的快照文件替换当前快照"""
+        source = sqlite3.connect(source_path)
+        try:
+            row = source.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row is None or row[0] not in (str(SNAPSHOT_VERSION),) + UPGRADABLE_VERSIONS:
+                raise ValueError(f"快照版本不兼容: {source_path}")
+            with self._lock:
+                source.backup(self.conn)
+        finally:
+            source.close()
+        # 导入的旧版本快照同样升级
+        self._init_schema()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Notion 工作区快照")
+    parser.add_argument("--path", default=SNAPSHOT_PATH, help="快照数据库路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="显示快照中的页面和块数量")
+    sub.add_parser("export", help="导出为单个文件").add_argument("file")
+    sub.add_parser("import", help="从导出的文件导入").add_argument("file")
+    sub.add_parser("show", help="显示页面或块的原始数据及其子块").add_argument("id")
+    args = parser.parse_args()
+
+    store = SnapshotStore(args.path)
+    try:
+        if args.command == "stats":
+            print(json.dumps(store.stats(), ensure_ascii=False))
+        elif args.command == "export":
+            store.export(args.file)
+            print(f"已导出快照: {args.file}")
+        elif args.command == "import":
+            store.import_(args.file)
+            print(f"已导入快照: {args.file}，{store.stats()}")
+        elif args.command == "show":
+            data = store.get_page(args.id) or store.get_block(args.id)
+            children = store.get_tree(args.id)
+            if data is None and children is None:
+                print(f"快照中没有: {args.id}")
+                sys.exit(1)
+            print(json.dumps({"object": data, "children": children}, ensure_ascii=False, indent=2))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
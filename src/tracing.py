@@ -0,0 +1,103 @@
+"""构建追踪 - 记录各阶段的耗时区间和计数，导出 JSON 摘要和 Chrome trace 格式"""
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+
+class Tracer:
+    """构建追踪器
+
+    span() 记录一个有名字的耗时区间（线程安全），count() 累加计数器。
+    导出的 trace 文件可在 chrome://tracing 或 https://ui.perfetto.dev 中以火焰图查看
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.start = time.perf_counter()
+            self.events = []  # (名称, 分类, 开始, 耗时, 线程 id, 线程名, 参数)
+            self.counters = {}
+
+    @contextmanager
+    def span(self, name: str, category: str = "build", /, **args):
+        """记录代码块的执行区间"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            thread = threading.current_thread()
+            with self._lock:
+                self.events.append((name, category, start, duration, thread.ident,
+                                    thread.name, args))
+
+    def count(self, name: str, value: int = 1):
+        """累加计数器"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> dict:
+        """按名称汇总各区间的次数、累计耗时和最长耗时"""
+        with self._lock:
+            events = list(self.events)
+            counters = dict(self.counters)
+            wall = time.perf_counter() - self.start
+
+        spans = {}
+        for name, category, _, duration, _, _, _ in events:
+            item = spans.setdefault(name, {"category": category, "count": 0,
+                                           "total": 0.0, "max": 0.0})
+            item["count"] += 1
+            item["total"] += duration
+            item["max"] = max(item["max"], duration)
+        for item in spans.values():
+            item["total"] = round(item["total"], 6)
+            item["max"] = round(item["max"], 6)
+
+        return {"wall": round(wall, 6), "spans": spans, "counters": counters}
+
+    def chrome_trace(self) -> dict:
+        """导出 Chrome trace event 格式"""
+        with self._lock:
+            events = list(self.events)
+            counters = dict(self.counters)
+            start = self.start
+
+        trace_events = []
+        thread_ids = {}  # 线程 ident -> 从 1 开始的编号
+        for name, category, begin, duration, ident, thread_name, args in events:
+            if ident not in thread_ids:
+                thread_ids[ident] = len(thread_ids) + 1
+                trace_events.append({"name": "thread_name", "ph": "M", "pid": 1,
+                                     "tid": thread_ids[ident], "args": {"name": thread_name}})
+            trace_events.append({
+                "name": name, "cat": category, "ph": "X", "pid": 1, "tid": thread_ids[ident],
+                "ts": round((begin - start) * 1e6, 1), "dur": round(duration * 1e6, 1),
+                "args": {key: str(value) for key, value in args.items()}
+            })
+
+        end = max((begin + duration for _, _, begin, duration, _, _, _ in events), default=start)
+        for name, value in counters.items():
+            trace_events.append({"name": name, "ph": "C", "pid": 1, "tid": 0,
+                                 "ts": round((end - start) * 1e6, 1), "args": {"value": value}})
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def export(self, trace_dir: str) -> tuple:
+        """写入 build-summary.json 和 build-trace.json，返回两个文件路径"""
+        os.makedirs(trace_dir, exist_ok=True)
+        summary_path = os.path.join(trace_dir, "build-summary.json")
+        trace_path = os.path.join(trace_dir, "build-trace.json")
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2, sort_keys=True)
+        with open(trace_path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f, ensure_ascii=False)
+        return summary_path, trace_path
+
+
+# 全局追踪器，构建过程中的各模块共用
+tracer = Tracer()
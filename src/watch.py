@@ -0,0 +1,259 @@
+"""监视模式 - 轮询 Notion 数据库中修改过的页面并增量重新生成，同时启动自动刷新的本地预览服务器
+
+用法: python build.py --watch
+"""
+import os
+import json
+import time
+import queue
+import threading
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from typing import Callable, Optional
+import sys
+sys.path.insert(0, '..')
+from config import (OUTPUT_DIR, OUTPUT_CHANGES_PATH, WATCH_INTERVAL, WATCH_RESYNC_INTERVAL,
+                    DEV_SERVER_HOST, DEV_SERVER_PORT, NOTION_SNAPSHOT, SNAPSHOT_PATH, ASSETS_DIR)
+from .build_manifest import compute_fingerprint
+from .notion_client import NotionClient
+from .snapshot import SnapshotStore
+
+LIVERELOAD_PATH = "/__livereload"
+
+# 注入到预览页面中：收到变更列表后，当前页面或样式、脚本有变化时刷新
+LIVERELOAD_SCRIPT = """<script>
+(function() {
+    const source = new EventSource('%s');
+    source.addEventListener('reload', function(event) {
+        const changed = JSON.parse(event.data);
+        let page = decodeURIComponent(location.pathname).replace(/^\\//, '');
+        if (!page || page.endsWith('/')) {
+            page += 'index.html';
+        }
+        if (changed.some(path => path === page || /\\.(css|js)$/.test(path))) {
+            location.reload();
+        }
+    });
+})();
+</script>
+""" % LIVERELOAD_PATH
+
+# Notion 的 last_edited_time 精确到分钟：同一分钟内的后续修改不会改变时间，
+# 修改时间在该时长以内的页面在这一分钟过去后再重新生成一次
+SETTLE_SECONDS = 90
+
+
+def parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+class LiveReloadHub:
+    """向打开的预览页面（Server-Sent Events 连接）广播变更的文件"""
+
+    def __init__(self):
+        self._clients = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> queue.Queue:
+        client = queue.Queue()
+        with self._lock:
+            self._clients.add(client)
+        return client
+
+    def unsubscribe(self, client: queue.Queue):
+        with self._lock:
+            self._clients.discard(client)
+
+    def publish(self, paths: list):
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            client.put(paths)
+        return len(clients)
+
+
+class DevRequestHandler(SimpleHTTPRequestHandler):
+    """预览服务器：提供输出目录中的文件，HTML 页面注入自动刷新脚本"""
+
+    hub: Optional[LiveReloadHub] = None
+
+    def log_message(self, *args):
+        pass
+
+    def end_headers(self):
+        # 预览时始终读取最新的页面；资源文件名带内容 hash，内容变化时文件名也会变化，可以一直缓存
+        if self.path.startswith(f"/{ASSETS_DIR}/"):
+            self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        else:
+            self.send_header("Cache-Control", "no-store")
+        super().end_headers()
+
+    def do_GET(self):
+        if self.path == LIVERELOAD_PATH:
+            return self._serve_events()
+
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            path = os.path.join(path, "index.html")
+        if path.endswith(".html") and os.path.isfile(path):
+            return self._serve_html(path)
+        super().do_GET()
+
+    def _serve_html(self, path: str):
+        with open(path, "r", encoding="utf-8") as f:
+            html = f.read()
+        position = html.rfind("</body>")
+        if position == -1:
+            position = len(html)
+        body = (html[:position] + LIVERELOAD_SCRIPT + html[position:]).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _serve_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        client = self.hub.subscribe()
+        try:
+            while True:
+                try:
+                    paths = client.get(timeout=15)
+                    message = f"event: reload\ndata: {json.dumps(paths, ensure_ascii=False)}\n\n"
+                except queue.Empty:
+                    # 定期发送注释行，及时发现已关闭的连接
+                    message = ": ping\n\n"
+                self.wfile.write(message.encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.hub.unsubscribe(client)
+
+
+def start_dev_server(hub: LiveReloadHub, host: str = DEV_SERVER_HOST, port: int = DEV_SERVER_PORT,
+                     directory: str = OUTPUT_DIR) -> ThreadingHTTPServer:
+    """在后台线程中启动预览服务器"""
+    handler = type("Handler", (DevRequestHandler,), {"hub": hub})
+    server = ThreadingHTTPServer((host, port), partial(handler, directory=directory))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="dev-server", daemon=True).start()
+    return server
+
+
+class Watcher:
+    """轮询数据库中 last_edited_time 晚于水位线的页面，有修改时增量构建
+
+    只查询修改过的页面，和上次完整查询的结果合并后交给 build()，
+    未修改的页面由构建清单直接复用；每隔 resync_interval 完整查询一次数据库，
+    发现已删除的页面。模板文件变化时也重新构建
+    """
+
+    def __init__(self, build: Callable, notion: NotionClient, interval: float = WATCH_INTERVAL,
+                 resync_interval: float = WATCH_RESYNC_INTERVAL,
+                 on_change: Optional[Callable] = None):
+        self.build = build
+        self.notion = notion
+        self.interval = interval
+        self.resync_interval = resync_interval
+        self.on_change = on_change
+        self.pages = {}  # page_id -> 页面对象（按数据库中的顺序）
+        self.watermark = ""
+        self.unsettled = {}  # 修改时间所在的分钟尚未过去的页面：page_id -> last_edited_time
+        self.templates = compute_fingerprint("templates")
+        self.last_resync = None  # 最近一次完整查询并构建成功的时间
+
+    def resync(self):
+        """完整查询数据库并构建，构建成功后才记录时间，失败时下次轮询重新完整查询"""
+        print("\n[监视] 完整查询数据库...")
+        self.pages = {page["id"]: page for page in self.notion.get_all_pages()}
+        self.watermark = max((page.get("last_edited_time", "") for page in self.pages.values()),
+                             default="")
+        self._build(list(self.pages))
+        self.last_resync = time.monotonic()
+
+    def poll(self) -> list:
+        """查询水位线之后修改过的页面，返回内容有变化的页面 id"""
+        changed = []
+        for page in self.notion.iter_pages(since=self.watermark or None):
+            known = self.pages.get(page["id"])
+            if known is None or known.get("last_edited_time") != page.get("last_edited_time"):
+                changed.append(page["id"])
+            # 新页面排在最后，下次完整查询时恢复数据库中的顺序
+            self.pages[page["id"]] = page
+            self.watermark = max(self.watermark, page.get("last_edited_time", ""))
+        return changed
+
+    def settled(self) -> list:
+        """修改时间所在的分钟已经过去、需要再生成一次的页面"""
+        now = datetime.now(timezone.utc)
+        pages = [page_id for page_id, edited in self.unsettled.items()
+                 if now - parse_time(edited) > timedelta(seconds=SETTLE_SECONDS)]
+        for page_id in pages:
+            del self.unsettled[page_id]
+        return [page_id for page_id in pages if page_id in self.pages]
+
+    def run(self):
+        while True:
+            try:
+                # 启动时的第一次完整查询也在这里，网络错误时同样等待后重试
+                if (self.last_resync is None
+                        or time.monotonic() - self.last_resync >= self.resync_interval):
+                    self.resync()
+                else:
+                    changed = self.poll()
+                    refresh = self.settled()
+                    templates = compute_fingerprint("templates")
+                    if changed or refresh or templates != self.templates:
+                        self.templates = templates
+                        print(f"\n[监视] 修改的页面 {len(changed)} 篇，重新检查 {len(refresh)} 篇")
+                        self._build(changed, refresh)
+            except Exception as e:
+                # 网络错误等不退出，下次轮询重试
+                print(f"\n[监视] 构建失败，{self.interval:.0f} 秒后重试: {e}")
+            time.sleep(self.interval)
+
+    def _build(self, changed: list, refresh: list = ()):
+        self.build(pages=list(self.pages.values()), refresh=set(refresh))
+
+        now = datetime.now(timezone.utc)
+        for page_id in changed:
+            edited = self.pages[page_id].get("last_edited_time")
+            if edited and now - parse_time(edited) <= timedelta(seconds=SETTLE_SECONDS):
+                self.unsettled[page_id] = edited
+
+        if self.on_change is not None:
+            with open(OUTPUT_CHANGES_PATH, "r", encoding="utf-8") as f:
+                changes = json.load(f)
+            # 预压缩文件随源文件变化，不单独通知
+            paths = sorted({path for paths in changes.values() for path in paths
+                            if not path.endswith((".gz", ".br"))})
+            if paths:
+                self.on_change(paths)
+
+
+def watch(build: Callable, host: str = DEV_SERVER_HOST, port: int = DEV_SERVER_PORT):
+    """启动预览服务器并持续监视 Notion 数据库的修改，按 Ctrl+C 退出"""
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    hub = LiveReloadHub()
+    server = start_dev_server(hub, host, port)
+    print(f"预览服务器: http://{host}:{server.server_address[1]}/")
+
+    snapshot = SnapshotStore(SNAPSHOT_PATH) if NOTION_SNAPSHOT else None
+    notion = NotionClient(snapshot=snapshot)
+
+    def notify(paths: list):
+        clients = hub.publish(paths)
+        print(f"[监视] 通知 {clients} 个预览页面: {len(paths)} 个文件有变化")
+
+    try:
+        Watcher(build, notion, on_change=notify).run()
+    except KeyboardInterrupt:
+        print("\n退出监视模式")
+    finally:
+        server.shutdown()
+        if snapshot is not None:
+            snapshot.close()
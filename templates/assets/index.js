@@ -0,0 +1,114 @@
+// 首页只包含一页文章，更多文章和另一种排序从 articles.json 按需加载
+document.addEventListener('DOMContentLoaded', function() {
+    const list = document.getElementById('article-list');
+    const pagination = document.getElementById('pagination');
+    const buttons = document.querySelectorAll('.sort-btn');
+    const pageSize = parseInt(list.dataset.pageSize, 10);
+    const total = parseInt(list.dataset.total, 10);
+    let manifest = null;
+    let sort = 'desc';
+    let start = parseInt(list.dataset.offset, 10);
+    let shown = list.querySelectorAll('.article-item').length;
+
+    const loadMore = document.createElement('button');
+    loadMore.className = 'load-more';
+    loadMore.textContent = '加载更多';
+    pagination.after(loadMore);
+
+    function updateControls() {
+        loadMore.hidden = start + shown >= total;
+    }
+
+    function loadManifest() {
+        if (!manifest) {
+            manifest = fetch(list.dataset.manifest).then(r => r.json());
+        }
+        return manifest;
+    }
+
+    function renderItem(data, fields) {
+        const a = {};
+        fields.forEach((name, i) => { a[name] = data[i]; });
+
+        const item = document.createElement('article');
+        item.className = 'article-item';
+        if (a.cover) {
+            const cover = document.createElement('div');
+            cover.className = 'article-cover';
+            const img = document.createElement('img');
+            img.src = a.cover;
+            if (a.width && a.height) {
+                img.width = a.width;
+                img.height = a.height;
+            }
+            img.alt = a.title;
+            img.loading = 'lazy';
+            cover.appendChild(img);
+            item.appendChild(cover);
+        }
+        const wrap = document.createElement('div');
+        wrap.className = 'article-content-wrap';
+        const link = document.createElement('a');
+        link.href = a.id + '.html';
+        const title = document.createElement('h2');
+        title.className = 'article-title';
+        title.textContent = a.title;
+        link.appendChild(title);
+        wrap.appendChild(link);
+        if (a.preview) {
+            const preview = document.createElement('p');
+            preview.className = 'article-preview';
+            preview.textContent = a.preview;
+            wrap.appendChild(preview);
+        }
+        const meta = document.createElement('div');
+        meta.className = 'article-meta';
+        const time = document.createElement('time');
+        time.textContent = a.date;
+        meta.appendChild(time);
+        wrap.appendChild(meta);
+        item.appendChild(wrap);
+        return item;
+    }
+
+    function append(data, count) {
+        const order = data.order[sort];
+        const fragment = document.createDocumentFragment();
+        const end = Math.min(start + shown + count, order.length);
+        for (let i = start + shown; i < end; i++) {
+            fragment.appendChild(renderItem(data.articles[order[i]], data.fields));
+        }
+        list.appendChild(fragment);
+        shown = end - start;
+        updateControls();
+    }
+
+    loadMore.addEventListener('click', function() {
+        loadManifest().then(data => {
+            pagination.hidden = true;
+            append(data, pageSize);
+        });
+    });
+
+    buttons.forEach(btn => {
+        btn.addEventListener('click', function() {
+            if (this.dataset.sort === sort) {
+                return;
+            }
+            buttons.forEach(b => b.classList.remove('active'));
+            this.classList.add('active');
+            sort = this.dataset.sort;
+
+            // 切换排序后从第一篇开始显示
+            loadManifest().then(data => {
+                pagination.hidden = true;
+                list.replaceChildren();
+                start = 0;
+                shown = 0;
+                append(data, pageSize);
+            });
+        });
+    });
+
+    updateControls();
+});
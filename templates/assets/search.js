@@ -0,0 +1,141 @@
+// 全文搜索：按查询中的词只下载需要的索引分片（分片规则与 src/search_index.py 一致；
+// 索引中的中文同时有单字和二元组，查询时多字只用二元组匹配，单字用单字匹配）
+(function() {
+    const SHARDS = {{ shards }};
+    const CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff';
+    const TOKEN_RE = new RegExp('[' + CJK + ']+|(?:(?![' + CJK + '])[\\p{L}\\p{N}])+', 'gu');
+    const CJK_RE = new RegExp('^[' + CJK + ']');
+    const MAX_RESULTS = 20;
+
+    const shards = new Map();
+    let docs = null;
+
+    function tokenize(text) {
+        const tokens = [];
+        for (const run of text.toLowerCase().match(TOKEN_RE) || []) {
+            if (CJK_RE.test(run)) {
+                const chars = Array.from(run);
+                if (chars.length === 1) {
+                    tokens.push(run);
+                }
+                for (let i = 0; i < chars.length - 1; i++) {
+                    tokens.push(chars[i] + chars[i + 1]);
+                }
+            } else {
+                tokens.push(run);
+            }
+        }
+        return Array.from(new Set(tokens));
+    }
+
+    function shardKey(term) {
+        const c = String.fromCodePoint(term.codePointAt(0));
+        if (/^[a-z0-9]$/.test(c)) {
+            return c;
+        }
+        return 'u' + (term.codePointAt(0) % SHARDS).toString(16).padStart(2, '0');
+    }
+
+    function fetchJSON(url) {
+        return fetch(url).then(r => (r.ok ? r.json() : {}));
+    }
+
+    function loadShard(key) {
+        if (!shards.has(key)) {
+            shards.set(key, fetchJSON('search/' + key + '.json'));
+        }
+        return shards.get(key);
+    }
+
+    function loadDocs() {
+        if (!docs) {
+            docs = fetchJSON('search/docs.json').then(data => data.docs || {});
+        }
+        return docs;
+    }
+
+    // 所有词都出现的文章，按权重之和排序
+    function search(query) {
+        const terms = tokenize(query);
+        if (!terms.length) {
+            return Promise.resolve([]);
+        }
+        const keys = Array.from(new Set(terms.map(shardKey)));
+        return Promise.all([loadDocs()].concat(keys.map(loadShard))).then(results => {
+            const allDocs = results[0];
+            const loaded = {};
+            keys.forEach((key, i) => { loaded[key] = results[i + 1]; });
+
+            let scores = null;
+            for (const term of terms) {
+                const postings = loaded[shardKey(term)][term] || [];
+                const next = new Map();
+                for (const [doc, weight] of postings) {
+                    if (scores === null || scores.has(doc)) {
+                        next.set(doc, (scores === null ? 0 : scores.get(doc)) + weight);
+                    }
+                }
+                scores = next;
+                if (!scores.size) {
+                    break;
+                }
+            }
+
+            return Array.from(scores.entries())
+                .sort((a, b) => b[1] - a[1])
+                .slice(0, MAX_RESULTS)
+                .map(([doc]) => allDocs[doc])
+                .filter(Boolean);
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function() {
+        const input = document.getElementById('search-input');
+        const results = document.getElementById('search-results');
+        if (!input || !results) {
+            return;
+        }
+        let timer = null;
+        let latest = 0;
+
+        function render(items, query) {
+            results.replaceChildren();
+            if (!query) {
+                results.hidden = true;
+                return;
+            }
+            results.hidden = false;
+            if (!items.length) {
+                const empty = document.createElement('p');
+                empty.className = 'search-empty';
+                empty.textContent = '没有找到相关文章';
+                results.appendChild(empty);
+                return;
+            }
+            const list = document.createElement('ul');
+            for (const [id, title] of items) {
+                const item = document.createElement('li');
+                const link = document.createElement('a');
+                link.href = id + '.html';
+                link.textContent = title;
+                item.appendChild(link);
+                list.appendChild(item);
+            }
+            results.appendChild(list);
+        }
+
+        input.addEventListener('input', function() {
+            clearTimeout(timer);
+            timer = setTimeout(() => {
+                const query = input.value.trim();
+                const id = ++latest;
+                search(query).then(items => {
+                    // 只显示最后一次输入的结果
+                    if (id === latest) {
+                        render(items, query);
+                    }
+                });
+            }, 200);
+        });
+    });
+})();
@@ -0,0 +1,57 @@
+"""静态资源：HTML/CSS/JS 压缩
+
+运行: python -m pytest -q tests  或  python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.assets import minify_html, minify_css, minify_js
+
+
+class MinifyHtmlTest(unittest.TestCase):
+
+    def test_collapses_whitespace(self):
+        html = "<div>\n    <p>a   b</p>\n\n    <p>c</p>\n</div>"
+        self.assertEqual(minify_html(html), "<div>\n<p>a b</p>\n<p>c</p>\n</div>")
+
+    def test_preserves_pre_and_script(self):
+        html = ("<div>  x  </div>\n<pre><code>def f():\n    return  1\n</code></pre>"
+                "<script>\n  if (a  <  b) {}\n</script>")
+        self.assertEqual(minify_html(html), "<div> x </div>\n<pre><code>def f():\n    return  1\n"
+                                            "</code></pre><script>\n  if (a  <  b) {}\n</script>")
+
+
+class MinifyCssTest(unittest.TestCase):
+
+    def test_removes_comments_and_whitespace(self):
+        css = "/* 标题 */\nh1 ,\nh2 {\n    color: red;\n    margin: 0 auto;\n}\n"
+        self.assertEqual(minify_css(css), "h1,h2{color:red;margin:0 auto}")
+
+    def test_keeps_descendant_and_pseudo_selectors(self):
+        css = ".post a:hover > span {\n    color: blue;\n}"
+        self.assertEqual(minify_css(css), ".post a:hover>span{color:blue}")
+
+    def test_preserves_quoted_strings(self):
+        css = ('a::after {\n    content: "a ; b" ;\n}\n'
+               "/* 'x' */ body { font-family: 'Noto  Sans', \"a /* b */\" ; }")
+        self.assertEqual(minify_css(css),
+                         'a::after{content:"a ; b"}body{font-family:\'Noto  Sans\',"a /* b */"}')
+
+    def test_escaped_quotes(self):
+        self.assertEqual(minify_css('q::before { content: "\\" ; " ; }'),
+                         'q::before{content:"\\" ; "}')
+
+
+class MinifyJsTest(unittest.TestCase):
+
+    def test_removes_indentation_and_line_comments(self):
+        js = "// 注释\nfunction f() {\n    // 行内注释\n    return 'a  //  b';\n}\n\n"
+        self.assertEqual(minify_js(js), "function f() {\nreturn 'a  //  b';\n}\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
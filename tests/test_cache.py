@@ -0,0 +1,64 @@
+"""磁盘缓存：多个线程同时读写时，命中计数和总大小保持一致
+
+运行: python -m pytest -q tests  或  python -m unittest discover tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.cache import DiskCache
+
+
+class DiskCacheConcurrencyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="disk-cache-")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_counters_under_concurrent_access(self):
+        cache = DiskCache(self.tmp_dir, ttl=3600)
+        for i in range(20):
+            cache.set(f"key-{i}", i)
+
+        def read(i):
+            cache.get(f"key-{i % 40}")
+
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(read, range(2000)))
+        self.assertEqual(cache.hits, 1000)
+        self.assertEqual(cache.misses, 1000)
+
+    def test_total_bytes_under_concurrent_writes(self):
+        cache = DiskCache(self.tmp_dir, max_bytes=10 ** 9)
+        cache.set("warmup", 0)
+
+        def write(i):
+            # 同一批键被反复覆盖写入不同长度的值
+            cache.set(f"key-{i % 16}", "x" * (i % 97))
+
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(write, range(1000)))
+        self.assertEqual(cache._total_bytes, cache._scan_size())
+
+    def test_eviction_under_concurrent_writes(self):
+        cache = DiskCache(self.tmp_dir, max_bytes=20000)
+
+        def write(i):
+            cache.set(f"key-{i}", "x" * 200)
+
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(write, range(500)))
+        self.assertEqual(cache._total_bytes, cache._scan_size())
+        self.assertLessEqual(cache._scan_size(), 20000)
+
+
+if __name__ == "__main__":
+    unittest.main()
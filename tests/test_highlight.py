@@ -0,0 +1,40 @@
+"""代码高亮：Notion 的语言名称都能对应到 Pygments 的词法分析器
+
+运行: python -m pytest -q tests  或  python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.highlight import NOTION_LANGUAGES, _lexer, pygments
+
+
+@unittest.skipIf(pygments is None, "需要 Pygments")
+class NotionLanguagesTest(unittest.TestCase):
+
+    def test_every_alias_resolves(self):
+        for language, name in NOTION_LANGUAGES.items():
+            if name is None:
+                continue
+            with self.subTest(language=language, lexer=name):
+                self.assertIsNotNone(_lexer(language))
+
+    def test_aliases_are_lowercase(self):
+        # 查找前语言名称会转换为小写
+        for language in NOTION_LANGUAGES:
+            self.assertEqual(language, language.lower())
+
+    def test_plain_text_is_not_highlighted(self):
+        self.assertIsNone(_lexer("plain text"))
+        self.assertIsNone(_lexer("mermaid"))
+
+    def test_assembly_and_llvm(self):
+        self.assertEqual(_lexer("assembly").name, "NASM")
+        self.assertEqual(_lexer("llvm ir").name, "LLVM")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+"""图片元数据：从文件头读取尺寸（包括 JPEG 的 EXIF 方向）
+
+运行: python -m pytest -q tests  或  python -m unittest discover tests
+"""
+import os
+import sys
+import struct
+import shutil
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.image_meta import probe_size
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+
+def make_jpeg(width: int, height: int, orientation: int = 0, order: str = "<") -> bytes:
+    """只有文件头的 JPEG：可选的 EXIF 方向（APP1 段）和帧头（SOF0）"""
+    data = b"\xff\xd8"
+    if orientation:
+        tiff = ({"<": b"II", ">": b"MM"}[order] + struct.pack(order + "HI", 42, 8)
+                + struct.pack(order + "H", 1)
+                + struct.pack(order + "HHIH2x", 0x0112, 3, 1, orientation)
+                + struct.pack(order + "I", 0))
+        app1 = b"Exif\0\0" + tiff
+        data += b"\xff\xe1" + struct.pack(">H", len(app1) + 2) + app1
+    data += b"\xff\xc0" + struct.pack(">HBHHB", 17, 8, height, width, 3) + b"\0" * 9
+    return data + b"\xff\xd9"
+
+
+class ProbeSizeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="image-meta-")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def probe(self, data: bytes):
+        path = os.path.join(self.tmp_dir, "image")
+        with open(path, "wb") as f:
+            f.write(data)
+        return probe_size(path)
+
+    def test_png(self):
+        data = b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", 640, 480)
+        self.assertEqual(self.probe(data + b"\0" * 16), (640, 480))
+
+    def test_gif(self):
+        self.assertEqual(self.probe(b"GIF89a" + struct.pack("<HH", 32, 16) + b"\0" * 24), (32, 16))
+
+    def test_webp_extended(self):
+        data = (b"RIFF" + struct.pack("<I", 30) + b"WEBP" + b"VP8X" + struct.pack("<I", 10)
+                + b"\0" * 4 + (1199).to_bytes(3, "little") + (799).to_bytes(3, "little"))
+        self.assertEqual(self.probe(data), (1200, 800))
+
+    def test_jpeg(self):
+        self.assertEqual(self.probe(make_jpeg(800, 600)), (800, 600))
+
+    def test_jpeg_exif_orientation(self):
+        # 方向 1-4 不旋转，5-8 显示时旋转 90 度，宽高互换
+        for order in ("<", ">"):
+            self.assertEqual(self.probe(make_jpeg(800, 600, 3, order)), (800, 600))
+            self.assertEqual(self.probe(make_jpeg(800, 600, 6, order)), (600, 800))
+            self.assertEqual(self.probe(make_jpeg(800, 600, 8, order)), (600, 800))
+
+    def test_unknown_format(self):
+        self.assertIsNone(self.probe(b"<svg xmlns='http://www.w3.org/2000/svg'></svg>"))
+
+    @unittest.skipIf(Image is None, "需要 Pillow")
+    def test_matches_pillow_exif_transpose(self):
+        for orientation in (1, 6):
+            path = os.path.join(self.tmp_dir, f"photo-{orientation}.jpg")
+            exif = Image.Exif()
+            exif[0x0112] = orientation
+            Image.new("RGB", (120, 80)).save(path, exif=exif.tobytes())
+            with Image.open(path) as image:
+                expected = ImageOps.exif_transpose(image).size
+            self.assertEqual(probe_size(path), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""图片库：签名 URL 的稳定标识，以及删除不再引用的图片
+
+运行: python -m pytest -q tests  或  python -m unittest discover tests
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.image_store import ImageStore, stable_image_key
+
+
+class StableImageKeyTest(unittest.TestCase):
+
+    def test_signed_urls_share_a_key(self):
+        base = "https://prod-files-secure.s3.us-west-2.amazonaws.com/ws/file/image.png"
+        first = f"{base}?X-Amz-Algorithm=AWS4-HMAC-SHA256&X-Amz-Credential=a&X-Amz-Signature=1"
+        second = f"{base}?X-Amz-Algorithm=AWS4-HMAC-SHA256&X-Amz-Credential=b&X-Amz-Signature=2"
+        self.assertEqual(stable_image_key(first), base)
+        self.assertEqual(stable_image_key(second), base)
+
+    def test_other_signature_parameters(self):
+        self.assertEqual(stable_image_key("https://cdn.example.com/a.jpg?Expires=1&Signature=x"),
+                         "https://cdn.example.com/a.jpg")
+
+    def test_external_urls_keep_their_query(self):
+        url = "https://example.com/render?id=42&size=large"
+        self.assertEqual(stable_image_key(url), url)
+        self.assertNotEqual(stable_image_key("https://example.com/render?id=43&size=large"),
+                            stable_image_key(url))
+
+
+class ImageStoreGarbageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="image-store-")
+        self.store = ImageStore(self.tmp_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def add(self, name: str, key: str = None) -> str:
+        tmp_path = os.path.join(self.store.tmp_dir, f"{name}.download")
+        with open(tmp_path, "wb") as f:
+            f.write(name.encode() * 10)
+        if key is None:
+            self.store.put(name, tmp_path)  # 优化生成的变体没有索引
+        else:
+            self.store.add(key, tmp_path, os.path.splitext(name)[0], os.path.splitext(name)[1])
+        self.store.describe(name)
+        return name
+
+    def test_unreferenced_objects_are_removed(self):
+        self.add("aaaa.png", "https://example.com/a.png")
+        self.add("aaaa-320w.webp")
+        self.add("bbbb.png", "https://example.com/b.png")
+        self.add("bbbb-320w.webp")
+        leftover = os.path.join(self.store.tmp_dir, "interrupted.tmp")
+        open(leftover, "w").close()
+
+        result = self.store.collect_garbage({"aaaa.png", "aaaa-320w.webp"})
+        self.assertEqual(result["removed"], 3)
+        self.assertTrue(os.path.exists(self.store.object_path("aaaa.png")))
+        self.assertTrue(os.path.exists(self.store.object_path("aaaa-320w.webp")))
+        self.assertFalse(os.path.exists(self.store.object_path("bbbb.png")))
+        self.assertFalse(os.path.exists(self.store.object_path("bbbb-320w.webp")))
+        self.assertFalse(os.path.exists(leftover))
+        self.assertEqual(self.store.lookup("https://example.com/a.png"), "aaaa.png")
+        self.assertIsNone(self.store.lookup("https://example.com/b.png"))
+
+        # 索引和元数据已经保存，重新打开的图片库中也没有删除的图片
+        with open(self.store.index_path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), {"https://example.com/a.png": "aaaa.png"})
+        reopened = ImageStore(self.tmp_dir)
+        self.assertEqual(set(reopened.meta.images), {"aaaa.png", "aaaa-320w.webp"})
+
+    def test_nothing_to_remove(self):
+        self.add("aaaa.png", "https://example.com/a.png")
+        self.assertEqual(self.store.collect_garbage({"aaaa.png"}), {"removed": 0, "bytes": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
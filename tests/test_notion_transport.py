@@ -0,0 +1,183 @@
+"""Notion 传输层：Retry-After 解析、令牌桶限速、AIMD 并发控制和 429/5xx 重试
+
+运行: python -m pytest -q tests  或  python -m unittest discover tests
+"""
+import os
+import sys
+import time
+import json
+import unittest
+from email.utils import formatdate
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.notion_transport import TokenBucket, AIMDController, NotionTransport, parse_retry_after
+
+
+class ParseRetryAfterTest(unittest.TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after("3"), 3.0)
+        self.assertEqual(parse_retry_after("0.5"), 0.5)
+
+    def test_negative_seconds_are_clamped(self):
+        self.assertEqual(parse_retry_after("-2"), 0.0)
+
+    def test_http_date(self):
+        wait = parse_retry_after(formatdate(time.time() + 30, usegmt=True))
+        self.assertGreater(wait, 25)
+        self.assertLessEqual(wait, 30)
+
+    def test_past_http_date(self):
+        self.assertEqual(parse_retry_after(formatdate(time.time() - 60, usegmt=True)), 0.0)
+
+    def test_missing_or_invalid(self):
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after(""))
+        self.assertIsNone(parse_retry_after("soon"))
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_burst_is_immediate(self):
+        bucket = TokenBucket(rate=1, capacity=3)
+        start = time.monotonic()
+        for _ in range(3):
+            bucket.acquire()
+        self.assertLess(time.monotonic() - start, 0.1)
+
+    def test_waits_for_refill(self):
+        bucket = TokenBucket(rate=20, capacity=1)
+        bucket.acquire()
+        start = time.monotonic()
+        bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+    def test_pause_blocks_acquire(self):
+        bucket = TokenBucket(rate=1000, capacity=5)
+        bucket.pause(0.1)
+        start = time.monotonic()
+        bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+
+class AIMDControllerTest(unittest.TestCase):
+
+    def test_throttle_halves_limit(self):
+        controller = AIMDController(max_limit=16, initial=8)
+        controller.on_throttle()
+        self.assertEqual(controller.limit, 4)
+        controller.on_throttle()
+        controller.on_throttle()
+        controller.on_throttle()
+        self.assertEqual(controller.limit, 1)  # 不低于 min_limit
+
+    def test_success_increases_limit_by_one_per_window(self):
+        controller = AIMDController(max_limit=16, initial=4)
+        for _ in range(4):
+            controller.on_success(0.1)
+        self.assertAlmostEqual(controller.limit, 5, delta=0.1)
+
+    def test_increase_is_capped(self):
+        controller = AIMDController(max_limit=3, initial=3)
+        controller.on_success(0.1)
+        self.assertEqual(controller.limit, 3)
+
+    def test_latency_spike_decreases_limit(self):
+        controller = AIMDController(max_limit=16, initial=10)
+        controller.on_success(0.2)
+        limit = controller.limit
+        controller.on_success(1.0)  # 超过最低延迟的 2 倍且超过 0.5 秒
+        self.assertAlmostEqual(controller.limit, limit * 0.9)
+
+    def test_small_latency_change_is_not_a_spike(self):
+        controller = AIMDController(max_limit=16, initial=10)
+        controller.on_success(0.01)
+        limit = controller.limit
+        controller.on_success(0.1)  # 是最低延迟的 10 倍，但不到 0.5 秒
+        self.assertGreater(controller.limit, limit)
+
+
+def make_response(status: int, body: dict = None, headers: dict = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(body or {}).encode()
+    response.headers.update(headers or {})
+    response.url = "https://api.notion.com/v1/test"
+    return response
+
+
+class FakeSession:
+    """按顺序返回预设的响应（或抛出预设的异常），记录请求次数"""
+
+    def __init__(self, responses: list):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class TransportRetryTest(unittest.TestCase):
+
+    def transport(self, responses: list, max_retries: int = 3) -> NotionTransport:
+        transport = NotionTransport({}, rate=1000, burst=1000, max_retries=max_retries,
+                                    max_concurrency=16)
+        transport.BACKOFF_BASE = 0  # 测试中不等待
+        transport.session = FakeSession(responses)
+        return transport
+
+    def test_retries_after_throttle(self):
+        transport = self.transport([make_response(429, headers={"Retry-After": "0"}),
+                                    make_response(200, {"ok": True})])
+        transport.controller.limit = 8
+        self.assertEqual(transport.request("GET", "https://api.notion.com/v1/test"), {"ok": True})
+        self.assertEqual(transport.session.calls, 2)
+        self.assertEqual(transport.stats["throttled"], 1)
+        self.assertEqual(transport.stats["retries"], 1)
+        self.assertAlmostEqual(transport.controller.limit, 4 + 1 / 4)  # 429 减半，成功后增加
+
+    def test_retries_after_server_error(self):
+        transport = self.transport([make_response(503), make_response(502),
+                                    make_response(200, {"ok": True})])
+        self.assertEqual(transport.request("GET", "https://api.notion.com/v1/test"), {"ok": True})
+        self.assertEqual(transport.session.calls, 3)
+        self.assertEqual(transport.stats["retries"], 2)
+
+    def test_persistent_server_error_stops_at_retry_cap(self):
+        transport = self.transport([make_response(500)] * 10, max_retries=3)
+        with self.assertRaises(requests.HTTPError):
+            transport.request("GET", "https://api.notion.com/v1/test")
+        self.assertEqual(transport.session.calls, 4)
+
+    def test_persistent_throttle_stops_at_retry_cap(self):
+        transport = self.transport([make_response(429, headers={"Retry-After": "0"})] * 10,
+                                   max_retries=2)
+        with self.assertRaises(requests.HTTPError):
+            transport.request("GET", "https://api.notion.com/v1/test")
+        self.assertEqual(transport.session.calls, 3)
+        self.assertEqual(transport.stats["throttled"], 3)
+
+    def test_client_error_is_not_retried(self):
+        transport = self.transport([make_response(400), make_response(200)])
+        with self.assertRaises(requests.HTTPError):
+            transport.request("GET", "https://api.notion.com/v1/test")
+        self.assertEqual(transport.session.calls, 1)
+
+    def test_connection_error_is_retried_then_raised(self):
+        transport = self.transport([requests.ConnectionError("reset")] * 10, max_retries=2)
+        with self.assertRaises(requests.ConnectionError):
+            transport.request("GET", "https://api.notion.com/v1/test")
+        self.assertEqual(transport.session.calls, 3)
+        self.assertEqual(transport.controller.in_flight, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
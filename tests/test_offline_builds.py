@@ -0,0 +1,79 @@
+"""离线构建（--replay 回放缓存的响应、--snapshot 从快照构建）与之前的增量构建衔接
+
+使用 benchmarks/fake_notion.py 模拟的 Notion API，在同一个工作目录中依次构建，
+检查离线构建使用的是最近一次构建看到的页面，而不是更早的完整查询结果。
+
+运行: python -m pytest -q tests  或  python -m unittest discover tests
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from fake_notion import Workspace, FakeNotionServer
+
+
+class OfflineBuildTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workspace = Workspace(pages=12, blocks=6, image_density=0.1)
+        self.server = FakeNotionServer(self.workspace).start()
+        self.workdir = tempfile.mkdtemp(prefix="offline-build-")
+        for name in ("templates", "src", "config.py", "build.py"):
+            os.symlink(os.path.join(ROOT, name), os.path.join(self.workdir, name))
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def build(self, *args: str) -> str:
+        env = dict(os.environ, NOTION_API_BASE=self.server.api_base, NOTION_TOKEN="fake",
+                   NOTION_DATABASE_ID="fake-database", NOTION_RATE_LIMIT="1000",
+                   NOTION_RATE_BURST="1000", PRECOMPRESS="0", BUILD_TRACE="0")
+        result = subprocess.run([sys.executable, "build.py", *args], cwd=self.workdir, env=env,
+                                capture_output=True, text=True, timeout=300)
+        self.assertEqual(result.returncode, 0, result.stdout[-2000:] + result.stderr[-2000:])
+        return result.stdout
+
+    def recorded_times(self) -> dict:
+        with open(os.path.join(self.workdir, ".cache", "build_manifest.json"), encoding="utf-8") as f:
+            pages = json.load(f)["pages"]
+        return {page_id: entry["last_edited_time"] for page_id, entry in pages.items()}
+
+    def test_replay_after_delta_build(self):
+        self.build()
+        self.workspace.touch(2)
+        self.assertIn("增量查询", self.build())
+        expected = self.recorded_times()
+        edited = {page["id"]: page["last_edited_time"] for page in self.workspace.pages[:2]}
+        self.assertEqual({page_id: expected[page_id] for page_id in edited}, edited)
+
+        self.server.reset_stats()
+        output = self.build("--replay")
+        self.assertEqual(self.server.stats["requests"], 0)
+        self.assertIn("重新生成 0 篇", output)
+        self.assertEqual(self.recorded_times(), expected)
+
+    def test_snapshot_after_replay(self):
+        # 回放的是修改前的响应，不能覆盖快照中较新的页面和块
+        self.build()
+        self.workspace.touch(2)
+        self.build()
+        expected = self.recorded_times()
+        self.build("--replay")
+
+        self.server.reset_stats()
+        output = self.build("--snapshot")
+        self.assertEqual(self.server.stats["requests"], 0)
+        self.assertIn("重新生成 0 篇", output)
+        self.assertEqual(self.recorded_times(), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
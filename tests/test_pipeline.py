@@ -0,0 +1,141 @@
+"""构建流水线，以及并发构建与顺序构建的输出一致性
+
+PipelineTest 检查流水线本身（结果、丢弃、异常和有界队列）；
+BuildDeterminismTest 使用 benchmarks/fake_notion.py 模拟的 Notion API，在独立的工作目录中
+以不同的并发方式冷构建同一个工作区，比较输出目录（页面、搜索索引、压缩文件等）逐字节相同。
+
+运行: python -m pytest -q tests  或  python -m unittest discover tests
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from fake_notion import Workspace, FakeNotionServer
+from src.pipeline import Pipeline, Stage
+
+# 顺序构建：每个阶段只有一个工作线程，页面按数据库中的顺序依次处理
+SEQUENTIAL = {"BUILD_FETCH_WORKERS": "1", "BUILD_IMAGE_WORKERS": "1", "BUILD_RENDER_WORKERS": "1"}
+PARALLEL_MODES = {
+    "threads": {"BUILD_FETCH_WORKERS": "6", "BUILD_IMAGE_WORKERS": "4", "BUILD_RENDER_WORKERS": "4"},
+    "streaming": {"BUILD_STREAMING": "1", "BUILD_FETCH_WORKERS": "6"},
+    "processes": {"BUILD_RENDER_PROCESSES": "2", "BUILD_FETCH_WORKERS": "6",
+                  "BUILD_RENDER_WORKERS": "4"},
+}
+
+
+class PipelineTest(unittest.TestCase):
+
+    def test_all_items_pass_through_every_stage(self):
+        pipeline = Pipeline([Stage("double", lambda x: x * 2, workers=3),
+                             Stage("inc", lambda x: x + 1, workers=2)], queue_size=2)
+        self.assertEqual(sorted(pipeline.run(range(50))), [x * 2 + 1 for x in range(50)])
+        self.assertEqual(pipeline.stats["double"]["items"], 50)
+        self.assertEqual(pipeline.stats["inc"]["items"], 50)
+
+    def test_none_drops_item(self):
+        pipeline = Pipeline([Stage("odd", lambda x: x if x % 2 else None, workers=2),
+                             Stage("same", lambda x: x)])
+        self.assertEqual(sorted(pipeline.run(range(10))), [1, 3, 5, 7, 9])
+
+    def test_stage_error_is_raised(self):
+        def fail(x):
+            if x == 3:
+                raise ValueError("boom")
+            return x
+
+        with self.assertRaises(ValueError):
+            Pipeline([Stage("fail", fail, workers=2), Stage("same", lambda x: x)]).run(range(100))
+
+    def test_queues_are_bounded(self):
+        # 下游阻塞时，上游领先的数量不超过各队列容量和正在处理的数量之和
+        fed = []
+        release = threading.Event()
+
+        def items():
+            for i in range(100):
+                fed.append(i)
+                yield i
+
+        def slow(x):
+            release.wait()
+            return x
+
+        pipeline = Pipeline([Stage("fast", lambda x: x), Stage("slow", slow)], queue_size=2)
+        thread = threading.Thread(target=pipeline.run, args=(items(),))
+        thread.start()
+        time.sleep(0.3)
+        self.assertLessEqual(len(fed), 2 * 2 + 3)
+        release.set()
+        thread.join()
+        self.assertEqual(len(fed), 100)
+
+
+def read_tree(root: str) -> dict:
+    """目录中所有文件：相对路径 -> 内容"""
+    files = {}
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            with open(path, "rb") as f:
+                files[os.path.relpath(path, root)] = f.read()
+    return files
+
+
+class BuildDeterminismTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # 请求带少量延迟，并发构建中页面的完成顺序与数据库中的顺序不同
+        cls.server = FakeNotionServer(Workspace(pages=24, blocks=12, image_density=0.1),
+                                      latency=0.005).start()
+        cls.workdirs = []
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        for workdir in cls.workdirs:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def build(self, env: dict) -> dict:
+        """在新的工作目录中冷构建，返回输出目录的内容"""
+        workdir = tempfile.mkdtemp(prefix="build-determinism-")
+        self.workdirs.append(workdir)
+        for name in ("templates", "src", "config.py", "build.py"):
+            os.symlink(os.path.join(ROOT, name), os.path.join(workdir, name))
+
+        build_env = dict(os.environ, **env)
+        build_env.update({
+            "NOTION_API_BASE": self.server.api_base,
+            "NOTION_TOKEN": "fake",
+            "NOTION_DATABASE_ID": "fake-database",
+            "NOTION_RATE_LIMIT": "1000",
+            "NOTION_RATE_BURST": "1000",
+        })
+        result = subprocess.run([sys.executable, "build.py"], cwd=workdir, env=build_env,
+                                capture_output=True, text=True, timeout=300)
+        self.assertEqual(result.returncode, 0, result.stdout[-2000:] + result.stderr[-2000:])
+        return read_tree(os.path.join(workdir, "output"))
+
+    def test_parallel_builds_match_sequential(self):
+        expected = self.build(SEQUENTIAL)
+        self.assertTrue(any(path.startswith("search" + os.sep) for path in expected))
+
+        for mode, env in PARALLEL_MODES.items():
+            with self.subTest(mode=mode):
+                output = self.build(env)
+                self.assertEqual(sorted(output), sorted(expected))
+                different = [path for path in expected if output[path] != expected[path]]
+                self.assertEqual(different, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+"""搜索索引：分词和分片规则，以及与浏览器端 search.js 的一致性
+
+运行: python -m pytest -q tests  或  python -m unittest discover tests
+"""
+import os
+import sys
+import json
+import shutil
+import unittest
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.search_index import tokenize, shard_key
+
+SHARDS = 64
+QUERIES = ["Claude Code", "提示词技巧", "让 AI 帮我写代码", "词", "GPT-4o 模型", "日本語のテキスト",
+           "한국어 검색", "Café naïve", "snake_case 变量", "Ｆｕｌｌ 全角", "2024年总结"]
+
+
+def run_search_js(queries: list) -> list:
+    """在 node 中执行 search.js 的分词和分片函数，返回每个查询的 [词列表, 分片列表]"""
+    with open(os.path.join(ROOT, "templates", "assets", "search.js"), encoding="utf-8") as f:
+        source = f.read()
+    # 只取常量和 tokenize/shardKey 两个函数（其余部分依赖浏览器）
+    start = source.index("const SHARDS")
+    end = source.index("function fetchJSON")
+    functions = source[start:end].replace("{{ shards }}", str(SHARDS))
+    script = ("const queries = JSON.parse(require('fs').readFileSync(0, 'utf8'));\n" + functions
+              + "console.log(JSON.stringify(queries.map(q => [tokenize(q), tokenize(q).map(shardKey)])));")
+    result = subprocess.run(["node", "-e", script], input=json.dumps(queries), capture_output=True,
+                            text=True, timeout=30, check=True)
+    return json.loads(result.stdout)
+
+
+class TokenizeTest(unittest.TestCase):
+
+    def test_words_are_lowercased(self):
+        self.assertEqual(tokenize("Hello, World_2"), ["hello", "world", "2"])
+
+    def test_cjk_unigrams_and_bigrams(self):
+        self.assertEqual(tokenize("提示词"), ["提", "示", "词", "提示", "示词"])
+
+    def test_mixed_text(self):
+        self.assertEqual(tokenize("AI写代码"), ["ai", "写", "代", "码", "写代", "代码"])
+
+    def test_shard_key(self):
+        self.assertEqual(shard_key("hello", SHARDS), "h")
+        self.assertEqual(shard_key("2024", SHARDS), "2")
+        self.assertEqual(shard_key("提示", SHARDS), f"u{ord('提') % SHARDS:02x}")
+        self.assertEqual(shard_key("café", 16), "c")
+        self.assertEqual(shard_key("élan", 16), f"u{ord('é') % 16:02x}")
+
+
+@unittest.skipUnless(shutil.which("node"), "需要 node")
+class SearchJsConsistencyTest(unittest.TestCase):
+
+    def test_query_terms_are_indexed_in_the_same_shard(self):
+        for query, (terms, keys) in zip(QUERIES, run_search_js(QUERIES)):
+            with self.subTest(query=query):
+                self.assertTrue(terms)
+                # 查询的每个词都能在索引的词中找到，并且分到同一个分片
+                self.assertLessEqual(set(terms), set(tokenize(query)))
+                self.assertEqual(keys, [shard_key(term, SHARDS) for term in terms])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+"""工作区快照：重新拉取子块时删除已删除的块的整个子树，以及旧版本快照的升级
+
+运行: python -m pytest -q tests  或  python -m unittest discover tests
+"""
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.snapshot import SnapshotStore, SNAPSHOT_VERSION
+
+
+def block(block_id: str, has_children: bool = False) -> dict:
+    return {"object": "block", "id": block_id, "type": "toggle", "has_children": has_children}
+
+
+class SnapshotStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="snapshot-")
+        self.store = SnapshotStore(os.path.join(self.tmp_dir, "snapshot.sqlite"))
+        self.store.put_page({"id": "page", "last_edited_time": "2024-01-01T00:00:00.000Z"}, 0)
+        # page -> a -> a1 -> a11, page -> b -> b1
+        self.put("page", [block("a", True), block("b", True)])
+        self.put("a", [block("a1", True)])
+        self.put("a1", [block("a11")])
+        self.put("b", [block("b1")])
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def put(self, parent_id: str, blocks: list):
+        self.store.put_children(parent_id, blocks)
+        self.store.mark_fetched(parent_id)
+
+    def block_ids(self) -> set:
+        return {row[0] for row in self.store.conn.execute("SELECT id FROM blocks")}
+
+    def test_removed_block_takes_its_subtree(self):
+        self.put("page", [block("b", True)])
+        self.assertEqual(self.block_ids(), {"b", "b1"})
+        self.assertIsNone(self.store.get_children("a1"))
+        self.assertEqual([b["id"] for b in self.store.get_tree("page")], ["b"])
+
+    def test_moved_block_keeps_its_subtree(self):
+        # a1 从 a 移动到 b 下：先拉取 b，再拉取 a
+        self.put("b", [block("b1"), block("a1", True)])
+        self.put("a", [])
+        self.assertEqual(self.block_ids(), {"a", "b", "b1", "a1", "a11"})
+        self.assertEqual([b["id"] for b in self.store.get_children("a1")], ["a11"])
+
+    def test_paginated_children(self):
+        self.store.put_children("page", [block("b", True)], 0)
+        self.store.put_children("page", [block("c")], 1)
+        self.store.mark_fetched("page")
+        self.assertEqual(self.block_ids(), {"b", "b1", "c"})
+
+    def test_removed_page_takes_its_blocks(self):
+        self.store.retain_pages([])
+        self.assertEqual(self.block_ids(), set())
+        self.assertEqual(self.store.stats(), {"pages": 0, "blocks": 0, "fetched": 0})
+
+
+class SnapshotSchemaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="snapshot-schema-")
+        self.path = os.path.join(self.tmp_dir, "snapshot.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def indexes(self, conn) -> set:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+    def test_version_1_snapshot_is_upgraded(self):
+        conn = sqlite3.connect(self.path)
+        conn.executescript("""
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+            INSERT INTO meta VALUES ('version', '1');
+            CREATE TABLE pages (id TEXT PRIMARY KEY, seq INTEGER NOT NULL,
+                                last_edited_time TEXT, data TEXT NOT NULL);
+            INSERT INTO pages VALUES ('page', 0, '2024-01-01T00:00:00.000Z', '{"id": "page"}');
+        """)
+        conn.close()
+
+        store = SnapshotStore(self.path)
+        try:
+            self.assertTrue({"pages_last_edited", "blocks_last_edited"} <= self.indexes(store.conn))
+            version = store.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            self.assertEqual(version[0], str(SNAPSHOT_VERSION))
+            self.assertEqual(store.get_page("page"), {"id": "page"})
+        finally:
+            store.close()
+
+    def test_newer_version_is_rejected(self):
+        conn = sqlite3.connect(self.path)
+        conn.executescript(f"""
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+            INSERT INTO meta VALUES ('version', '{SNAPSHOT_VERSION + 1}');
+        """)
+        conn.close()
+        with self.assertRaises(ValueError):
+            SnapshotStore(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
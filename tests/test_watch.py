@@ -0,0 +1,59 @@
+"""监视模式：启动时的完整查询失败后等待重试，不退出
+
+运行: python -m pytest -q tests  或  python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src import watch
+from src.watch import Watcher
+
+
+class Stop(Exception):
+    pass
+
+
+class FlakyNotion:
+    """第一次完整查询时网络出错，之后返回一个页面"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_all_pages(self):
+        self.calls += 1
+        if self.calls == 1:
+            raise ConnectionError("网络不可用")
+        return [{"id": "page", "last_edited_time": "2024-01-01T00:00:00.000Z"}]
+
+    def iter_pages(self, since=None):
+        return iter(())
+
+
+class WatcherRunTest(unittest.TestCase):
+
+    def test_initial_resync_is_retried(self):
+        builds = []
+        notion = FlakyNotion()
+        watcher = Watcher(lambda **kwargs: builds.append(kwargs), notion, interval=0)
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) == 3:
+                raise Stop
+
+        with mock.patch.object(watch.time, "sleep", sleep), self.assertRaises(Stop):
+            watcher.run()
+        self.assertEqual(notion.calls, 2)
+        self.assertEqual(len(builds), 1)
+        self.assertEqual([page["id"] for page in builds[0]["pages"]], ["page"])
+        self.assertIsNotNone(watcher.last_resync)
+
+
+if __name__ == "__main__":
+    unittest.main()